@@ -4,6 +4,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.contrib.auth.admin import UserAdmin, GroupAdmin
 from .models import Club, Court, Booking
+from .response_cache import invalidate_tags_on_commit
 
 
 @admin.register(Club)
@@ -15,7 +16,10 @@ class ClubAdmin(admin.ModelAdmin):
 
     @admin.action(description='Approve selected clubs')
     def approve_clubs(self, request, queryset):
+        club_ids = list(queryset.values_list('pk', flat=True))
         queryset.update(is_approved=True)
+        # update() skips the signals
+        invalidate_tags_on_commit({'clubs', 'courts', *(f'club:{club_id}' for club_id in club_ids)})
 
 
 @admin.register(Court)
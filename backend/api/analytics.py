@@ -0,0 +1,203 @@
+"""
+Court utilization: booked minutes divided by open minutes, per court,
+weekday and hour of the day.
+
+Open minutes come from the club's regular hours, replaced by its special
+hours on the dates that have them. The database groups bookings into
+distinct (court, weekday, start, end) slots with a count, and NumPy
+spreads those slots over hour buckets, so a year of bookings costs one
+grouped query and a few array operations.
+
+This reads Booking rather than the DailyCourtStats rollups (api.rollups):
+the heatmap needs each booking's hours, clipped to that day's opening
+hours, and the rollups only keep a court's total minutes per day. Day
+and court totals come from the rollups (club_daily_stats).
+"""
+import numpy as np
+from django.db import connection
+from django.db.models import Count, F, Func, IntegerField, Value
+from django.db.models.functions import Cast, ExtractHour, ExtractIsoWeekDay, ExtractMinute, Mod, Substr
+
+from .models import Booking, ClubSpecialHours, Court, CourtAvailabilityRestriction
+
+HOURS = np.arange(24)
+WEEKDAY_NAMES = [name for _, name in CourtAvailabilityRestriction.WEEKDAYS]
+
+
+def minutes(value):
+    """Minutes since midnight for a time"""
+    return value.hour * 60 + value.minute
+
+
+def hour_overlap(starts, ends):
+    """Minutes of each [start, end) interval that fall in each hour, shape (n, 24)"""
+    bucket_starts = HOURS * 60
+    overlap = np.minimum(ends[:, None], bucket_starts + 60) - np.maximum(starts[:, None], bucket_starts)
+    return np.clip(overlap, 0, None)
+
+
+def opening_minutes(club, start_date, end_date):
+    """
+    Weekday, opening and closing minute of every day in the range, and the
+    dates that have special hours
+    """
+    days = np.arange(np.datetime64(start_date), np.datetime64(end_date) + 1)
+    opens = np.full(len(days), minutes(club.opening_time))
+    closes = np.full(len(days), minutes(club.closing_time))
+
+    special_hours = list(ClubSpecialHours.objects.filter(
+        club=club, date__range=(start_date, end_date)
+    ).values_list('date', 'is_closed', 'opening_time', 'closing_time'))
+    for date, is_closed, opening_time, closing_time in special_hours:
+        index = (date - start_date).days
+        if is_closed:
+            opens[index] = closes[index] = 0
+            continue
+        if opening_time:
+            opens[index] = minutes(opening_time)
+        if closing_time:
+            closes[index] = minutes(closing_time)
+
+    # 1970-01-01 was a Thursday; Monday is 0 as in CourtAvailabilityRestriction
+    weekdays = (days.astype('int64') + 3) % 7
+    special_dates = [row[0] for row in special_hours]
+    return weekdays, opens, closes, special_dates
+
+
+def minute_of_day(field):
+    """SQL expression for the minutes since midnight of a time column"""
+    if connection.vendor == 'sqlite':
+        # SQLite runs Extract through a Python function per row; its times
+        # are 'HH:MM:SS' strings, so native string functions are much faster
+        return (Cast(Substr(field, 1, 2), IntegerField()) * 60
+                + Cast(Substr(field, 4, 2), IntegerField()))
+    return ExtractHour(field) * 60 + ExtractMinute(field)
+
+
+def weekday_of(field):
+    """SQL expression for the weekday of a date column, 0 for Monday"""
+    if connection.vendor == 'sqlite':
+        # strftime('%w') counts from Sunday
+        sunday_first = Cast(Func(Value('%w'), F(field), function='strftime'), IntegerField())
+        return Mod(sunday_first + 6, 7)
+    # ISO weekdays start at 1 for Monday
+    return ExtractIsoWeekDay(field) - 1
+
+
+def booked_slots(club, start_date, end_date, days):
+    """
+    Booked time in the range as arrays of court ID, weekday, start and end
+    minute clipped to that day's opening hours, and the number of bookings
+    sharing those values. `days` is the result of opening_minutes().
+
+    Outside the special-hours dates only the weekday matters, so the
+    database groups those bookings by court, weekday and start/end minute
+    and returns one row per distinct slot. Bookings on special dates keep
+    their date so they can be clipped to that day's hours.
+    """
+    weekdays, opens, closes, special_dates = days
+    bookings = Booking.objects.filter(
+        court__club=club,
+        booking_date__range=(start_date, end_date),
+        status__in=Booking.BOOKED_STATUSES,
+    ).order_by().annotate(
+        start_minute=minute_of_day('start_time'),
+        end_minute=minute_of_day('end_time'),
+    )
+    regular = bookings.exclude(booking_date__in=special_dates).annotate(
+        weekday=weekday_of('booking_date'),
+    ).values('court_id', 'weekday', 'start_minute', 'end_minute').annotate(
+        count=Count('id'),
+    ).values_list('court_id', 'weekday', 'start_minute', 'end_minute', 'count')
+
+    opening, closing = minutes(club.opening_time), minutes(club.closing_time)
+    rows = [(court, weekday, opening, closing, start, end, count) for court, weekday, start, end, count in regular]
+    if special_dates:
+        special = bookings.filter(booking_date__in=special_dates).values_list(
+            'court_id', 'booking_date', 'start_minute', 'end_minute',
+        )
+        for court, date, start, end in special:
+            day = (date - start_date).days
+            rows.append((court, weekdays[day], opens[day], closes[day], start, end, 1))
+
+    if not rows:
+        return [np.array([], dtype='int64')] * 5
+    courts, weekday, opening, closing, starts, ends, counts = (np.asarray(column, dtype='int64') for column in zip(*rows))
+    return courts, weekday, np.maximum(starts, opening), np.minimum(ends, closing), counts
+
+
+def _ratio(booked, available):
+    """booked / available, None where nothing was open"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.round(booked / available, 4)
+    return np.where(available > 0, ratio, np.nan)
+
+
+def _as_json(values):
+    """Nested lists with NaN turned into None"""
+    if np.ndim(values) == 0:
+        return None if np.isnan(values) else float(values)
+    return [_as_json(value) for value in values]
+
+
+def court_utilization(club, start_date, end_date):
+    """
+    Utilization of the club's active courts between two dates (inclusive).
+    Heatmaps are 7 x 24 lists (Monday first, hour 0 first); cells are None
+    where the club was never open.
+    """
+    courts = list(
+        Court.objects.filter(club=club, is_active=True)
+        .order_by('court_number')
+        .values_list('id', 'court_number', 'court_type')
+    )
+    court_ids = np.array([court[0] for court in courts], dtype='int64')
+    cells = 7 * 24
+
+    # Open minutes per weekday and hour; the same for every court
+    days = opening_minutes(club, start_date, end_date)
+    weekdays, opens, closes, _ = days
+    open_by_day = hour_overlap(opens, closes)
+    open_grid = np.bincount(
+        (weekdays[:, None] * 24 + HOURS).ravel(), weights=open_by_day.ravel(), minlength=cells
+    ).reshape(7, 24)
+
+    booked = np.zeros((len(courts), 7, 24))
+    booking_courts, booking_weekdays, starts, ends, counts = booked_slots(club, start_date, end_date, days)
+    if len(booking_courts) and len(courts):
+        # Position of each booking's court in `courts`; drops inactive courts
+        order = np.argsort(court_ids)
+        positions = np.minimum(np.searchsorted(court_ids[order], booking_courts), len(courts) - 1)
+        court_index = order[positions]
+        known = court_ids[court_index] == booking_courts
+
+        overlap = (hour_overlap(starts, ends) * counts[:, None])[known]
+        flat = (court_index[known] * 7 + booking_weekdays[known])[:, None] * 24 + HOURS
+        booked = np.bincount(
+            flat.ravel(), weights=overlap.ravel(), minlength=len(courts) * cells
+        ).reshape(len(courts), 7, 24)
+
+    club_booked = booked.sum(axis=0)
+    club_open = open_grid * len(courts)
+    return {
+        "start_date": str(start_date),
+        "end_date": str(end_date),
+        "weekdays": WEEKDAY_NAMES,
+        "hours": HOURS.tolist(),
+        "booked_minutes": int(club_booked.sum()),
+        "open_minutes": int(club_open.sum()),
+        "utilization": _as_json(_ratio(club_booked.sum(), club_open.sum())),
+        "heatmap": _as_json(_ratio(club_booked, club_open)),
+        "courts": [
+            {
+                "court_id": court_id,
+                "court_number": court_number,
+                "court_type": court_type,
+                "booked_minutes": int(booked[index].sum()),
+                "open_minutes": int(open_grid.sum()),
+                "utilization": _as_json(_ratio(booked[index].sum(), open_grid.sum())),
+                "heatmap": _as_json(_ratio(booked[index], open_grid)),
+            }
+            for index, (court_id, court_number, court_type) in enumerate(courts)
+        ],
+    }
@@ -10,4 +10,9 @@ class ApiConfig(AppConfig):
         from .signals import setup_groups_and_permissions
         post_migrate.connect(setup_groups_and_permissions, sender=self)
 
-        from .signals import notify_superusers
\ No newline at end of file
+        from .signals import notify_superusers
+
+        # Registers the slow query log's connection and request receivers
+        from . import slow_queries  # noqa: F401
+        # And the club search's typo threshold receiver
+        from . import search  # noqa: F401
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .db_router import set_request_user
+from .tokens import CLUBS_CLAIM, ROLES_CLAIM, VERSION_CLAIM, get_token_version
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds the user from the token's claims.
+
+    Tokens issued by ClaimsRefreshToken carry everything the views need
+    (username, superuser flag, group names, managed club IDs), so a current
+    token authenticates without a database query. Tokens without claims,
+    or whose version no longer matches the user's, fall back to the
+    regular database lookup.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            # Lets the replica router honour this user's read-your-writes pin
+            set_request_user(result[0].pk)
+        return result
+
+    def get_user(self, validated_token):
+        user = self.get_claims_user(validated_token)
+        if user is None:
+            return super().get_user(validated_token)
+        return user
+
+    def get_claims_user(self, validated_token):
+        """User built from the token's claims, or None if they are missing or stale"""
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        version = validated_token.get(VERSION_CLAIM)
+        if user_id is None or version is None or version != get_token_version(user_id):
+            return None
+
+        user = User(
+            pk=user_id,
+            username=validated_token.get('username', ''),
+            is_superuser=validated_token.get('is_superuser', False),
+            is_staff=validated_token.get('is_staff', False),
+            is_active=True,
+        )
+        # Behave like a row fetched from the database so it can be used in
+        # lookups and assigned to foreign keys
+        user._state.adding = False
+        user._state.db = DEFAULT_DB_ALIAS
+        user._role_names = frozenset(validated_token.get(ROLES_CLAIM, ()))
+        user._managed_club_ids = frozenset(validated_token.get(CLUBS_CLAIM, ()))
+        user._from_token_claims = True
+        return user
+
+
+def load_full_user(user):
+    """
+    The user's row, for users built from token claims, which only carry
+    identity fields; use it wherever the user is serialised or saved
+    """
+    if getattr(user, '_from_token_claims', False):
+        return User.objects.get(pk=user.pk)
+    return user
@@ -0,0 +1,145 @@
+"""
+In-memory pre-check in front of the refresh token blacklist.
+
+Every /api/token/refresh/ call verifies the presented token against
+token_blacklist's BlacklistedToken table. Almost every token presented is
+not blacklisted, so each process keeps a Bloom filter of blacklisted JTIs
+and only queries the table when the filter reports a possible match.
+
+The filter is rebuilt from unexpired blacklist rows every
+TOKEN_BLACKLIST_FILTER_REBUILD_SECONDS. Between rebuilds, a generation
+counter in the shared cache, bumped as each blacklisting commits, tells
+each process that another one has blacklisted a token, and the new rows
+are pulled in by primary key. Concurrent logouts can commit out of id
+order, so each catch-up re-reads the last CATCH_UP_ID_WINDOW ids it has
+already seen as well.
+
+Without a cache shared by every worker (settings.SHARED_CACHE), a token
+blacklisted by one worker would pass the others' filters until their next
+rebuild, so the filter is skipped and every check goes to the table.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+GENERATION_KEY = 'auth:blacklist-generation'
+# Rows below the highest id seen that may still have been uncommitted then
+CATCH_UP_ID_WINDOW = 1000
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: derive all probe positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class BlacklistFilter:
+    """Process-local Bloom filter of blacklisted refresh token JTIs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """Drop the filter so the next check rebuilds it"""
+        self._bloom = None
+        self._built_at = 0.0
+        self._generation = None
+        self._last_id = 0
+
+    @property
+    def rebuild_interval(self):
+        return getattr(settings, 'TOKEN_BLACKLIST_FILTER_REBUILD_SECONDS', 300)
+
+    @property
+    def error_rate(self):
+        return getattr(settings, 'TOKEN_BLACKLIST_FILTER_ERROR_RATE', 0.01)
+
+    def _current_generation(self):
+        cache.add(GENERATION_KEY, 0, timeout=None)
+        return cache.get(GENERATION_KEY)
+
+    def rebuild(self):
+        """Load every unexpired blacklisted JTI into a fresh filter"""
+        with self._lock:
+            generation = self._current_generation()
+            rows = BlacklistedToken.objects.filter(
+                token__expires_at__gt=timezone.now()
+            ).values_list('id', 'token__jti')
+            # Leave room for the tokens blacklisted until the next rebuild
+            bloom = BloomFilter(max(rows.count() * 2, 10000), self.error_rate)
+            last_id = 0
+            for row_id, jti in rows.iterator(chunk_size=5000):
+                bloom.add(jti)
+                last_id = max(last_id, row_id)
+
+            self._bloom = bloom
+            self._built_at = time.monotonic()
+            self._generation = generation
+            self._last_id = last_id
+
+    def _catch_up(self):
+        """Add rows blacklisted by any process since the last load"""
+        with self._lock:
+            # Read the generation before querying, so rows committed while we
+            # query bump it again and are picked up next time
+            generation = self._current_generation()
+            rows = BlacklistedToken.objects.filter(
+                id__gt=self._last_id - CATCH_UP_ID_WINDOW
+            ).values_list('id', 'token__jti')
+            for row_id, jti in rows.iterator(chunk_size=5000):
+                self._bloom.add(jti)
+                self._last_id = max(self._last_id, row_id)
+            self._generation = generation
+
+    def might_contain(self, jti):
+        """False means the JTI is definitely not blacklisted"""
+        if not getattr(settings, 'SHARED_CACHE', False):
+            return True
+        if self._bloom is None or time.monotonic() - self._built_at > self.rebuild_interval:
+            self.rebuild()
+        elif self._generation is None or cache.get(GENERATION_KEY) != self._generation:
+            self._catch_up()
+        return jti in self._bloom
+
+    def note_blacklisted(self, jti):
+        """Record a token this process just blacklisted"""
+        if self._bloom is not None:
+            self._bloom.add(jti)
+        # Other processes catch up once the row is visible to them
+        transaction.on_commit(self.bump_generation, robust=True)
+
+    def bump_generation(self):
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            if not cache.add(GENERATION_KEY, 1, timeout=None):
+                cache.incr(GENERATION_KEY)
+
+
+blacklist_filter = BlacklistFilter()
@@ -0,0 +1,167 @@
+"""
+Process-local cache of each club's booking configuration.
+
+available_slots and Booking.clean only need a club's hours and booking
+rules and its active courts, which rarely change. get_club_config()
+compiles them into a ClubConfig and keeps it in a per-process LRU of
+CLUB_CONFIG_CACHE_SIZE clubs for at most CLUB_CONFIG_TTL seconds.
+
+Every entry carries the club's version, a random token in the shared cache
+that api.signals replaces once a write to the club or its courts commits
+(bulk writes call bump_config_version_on_commit themselves). Reads compare
+the two, so every worker drops a changed club at once, at the cost of one
+cache get instead of the club and court queries. Lookups are counted by
+result (hit, miss, expired, invalidated, uncached) in
+club_config_cache_lookups_total on /metrics.
+
+Without a cache shared by every worker (settings.SHARED_CACHE) the others
+would never see the new version and would keep booking against the old
+rules, so the LRU is bypassed and each lookup reads the club afresh.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .metrics import Counter, register, registry
+from .models import Club
+
+VERSION_KEY = 'club_config:version:{}'
+CLUB_FIELDS = [
+    'id', 'name', 'is_approved', 'opening_time', 'closing_time', 'booking_increment', 'min_booking_duration',
+    'max_booking_duration', 'max_advance_booking_days', 'same_day_booking_cutoff',
+]
+COURT_FIELDS = ['id', 'court_number', 'court_type', 'is_active']
+
+LOOKUPS = register(Counter('club_config_cache_lookups_total', 'Club configuration cache lookups by result',
+                           label_names=('result',)))
+
+CourtInfo = namedtuple('CourtInfo', ['id', 'court_number', 'court_type'])
+
+
+class ClubConfig:
+    """A club's settings and active courts; reads like the Club row for build_available_slots"""
+
+    def __init__(self, club, courts, version):
+        for field in CLUB_FIELDS:
+            setattr(self, field, club[field])
+        self.courts = tuple(courts)
+        self.courts_by_type = {}
+        for court in self.courts:
+            self.courts_by_type.setdefault(court.court_type, []).append(court)
+        self.version = version
+
+    def active_courts(self, court_type=None):
+        """Active courts ordered by number, of one type unless court_type is empty or 'all'"""
+        if not court_type or court_type == 'all':
+            return self.courts
+        return tuple(self.courts_by_type.get(court_type, ()))
+
+
+def current_versions(club_ids):
+    keys = {club_id: VERSION_KEY.format(club_id) for club_id in club_ids}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for club_id, key in keys.items():
+        if key not in found:
+            cache.add(key, secrets.token_hex(4), timeout=None)
+            found[key] = cache.get(key)
+        versions[club_id] = found[key]
+    return versions
+
+
+def bump_config_version(club_id):
+    cache.set(VERSION_KEY.format(club_id), secrets.token_hex(4), timeout=None)
+    club_configs.discard(club_id)
+
+
+def bump_config_version_on_commit(club_ids):
+    """
+    New configuration versions for the clubs once the current transaction
+    commits. This worker's entries go straight away, so the rest of the
+    transaction reads its own writes.
+    """
+    club_ids = set(club_ids) - {None}
+    for club_id in club_ids:
+        club_configs.discard(club_id)
+    if club_ids:
+        transaction.on_commit(lambda: [bump_config_version(club_id) for club_id in club_ids], robust=True)
+
+
+def load_config(club_id, version):
+    """The club's ClubConfig in one query, or None"""
+    # LEFT JOIN to the courts: one row per court, or a single row of NULL court columns
+    rows = list(Club.objects.filter(pk=club_id).order_by('court_details__court_number').values(
+        *CLUB_FIELDS, *(f'court_details__{field}' for field in COURT_FIELDS)))
+    if not rows:
+        return None
+    courts = [
+        CourtInfo(*(row[f'court_details__{field}'] for field in CourtInfo._fields))
+        for row in rows if row['court_details__is_active']
+    ]
+    return ClubConfig(rows[0], courts, version)
+
+
+class ClubConfigCache:
+    """LRU of ClubConfig by club ID, each entry valid while its version is current and its TTL lasts"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, club_id):
+        if not getattr(settings, 'SHARED_CACHE', False):
+            registry.increment(LOOKUPS.name, ('uncached',))
+            return load_config(club_id, None)
+        # The version is read first, so a write committing during the load leaves an outdated version behind
+        version = current_versions([club_id])[club_id]
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(club_id)
+            if entry is None:
+                result = 'miss'
+            elif entry[0].version != version:
+                result = 'invalidated'
+            elif now >= entry[1]:
+                result = 'expired'
+            else:
+                result = 'hit'
+                self.entries.move_to_end(club_id)
+        registry.increment(LOOKUPS.name, (result,))
+        if result == 'hit':
+            return entry[0]
+
+        config = load_config(club_id, version)
+        with self.lock:
+            if config is None:
+                self.entries.pop(club_id, None)
+                return None
+            self.entries[club_id] = (config, now + getattr(settings, 'CLUB_CONFIG_TTL', 300))
+            self.entries.move_to_end(club_id)
+            while len(self.entries) > getattr(settings, 'CLUB_CONFIG_CACHE_SIZE', 1000):
+                self.entries.popitem(last=False)
+        return config
+
+    def discard(self, club_id):
+        with self.lock:
+            self.entries.pop(club_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+club_configs = ClubConfigCache()
+
+
+def get_club_config(club_id):
+    """The club's ClubConfig, or None if there is no such club"""
+    try:
+        club_id = int(club_id)
+    except (TypeError, ValueError):
+        return None
+    return club_configs.get(club_id)
@@ -0,0 +1,114 @@
+"""
+Counter columns for court and booking totals.
+
+Each club carries its number of courts by type and active state
+(Club.active_hard_courts, Club.inactive_clay_courts, ...) and each user
+a BookingCounts row of bookings by status, so the club list and the
+profile read totals instead of counting rows. api.signals adjusts them
+with F() expressions inside the transaction of each court or booking
+save and delete; a change of type, state, club, status or user moves one
+from the old column to the new.
+
+Bulk writes (bulk_create, queryset update/delete, raw SQL) skip the
+signals. The bulk paths in this app rebuild the counts of the clubs they
+touch, and `manage.py repair_counters` recomputes everything, locking
+each batch of rows so that concurrent writes apply on top of the result.
+"""
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Booking, BookingCounts, Club, Court
+
+STATUSES = [status for status, _ in Booking.STATUS_CHOICES]
+BATCH_SIZE = 1000
+
+
+def court_count_field(court_type, is_active):
+    return f"{'active' if is_active else 'inactive'}_{court_type}_courts"
+
+
+COURT_COUNT_FIELDS = [court_count_field(court_type, is_active)
+                      for court_type, _ in Court.COURT_TYPES for is_active in (True, False)]
+
+
+def adjust_court_counts(changes):
+    """Apply {(club_id, court_type, is_active): delta} to the clubs' counters"""
+    by_club = defaultdict(dict)
+    for (club_id, court_type, is_active), delta in changes.items():
+        if delta:
+            by_club[club_id][court_count_field(court_type, is_active)] = delta
+    for club_id, deltas in by_club.items():
+        Club.objects.filter(pk=club_id).update(**{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def adjust_booking_counts(changes):
+    """Apply {(user_id, status): delta} to the users' BookingCounts"""
+    by_user = defaultdict(dict)
+    for (user_id, status), delta in changes.items():
+        if delta:
+            by_user[user_id][status] = delta
+    for user_id, deltas in by_user.items():
+        values = {status: F(status) + delta for status, delta in deltas.items()}
+        if BookingCounts.objects.filter(user_id=user_id).update(**values):
+            continue
+        # Nothing to take away from a missing row (e.g. the user is being deleted)
+        if any(delta > 0 for delta in deltas.values()):
+            # The user's first booking: create the row, unless a concurrent one just did
+            BookingCounts.objects.bulk_create([BookingCounts(user_id=user_id)], ignore_conflicts=True)
+            BookingCounts.objects.filter(user_id=user_id).update(**values)
+
+
+def booking_counts(user_id):
+    """{status: count} of the user's bookings"""
+    counts = BookingCounts.objects.filter(user_id=user_id).values(*STATUSES).first()
+    return counts or dict.fromkeys(STATUSES, 0)
+
+
+def batches(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def rebuild_court_counts(club_ids=None):
+    """Recompute the court counters of the clubs (default: all); returns how many were wrong"""
+    if club_ids is None:
+        club_ids = Club.objects.values_list('pk', flat=True)
+    repaired = 0
+    for batch in batches(club_ids):
+        with transaction.atomic():
+            current = {row.pop('pk'): row for row in Club.objects.select_for_update().filter(pk__in=batch).values(
+                'pk', *COURT_COUNT_FIELDS)}
+            counted = {club_id: dict.fromkeys(COURT_COUNT_FIELDS, 0) for club_id in current}
+            for row in Court.objects.filter(club_id__in=current).order_by().values(
+                    'club_id', 'court_type', 'is_active').annotate(count=Count('id')):
+                counted[row['club_id']][court_count_field(row['court_type'], row['is_active'])] = row['count']
+            wrong = [Club(pk=club_id, **counts) for club_id, counts in counted.items() if current[club_id] != counts]
+            Club.objects.bulk_update(wrong, COURT_COUNT_FIELDS)
+        repaired += len(wrong)
+    return repaired
+
+
+def rebuild_booking_counts(user_ids=None):
+    """Recompute the BookingCounts of the users (default: all); returns how many were wrong"""
+    if user_ids is None:
+        user_ids = User.objects.values_list('pk', flat=True)
+    repaired = 0
+    for batch in batches(user_ids):
+        with transaction.atomic():
+            current = {row.pop('user_id'): row for row in BookingCounts.objects.select_for_update().filter(
+                user_id__in=batch).values('user_id', *STATUSES)}
+            # Rows of users whose bookings are all gone go back to zero
+            counted = {user_id: dict.fromkeys(STATUSES, 0) for user_id in current}
+            for row in Booking.objects.filter(user_id__in=batch).order_by().values('user_id', 'status').annotate(
+                    count=Count('id')):
+                counted.setdefault(row['user_id'], dict.fromkeys(STATUSES, 0))[row['status']] = row['count']
+            wrong = [BookingCounts(user_id=user_id, **counts) for user_id, counts in counted.items()
+                     if current.get(user_id) != counts]
+            BookingCounts.objects.bulk_create(wrong, update_conflicts=True, unique_fields=['user'],
+                                              update_fields=STATUSES)
+        repaired += len(wrong)
+    return repaired
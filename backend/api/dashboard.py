@@ -0,0 +1,135 @@
+"""
+The manager dashboard: clubs, courts, one week of bookings (with the
+booking users), special hours and court restrictions in one normalized
+payload.
+
+Each club's part of the payload is cached under the club's generation,
+a random token in the cache that api.signals replaces once any write to
+the club, its courts, bookings, special hours or restrictions commits.
+A request reads the generations and the cached parts in two cache round
+trips. Parts that are missing are built for all those clubs together in
+a fixed number of queries, however many clubs, courts or bookings there
+are.
+"""
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Booking, Club, ClubSpecialHours, Court, CourtAvailabilityRestriction
+
+GENERATION_KEY = 'club:generation:{}'
+DASHBOARD_KEY = 'dashboard:{club_id}:{generation}:{week_start}'
+
+CLUB_FIELDS = [
+    'id', 'name', 'address', 'city', 'state', 'zip_code', 'manager', 'phone_number', 'email', 'website',
+    'opening_time', 'closing_time', 'min_booking_duration', 'max_booking_duration', 'booking_increment',
+    'max_advance_booking_days', 'same_day_booking_cutoff', 'is_approved',
+]
+COURT_FIELDS = ['id', 'club', 'court_type', 'court_number', 'is_active']
+BOOKING_FIELDS = ['id', 'court', 'user', 'booking_date', 'start_time', 'end_time', 'status', 'notes']
+USER_FIELDS = ['id', 'username', 'first_name', 'last_name', 'email']
+SPECIAL_HOURS_FIELDS = ['id', 'club', 'date', 'is_closed', 'opening_time', 'closing_time', 'reason']
+RESTRICTION_FIELDS = ['id', 'court', 'weekday', 'start_time', 'end_time', 'reason']
+SECTIONS = ['clubs', 'courts', 'bookings', 'users', 'special_hours', 'restrictions']
+
+
+def get_generations(club_ids):
+    """Current generation of each club"""
+    keys = {club_id: GENERATION_KEY.format(club_id) for club_id in club_ids}
+    found = cache.get_many(keys.values())
+    generations = {}
+    for club_id, key in keys.items():
+        if key not in found:
+            # Random rather than counting up, so a flushed cache can't bring an old generation back
+            cache.add(key, secrets.token_hex(4), timeout=None)
+            found[key] = cache.get(key)
+        generations[club_id] = found[key]
+    return generations
+
+
+def bump_generation(club_id):
+    cache.set(GENERATION_KEY.format(club_id), secrets.token_hex(4), timeout=None)
+
+
+def bump_generation_on_commit(club_ids):
+    """
+    Move the clubs to a new generation once the current transaction commits.
+    Bumping earlier would let a concurrent request cache the uncommitted
+    state under the new generation.
+    """
+    club_ids = set(club_ids) - {None}
+    if club_ids:
+        transaction.on_commit(lambda: [bump_generation(club_id) for club_id in club_ids], robust=True)
+
+
+def build_sections(club_ids, week_start, week_end):
+    """Dashboard parts of the given clubs, keyed by club ID"""
+    sections = {club_id: {name: [] for name in SECTIONS} for club_id in club_ids}
+
+    for club in Club.objects.filter(id__in=club_ids).values(*CLUB_FIELDS):
+        sections[club['id']]['clubs'].append(club)
+
+    for court in Court.objects.filter(club_id__in=club_ids).order_by('club_id', 'court_number').values(*COURT_FIELDS):
+        sections[court['club']]['courts'].append(court)
+
+    # Booking users come from the same query; each user is listed once per club
+    user_columns = {f'user__{field}': field for field in USER_FIELDS if field != 'id'}
+    bookings = Booking.objects.filter(
+        court__club_id__in=club_ids, booking_date__range=(week_start, week_end)
+    ).values(*BOOKING_FIELDS, 'court__club_id', *user_columns)
+    seen_users = set()
+    for row in bookings:
+        club_id = row.pop('court__club_id')
+        user = {'id': row['user'], **{field: row.pop(column) for column, field in user_columns.items()}}
+        sections[club_id]['bookings'].append(row)
+        if (club_id, user['id']) not in seen_users:
+            seen_users.add((club_id, user['id']))
+            sections[club_id]['users'].append(user)
+
+    special_hours = ClubSpecialHours.objects.filter(
+        club_id__in=club_ids, date__range=(week_start, week_end)
+    ).order_by('date').values(*SPECIAL_HOURS_FIELDS)
+    for row in special_hours:
+        sections[row['club']]['special_hours'].append(row)
+
+    restrictions = CourtAvailabilityRestriction.objects.filter(
+        court__club_id__in=club_ids
+    ).order_by('court_id', 'weekday', 'start_time').values(*RESTRICTION_FIELDS, 'court__club_id')
+    for row in restrictions:
+        sections[row.pop('court__club_id')]['restrictions'].append(row)
+
+    return sections
+
+
+def get_dashboard(club_ids, day):
+    """Dashboard payload for the clubs, covering the Monday-Sunday week of `day`"""
+    week_start = day - timedelta(days=day.weekday())
+    week_end = week_start + timedelta(days=6)
+    club_ids = sorted(club_ids)
+
+    generations = get_generations(club_ids)
+    keys = {
+        club_id: DASHBOARD_KEY.format(club_id=club_id, generation=generations[club_id], week_start=week_start)
+        for club_id in club_ids
+    }
+    cached = cache.get_many(keys.values())
+    sections = {club_id: cached[key] for club_id, key in keys.items() if key in cached}
+
+    missing = [club_id for club_id in club_ids if club_id not in sections]
+    if missing:
+        built = build_sections(missing, week_start, week_end)
+        cache.set_many(
+            {keys[club_id]: section for club_id, section in built.items()},
+            timeout=getattr(settings, 'DASHBOARD_CACHE_SECONDS', 300),
+        )
+        sections.update(built)
+
+    payload = {'week': {'start': str(week_start), 'end': str(week_end)}}
+    for name in SECTIONS:
+        payload[name] = [row for club_id in club_ids for row in sections[club_id][name]]
+    # A user who booked at several clubs appears in each club's part
+    payload['users'] = list({user['id']: user for user in payload['users']}.values())
+    return payload
@@ -0,0 +1,118 @@
+"""
+Read-replica routing.
+
+ReplicaRoutingMiddleware marks each request as read-only (GET, HEAD,
+OPTIONS) or not, and ReplicaRouter sends the reads of read-only requests
+to one of the aliases in settings.DATABASE_REPLICAS. Everything else goes
+to the primary ('default'): writes, every query of a write request, and
+anything run outside a request (management commands, shell).
+
+Replicas lag behind the primary, so after a successful (2xx or 3xx) write
+request the client is pinned to the primary for REPLICA_PIN_SECONDS: per user through the cache, and per
+browser through a cookie for clients that are not authenticated yet.
+"""
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'db_primary_pin'
+PIN_KEY = 'db:primary-pin:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.user_id = None
+
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def set_request_user(user_id):
+    """Called once the request's user is known, so per-user pins apply"""
+    state = _state.get()
+    if state is not None:
+        state.user_id = user_id
+
+
+def pin_user_to_primary(user_id):
+    cache.set(PIN_KEY.format(user_id), True, timeout=pin_seconds())
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = get_replicas()
+        if state is None or not state.use_replica or not replicas:
+            return DEFAULT_DB_ALIAS
+        if state.user_id is not None and cache.get(PIN_KEY.format(state.user_id)):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication
+        return db not in get_replicas()
+
+
+class ReplicaRoutingMiddleware:
+    # Runs natively in both stacks so async views don't pay a thread hop
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state, token = self._begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(request, response, state)
+
+    async def __acall__(self, request):
+        state, token = self._begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(request, response, state)
+
+    def _begin(self, request):
+        use_replica = request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+        state = RoutingState(use_replica)
+        return state, _state.set(state)
+
+    def _finish(self, request, response, state):
+        # Refused and failed writes changed nothing there is to read back
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            if state.user_id is not None:
+                pin_user_to_primary(state.user_id)
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds(), httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,243 @@
+"""
+Clubs near a ZIP code or a point.
+
+A club's coordinates are the centroid of its ZIP code, looked up in the
+ZIP centroid file (settings.ZIP_CENTROIDS_PATH, built from the Census
+ZCTA gazetteer by `manage.py build_zip_centroids`) whenever it is saved.
+
+Each process keeps the approved clubs in a KD-tree of 3D unit vectors,
+where chord length orders points exactly like great-circle distance.
+Clubs added, moved or unlisted since the tree was built sit in a small
+overlay searched by brute force, and are folded into a rebuilt tree once
+the overlay grows. Club changes replace a version token in the cache;
+a process that sees a new token only fetches the clubs updated since its
+last sync. Deleted clubs have no row left to fetch, so each deletion is
+also appended to a numbered log in the cache that processes read from
+where they left off; a process that finds part of it expired reloads.
+"""
+import csv
+import gzip
+import logging
+import math
+import secrets
+import threading
+from datetime import timedelta
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from scipy.spatial import cKDTree
+
+from .models import Club
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_MILES = 3958.8
+VERSION_KEY = 'clubs:locations:version'
+DELETED_SEQUENCE_KEY = 'clubs:locations:deleted'
+DELETED_KEY = 'clubs:locations:deleted:{}'
+DELETED_TTL = 7 * 24 * 3600
+# A process further behind the deletion log than this reloads instead
+MAX_DELETED_CATCH_UP = 1000
+# Re-read clubs updated this long before the last sync, in case app server clocks differ
+SYNC_OVERLAP = timedelta(minutes=5)
+MIN_REBUILD_CHANGES = 1000
+# Nearest clubs checked against the query filters before giving up
+MAX_CANDIDATES = 5000
+
+
+@lru_cache(maxsize=1)
+def zip_centroids():
+    """{zip code: (latitude, longitude)}"""
+    path = settings.ZIP_CENTROIDS_PATH
+    try:
+        with gzip.open(path, 'rt', newline='') as stream:
+            return {
+                row['zip']: (float(row['latitude']), float(row['longitude']))
+                for row in csv.DictReader(stream)
+            }
+    except FileNotFoundError:
+        logger.warning("ZIP centroid file %s not found; run manage.py build_zip_centroids", path)
+        return {}
+
+
+def zip_location(zip_code):
+    """(latitude, longitude) of a ZIP or ZIP+4 code, or None"""
+    return zip_centroids().get((zip_code or '').strip()[:5])
+
+
+def unit_vectors(latitudes, longitudes):
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    cos_latitudes = np.cos(latitudes)
+    return np.column_stack([
+        cos_latitudes * np.cos(longitudes), cos_latitudes * np.sin(longitudes), np.sin(latitudes),
+    ])
+
+
+def chord_to_miles(chord):
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.minimum(np.asarray(chord) / 2, 1.0))
+
+
+def miles_to_chord(miles):
+    return 2 * math.sin(min(miles / EARTH_RADIUS_MILES, math.pi) / 2)
+
+
+def is_listed(is_approved, latitude, longitude):
+    return bool(is_approved) and latitude is not None and longitude is not None
+
+
+class ClubLocationIndex:
+    """Nearest-neighbour index of the approved clubs with coordinates"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tree = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.tree_ids = set()
+        # Clubs added or moved since the build, and tree entries no longer valid
+        self.overlay = {}
+        self.removed = set()
+        self.version = None
+        self.synced_to = None
+        self.deleted_to = 0
+
+    def reset(self):
+        """Reload everything on the next sync"""
+        with self.lock:
+            self.synced_to = None
+
+    def build(self, ids, vectors):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.tree = cKDTree(vectors) if len(self.ids) else None
+        self.tree_ids = set(self.ids.tolist())
+        self.overlay, self.removed = {}, set()
+
+    def load(self, rows):
+        """Replace the index with rows of (id, latitude, longitude, is_approved)"""
+        listed = [(club_id, lat, lon) for club_id, lat, lon, approved in rows if is_listed(approved, lat, lon)]
+        if listed:
+            ids, latitudes, longitudes = zip(*listed)
+            self.build(ids, unit_vectors(latitudes, longitudes))
+        else:
+            self.build([], np.empty((0, 3)))
+
+    def apply(self, rows):
+        """Fold changed clubs, rows of (id, latitude, longitude, is_approved), into the overlay"""
+        for club_id, latitude, longitude, approved in rows:
+            if club_id in self.tree_ids:
+                self.removed.add(club_id)
+            if is_listed(approved, latitude, longitude):
+                self.overlay[club_id] = unit_vectors([latitude], [longitude])[0]
+            else:
+                self.overlay.pop(club_id, None)
+
+        if len(self.overlay) + len(self.removed) > max(MIN_REBUILD_CHANGES, len(self.ids) // 10):
+            keep = np.array([club_id not in self.removed for club_id in self.ids.tolist()], dtype=bool)
+            ids = self.ids[keep].tolist() + list(self.overlay)
+            vectors = [self.tree.data[keep]] if self.tree is not None else []
+            if self.overlay:
+                vectors.append(np.array(list(self.overlay.values())))
+            self.build(ids, np.concatenate(vectors) if vectors else np.empty((0, 3)))
+
+    def sync(self):
+        """Catch up with club changes made anywhere since the last sync"""
+        version = cache.get(VERSION_KEY)
+        if self.synced_to is not None and version == self.version:
+            return
+        with self.lock:
+            if self.synced_to is not None and version == self.version:
+                return
+            columns = ('id', 'latitude', 'longitude', 'is_approved', 'updated_at')
+            # Read before the rows, so a deletion logged meanwhile is applied by the next sync
+            deleted_to = cache.get(DELETED_SEQUENCE_KEY, 0)
+            deleted = self.deleted_since(deleted_to) if self.synced_to is not None else None
+            if deleted is None:
+                rows = list(Club.objects.order_by().values_list(*columns))
+                self.synced_to = None
+                self.load([row[:4] for row in rows])
+            else:
+                rows = list(Club.objects.filter(
+                    updated_at__gte=self.synced_to - SYNC_OVERLAP
+                ).order_by().values_list(*columns))
+                self.apply([row[:4] for row in rows] + [(club_id, None, None, False) for club_id in deleted])
+            self.deleted_to = deleted_to
+            latest = max((row[4] for row in rows), default=None)
+            if latest is not None and (self.synced_to is None or latest > self.synced_to):
+                self.synced_to = latest
+            elif self.synced_to is None:
+                self.synced_to = timezone.now()
+            self.version = version
+
+    def deleted_since(self, deleted_to):
+        """IDs of the clubs deleted since the last sync, or None if the log no longer has them all"""
+        if not 0 <= deleted_to - self.deleted_to <= MAX_DELETED_CATCH_UP:
+            return None
+        keys = [DELETED_KEY.format(number) for number in range(self.deleted_to + 1, deleted_to + 1)]
+        deleted = cache.get_many(keys)
+        return list(deleted.values()) if len(deleted) == len(keys) else None
+
+    def nearest(self, latitude, longitude, count, max_miles):
+        """Up to `count` (club ID, miles) pairs within max_miles, nearest first"""
+        point = unit_vectors([latitude], [longitude])[0]
+        bound = miles_to_chord(max_miles)
+        with self.lock:
+            found = []
+            if self.tree is not None:
+                wanted = min(count + len(self.removed), len(self.ids))
+                distances, positions = self.tree.query(point, k=wanted, distance_upper_bound=bound)
+                for distance, position in zip(np.atleast_1d(distances), np.atleast_1d(positions)):
+                    if math.isinf(distance):
+                        break
+                    club_id = int(self.ids[position])
+                    if club_id not in self.removed:
+                        found.append((distance, club_id))
+            if self.overlay:
+                ids = list(self.overlay)
+                distances = np.linalg.norm(np.array([self.overlay[club_id] for club_id in ids]) - point, axis=1)
+                found.extend((distance, club_id) for distance, club_id in zip(distances, ids) if distance <= bound)
+        found.sort()
+        return [(club_id, float(chord_to_miles(distance))) for distance, club_id in found[:count]]
+
+
+club_locations = ClubLocationIndex()
+
+
+def log_deleted(club_id):
+    try:
+        number = cache.incr(DELETED_SEQUENCE_KEY)
+    except ValueError:
+        cache.add(DELETED_SEQUENCE_KEY, 0, timeout=None)
+        number = cache.incr(DELETED_SEQUENCE_KEY)
+    cache.set(DELETED_KEY.format(number), club_id, timeout=DELETED_TTL)
+
+
+def locations_changed_on_commit(deleted_id=None):
+    """Tell every process's index to sync once the current transaction commits"""
+    def changed():
+        if deleted_id is not None:
+            log_deleted(deleted_id)
+        cache.set(VERSION_KEY, secrets.token_hex(4), timeout=None)
+
+    transaction.on_commit(changed, robust=True)
+
+
+def nearby_clubs(queryset, latitude, longitude, max_miles, limit):
+    """
+    [(club ID, miles)] of the nearest clubs in `queryset` (which may carry
+    any other filters) within max_miles. The index proposes candidates
+    nearest first and each round checks them against the queryset in one
+    query, widening until `limit` clubs pass or the radius is exhausted.
+    """
+    club_locations.sync()
+    count = limit * 2
+    while True:
+        candidates = club_locations.nearest(latitude, longitude, count, max_miles)
+        matching = set(queryset.filter(pk__in=[club_id for club_id, _ in candidates]).values_list('pk', flat=True))
+        results = [(club_id, miles) for club_id, miles in candidates if club_id in matching]
+        if len(results) >= limit or len(candidates) < count or count >= MAX_CANDIDATES:
+            return results[:limit]
+        count = min(count * 4, MAX_CANDIDATES)
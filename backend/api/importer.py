@@ -0,0 +1,369 @@
+"""
+Streaming CSV import of clubs, courts, special hours and court restrictions.
+
+One file holds all four kinds of record, told apart by the `record`
+column (club, court, special_hours or restriction):
+
+    record,club,zip_code,address,city,state,court_number,court_type,date,is_closed,weekday,start_time,end_time
+    club,Riverside TC,62701,1 Main St,Springfield,IL,,,,,,,
+    court,Riverside TC,62701,,,,1,clay,,,,,
+    special_hours,Riverside TC,62701,,,,,,2025-12-25,yes,,,
+    restriction,Riverside TC,62701,,,,1,,,,monday,08:00,10:00
+
+Clubs are identified by name and ZIP code, courts by club and court
+number, special hours by club and date, and restrictions by court,
+weekday and times. A row matching an existing object updates the
+columns it fills in; other rows create objects, with model defaults for
+the columns left empty. A club's row must come before the rows that
+refer to it.
+
+Rows are read and written in chunks, each in its own transaction and a
+fixed number of queries, so memory stays flat however long the file is.
+Invalid rows are skipped and reported by line number, as are rows the
+csv module can't parse. A byte that isn't UTF-8 stops the import there:
+the chunks before it stay committed, and the report says how many rows
+they held and that the file was not read to the end. The bulk writes
+skip the model signals: imported clubs don't mail the superusers, and
+coordinates, court counters, the dashboard generations and the nearby
+search index are taken care of here instead.
+"""
+import csv
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .club_config import bump_config_version_on_commit
+from .counters import rebuild_court_counts
+from .dashboard import bump_generation_on_commit
+from .geo import locations_changed_on_commit, zip_location
+from .models import Club, ClubSpecialHours, Court, CourtAvailabilityRestriction
+from .response_cache import invalidate_tags_on_commit
+
+CHUNK_SIZE = 2000
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+# record: (model, key columns after club and zip_code, value columns, columns required to create)
+RECORDS = {
+    'club': (Club, [], [
+        'address', 'city', 'state', 'phone_number', 'email', 'website', 'opening_time', 'closing_time',
+        'min_booking_duration', 'max_booking_duration', 'booking_increment', 'max_advance_booking_days',
+        'same_day_booking_cutoff', 'is_approved',
+    ], ['address', 'city', 'state']),
+    'court': (Court, ['court_number'], ['court_type', 'is_active'], ['court_type']),
+    'special_hours': (ClubSpecialHours, ['date'], ['is_closed', 'opening_time', 'closing_time', 'reason'], []),
+    'restriction': (CourtAvailabilityRestriction, ['court_number', 'weekday', 'start_time', 'end_time'],
+                    ['reason'], []),
+}
+COLUMNS = {'record', 'club', 'zip_code'} | {
+    column for _, keys, values, _ in RECORDS.values() for column in keys + values
+}
+# Columns naming the club or court a row belongs to
+COLUMN_MODELS = {'club': Club, 'zip_code': Club, 'court_number': Court}
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+WEEKDAYS = {name.lower(): number for number, name in CourtAvailabilityRestriction.WEEKDAYS}
+
+
+class CSVImportError(Exception):
+    """The file as a whole can't be imported"""
+
+
+class RowError(Exception):
+    pass
+
+
+class ImportReport:
+    def __init__(self, max_errors=MAX_REPORTED_ERRORS):
+        self.rows = 0
+        self.committed_rows = 0
+        # (line, reason) of the undecodable text that ended the import early
+        self.stopped_at = None
+        self.created = Counter()
+        self.updated = Counter()
+        self.errors = []
+        self.error_count = 0
+        self.max_errors = max_errors
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'committed_rows': self.committed_rows,
+            'complete': self.stopped_at is None,
+            'created': {record: self.created[record] for record in RECORDS},
+            'updated': {record: self.updated[record] for record in RECORDS},
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+def parse_value(model, column, raw):
+    """Python value of a non-empty cell, validated by the model field"""
+    field = model._meta.get_field('name' if column == 'club' else column)
+    if field.get_internal_type() == 'BooleanField':
+        if raw.lower() in TRUE_VALUES:
+            return True
+        if raw.lower() in FALSE_VALUES:
+            return False
+        raise ValidationError(f'"{raw}" is not a yes/no value.')
+    if column == 'weekday' and raw.lower() in WEEKDAYS:
+        return WEEKDAYS[raw.lower()]
+    return field.clean(raw, None)
+
+
+def parse_row(row):
+    """(record, key, values) of a CSV row; raises RowError"""
+    if None in row:
+        raise RowError('More cells than columns.')
+    record = (row.get('record') or '').strip().lower()
+    if record not in RECORDS:
+        raise RowError(f'Unknown record "{record}", expected one of {", ".join(RECORDS)}.')
+    model, key_columns, value_columns, _ = RECORDS[record]
+
+    errors, key, values = [], [], {}
+    for column in ['club', 'zip_code'] + key_columns + value_columns:
+        raw = (row.get(column) or '').strip()
+        if not raw:
+            if column in value_columns:
+                continue
+            errors.append(f'{column}: This field is required.')
+            continue
+        try:
+            value = parse_value(COLUMN_MODELS.get(column, model), column, raw)
+        except ValidationError as error:
+            errors.append(f'{column}: {" ".join(error.messages)}')
+            continue
+        if column in value_columns:
+            values[column] = value
+        else:
+            key.append(value)
+    if errors:
+        raise RowError(' '.join(errors))
+    return record, tuple(key), values
+
+
+def check_club(club):
+    if club.opening_time >= club.closing_time:
+        return 'closing_time must be after opening_time.'
+    if club.min_booking_duration > club.max_booking_duration:
+        return 'max_booking_duration must not be below min_booking_duration.'
+    if club.booking_increment <= 0:
+        return 'booking_increment must be positive.'
+
+
+def check_special_hours(hours):
+    if hours.is_closed:
+        return None
+    if hours.opening_time is None or hours.closing_time is None:
+        return 'opening_time and closing_time are required unless is_closed.'
+    if hours.opening_time >= hours.closing_time:
+        return 'closing_time must be after opening_time.'
+
+
+def check_restriction(restriction):
+    if restriction.start_time >= restriction.end_time:
+        return 'end_time must be after start_time.'
+
+
+def new_club(key):
+    club = Club(name=key[0], zip_code=key[1])
+    club.latitude, club.longitude = zip_location(key[1]) or (None, None)
+    return club
+
+
+def upsert(record, rows, existing, build, report, counts, check=None):
+    """
+    Create or update the objects for `rows` ({key: (line, values)}).
+    `existing` maps keys to stored objects and gains the created ones.
+    """
+    model, _, _, required = RECORDS[record]
+    new, changed, fields = [], [], set()
+    for key, (line, values) in rows.items():
+        obj = existing.get(key)
+        if obj is None:
+            missing = [column for column in required if column not in values]
+            if missing:
+                report.error(line, f'{", ".join(missing)} required to create a {record}.')
+                continue
+            obj = build(key)
+        differing = [column for column, value in values.items() if getattr(obj, column) != value]
+        for column in differing:
+            setattr(obj, column, values[column])
+        problem = check(obj) if check else None
+        if problem:
+            report.error(line, problem)
+            continue
+        if obj.pk is None:
+            new.append(obj)
+            existing[key] = obj
+        elif differing:
+            # Unchanged rows cost nothing when a file is imported again
+            changed.append(obj)
+            fields.update(differing)
+
+    model.objects.bulk_create(new, batch_size=BATCH_SIZE)
+    if changed:
+        if any(field.name == 'updated_at' for field in model._meta.fields):
+            now = timezone.now()
+            for obj in changed:
+                obj.updated_at = now
+            fields.add('updated_at')
+        model.objects.bulk_update(changed, sorted(fields), batch_size=BATCH_SIZE)
+    counts['created', record] += len(new)
+    counts['updated', record] += len(changed)
+
+
+def import_chunk(chunk, report):
+    """Write one chunk of parsed rows [(line, record, key, values)]; returns the counts"""
+    rows = {record: {} for record in RECORDS}
+    for line, record, key, values in chunk:
+        if key in rows[record]:
+            # Repeated rows for one object merge, the later cells winning
+            rows[record][key][1].update(values)
+        else:
+            rows[record][key] = (line, values)
+    counts = Counter()
+
+    club_keys = {key[:2] for record_rows in rows.values() for key in record_rows}
+    clubs = {}
+    for club in Club.objects.filter(
+        name__in={name for name, _ in club_keys}, zip_code__in={zip_code for _, zip_code in club_keys}
+    ).order_by('id'):
+        clubs.setdefault((club.name, club.zip_code), club)
+    upsert('club', rows['club'], clubs, new_club, report, counts, check_club)
+    if counts['created', 'club'] or counts['updated', 'club']:
+        locations_changed_on_commit()
+
+    def resolve(record):
+        """Rows of a record with the club replaced by its ID in the keys"""
+        resolved = {}
+        for key, (line, values) in rows[record].items():
+            club = clubs.get(key[:2])
+            if club is None or club.pk is None:
+                report.error(line, f'Club "{key[0]}" ({key[1]}) not found.')
+            else:
+                resolved[(club.pk,) + key[2:]] = (line, values)
+        return resolved
+
+    court_rows = resolve('court')
+    restriction_rows = resolve('restriction')
+    court_keys = {key[:2] for key in list(court_rows) + list(restriction_rows)}
+    courts = {
+        (court.club_id, court.court_number): court
+        for court in Court.objects.filter(
+            club_id__in={club_id for club_id, _ in court_keys},
+            court_number__in={number for _, number in court_keys},
+        )
+    }
+    upsert('court', court_rows, courts,
+           lambda key: Court(club_id=key[0], court_number=key[1]), report, counts)
+
+    hours_rows = resolve('special_hours')
+    special_hours = {
+        (hours.club_id, hours.date): hours
+        for hours in ClubSpecialHours.objects.filter(
+            club_id__in={club_id for club_id, _ in hours_rows}, date__in={day for _, day in hours_rows},
+        )
+    }
+    upsert('special_hours', hours_rows, special_hours,
+           lambda key: ClubSpecialHours(club_id=key[0], date=key[1]), report, counts, check_special_hours)
+
+    by_court = {}
+    for key, (line, values) in restriction_rows.items():
+        court = courts.get(key[:2])
+        if court is None or court.pk is None:
+            report.error(line, f'Court {key[1]} not found.')
+        else:
+            by_court[(court.pk,) + key[2:]] = (line, values)
+    restrictions = {}
+    for restriction in CourtAvailabilityRestriction.objects.filter(
+        court_id__in={court_id for court_id, *_ in by_court}, weekday__in={key[1] for key in by_court},
+    ).order_by('id'):
+        restrictions.setdefault(
+            (restriction.court_id, restriction.weekday, restriction.start_time, restriction.end_time), restriction
+        )
+    upsert('restriction', by_court, restrictions,
+           lambda key: CourtAvailabilityRestriction(court_id=key[0], weekday=key[1], start_time=key[2],
+                                                    end_time=key[3]),
+           report, counts, check_restriction)
+
+    # bulk_create and bulk_update skip the signals that count courts
+    rebuild_court_counts({club_id for club_id, _ in court_rows})
+
+    bump_generation_on_commit({club.pk for club in clubs.values()})
+    bump_config_version_on_commit({club.pk for club in clubs.values()})
+    invalidate_tags_on_commit({'clubs', 'courts', *(f'club:{club.pk}' for club in clubs.values())})
+    return counts
+
+
+def write_chunk(chunk, report):
+    try:
+        with transaction.atomic():
+            counts = import_chunk(chunk, report)
+    except DatabaseError as error:
+        report.error(chunk[0][0], f'Rows up to line {chunk[-1][0]} were not imported: {error}')
+        return
+    report.committed_rows += len(chunk)
+    for (kind, record), count in counts.items():
+        (report.created if kind == 'created' else report.updated)[record] += count
+
+
+def read_rows(reader, report):
+    """
+    (line, row) of each row the csv module can parse, the others reported.
+    Stops at the first undecodable byte, noting where in the report.
+    """
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            # DictReader.line_num only moves on rows it returns
+            report.rows += 1
+            report.error(reader.reader.line_num, f'Unreadable row: {error}.')
+            continue
+        except UnicodeDecodeError as error:
+            report.stopped_at = (reader.reader.line_num + 1, error.reason)
+            return
+        report.rows += 1
+        yield reader.line_num, row
+
+
+def import_csv(stream, chunk_size=CHUNK_SIZE, max_errors=MAX_REPORTED_ERRORS):
+    """Import an open text stream of CSV; returns an ImportReport"""
+    reader = csv.DictReader(stream)
+    try:
+        header = reader.fieldnames
+    except (csv.Error, UnicodeDecodeError) as error:
+        raise CSVImportError(f'The header line can\'t be read: {error}')
+    if not header or 'record' not in header:
+        raise CSVImportError('The first line must be a header with a "record" column.')
+    unknown = set(header) - COLUMNS
+    if unknown:
+        raise CSVImportError(f'Unknown columns: {", ".join(sorted(unknown))}.')
+
+    report = ImportReport(max_errors)
+    chunk = []
+    for line, row in read_rows(reader, report):
+        try:
+            chunk.append((line, *parse_row(row)))
+        except RowError as error:
+            report.error(line, str(error))
+        if len(chunk) >= chunk_size:
+            write_chunk(chunk, report)
+            chunk = []
+    if chunk:
+        write_chunk(chunk, report)
+    if report.stopped_at:
+        line, reason = report.stopped_at
+        report.error(line, f'Not valid UTF-8 from here on ({reason}), so the file was read no further. '
+                           f'{report.committed_rows} rows before this line were committed.')
+    return report
@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.partitioning import (
+    ARCHIVE_SCHEMA, add_months, detach_partition, export_and_drop, is_partitioned, list_partitions, month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Detach booking partitions older than the retention period. Detached partitions are moved to the "
+        f"{ARCHIVE_SCHEMA} schema, or written to CSV and dropped with --export-dir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=12,
+                            help='Months of past bookings to keep attached, besides the current month')
+        parser.add_argument('--export-dir', help='Write each detached partition to CSV here, then drop it')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError("The booking table is not partitioned (PostgreSQL only, see migration 0007)")
+
+        cutoff = add_months(month_start(timezone.localdate()), -options['keep_months'])
+        old_months = [month for month in list_partitions() if month < cutoff]
+        if not old_months:
+            self.stdout.write("No partitions older than the retention period")
+            return
+
+        for month in old_months:
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {month:%Y-%m}")
+                continue
+
+            table = detach_partition(month)
+            if options['export_dir']:
+                path = os.path.join(options['export_dir'], f"bookings_{month:%Y_%m}.csv")
+                export_and_drop(table, path)
+                self.stdout.write(f"Exported {month:%Y-%m} to {path}")
+            else:
+                self.stdout.write(f"Moved {month:%Y-%m} to {table}")
@@ -0,0 +1,219 @@
+import json
+import math
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max, Min
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import Booking, Court
+from api.tokens import ClaimsRefreshToken
+from .seed_benchmark_data import NAME_WORDS, USERNAME_PREFIX, benchmark_clubs, slot_time
+
+RUN_NOTE = 'benchmark-api-run'
+
+
+class QueryCounter:
+    """Execute wrapper counting the queries of every connection"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(timings, queries, statuses):
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'statuses': dict(sorted(Counter(statuses).items())),
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'max_ms': round(timings[-1], 2),
+        'queries': {'min': min(queries), 'median': statistics.median(queries), 'max': max(queries)},
+    }
+
+
+def compare(results, baseline):
+    """Change of each latency percentile (in percent) and of the median query count"""
+    changes = {}
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        changes[name] = {
+            key: round(100 * (current[key] - previous[key]) / previous[key], 1) if previous[key] else None
+            for key in ('p50_ms', 'p95_ms', 'p99_ms')
+        }
+        changes[name]['queries_median'] = current['queries']['median'] - previous['queries']['median']
+    return {'commit': baseline.get('commit'), 'percent_change': changes}
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the real API routes through the test client against data from seed_benchmark_data and "
+        "report latency percentiles and query counts per scenario as JSON."
+    )
+    scenarios = ('club_list', 'club_search', 'available_slots', 'calendar', 'club_calendar', 'club_utilization',
+                 'booking_create')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario')
+        parser.add_argument('--scenario', action='append', choices=self.scenarios,
+                            help='Run only this scenario (repeatable)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the requests made')
+        parser.add_argument('--output', help='Also write the results to this file')
+        parser.add_argument('--compare', help='Results file of an earlier run to compare against')
+        parser.add_argument('--throttles', action='store_true', help='Keep the token bucket throttles on')
+        parser.add_argument('--response-cache', action='store_true',
+                            help='Turn the response cache on (measured requests are then mostly hits)')
+        parser.add_argument('--no-metrics', action='store_true',
+                            help='Leave out MetricsMiddleware, to --compare against a run with it for its overhead')
+
+    def handle(self, *args, **options):
+        self.prepare(options['seed'])
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+                     'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend'}
+        if not options['throttles']:
+            overrides['TOKEN_BUCKET_THROTTLES'] = {}
+        # One process, so even a local memory cache is coherent here
+        overrides['RESPONSE_CACHE_SECONDS'] = (settings.RESPONSE_CACHE_SECONDS or 60) if options['response_cache'] else 0
+        if options['no_metrics']:
+            # The clients load their middleware on the first request, inside the overrides
+            overrides['MIDDLEWARE'] = [path for path in settings.MIDDLEWARE if path != 'api.metrics.MetricsMiddleware']
+
+        results = {
+            'commit': current_commit(),
+            'started_at': timezone.now().isoformat(timespec='seconds'),
+            'vendor': connection.vendor,
+            'async_read_views': settings.ASYNC_READ_VIEWS,
+            'response_cache': options['response_cache'],
+            'metrics': not options['no_metrics'],
+            'dataset': {
+                'clubs': len(self.club_ids),
+                'courts': len(self.courts),
+                'bookings': Booking.objects.filter(court__club__in=benchmark_clubs()).count(),
+            },
+            'scenarios': {},
+        }
+        counter = QueryCounter()
+        with override_settings(**overrides), ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            try:
+                for name in options['scenario'] or self.scenarios:
+                    results['scenarios'][name] = self.run(name, counter, options)
+            finally:
+                for booking in Booking.objects.filter(notes=RUN_NOTE):
+                    booking.delete()
+
+        if options['compare']:
+            with open(options['compare']) as stream:
+                results['compared_to'] = compare(results, json.load(stream))
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as stream:
+                stream.write(output + '\n')
+        self.stdout.write(output)
+
+    def prepare(self, seed):
+        self.rng = random.Random(seed)
+        self.club_ids = list(benchmark_clubs().order_by('pk').values_list('pk', flat=True))
+        if not self.club_ids:
+            raise CommandError("No benchmark data; run manage.py seed_benchmark_data first")
+        # The first few pages of the club list, as far as there are any
+        self.club_pages = min(5, math.ceil(len(self.club_ids) / settings.REST_FRAMEWORK['PAGE_SIZE']))
+        self.courts = list(Court.objects.filter(club_id__in=self.club_ids, is_active=True)
+                           .order_by('pk').values_list('pk', 'club__opening_time'))
+        window = Booking.objects.filter(court__club_id__in=self.club_ids).aggregate(
+            first=Min('booking_date'), last=Max('booking_date'))
+        today = timezone.localdate()
+        self.first_day, self.last_day = window['first'] or today, window['last'] or today
+        # New bookings go after the seeded ones, one court at a time, so they never conflict
+        self.next_court = 0
+
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX, is_superuser=False)
+        player = users.filter(bookings__isnull=False).order_by('pk').first() or users.order_by('pk').first()
+        admin, _ = User.objects.get_or_create(username=f'{USERNAME_PREFIX}admin',
+                                              defaults={'is_superuser': True, 'is_staff': True})
+        self.clients = {}
+        for role, user in (('player', player), ('admin', admin)):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+            self.clients[role] = client
+
+    def random_day(self):
+        return self.first_day + timedelta(days=self.rng.randrange((self.last_day - self.first_day).days + 1))
+
+    def request(self, name):
+        """(client role, method, path, data) of the next request of a scenario"""
+        if name == 'club_list':
+            return 'player', 'get', f'/api/clubs/?page={self.rng.randint(1, self.club_pages)}', None
+        if name == 'club_search':
+            return 'player', 'get', f'/api/clubs/?search={self.rng.choice(NAME_WORDS).lower()}', None
+        if name == 'available_slots':
+            return 'player', 'get', (f'/api/bookings/available_slots/?club_id={self.rng.choice(self.club_ids)}'
+                                     f'&date={self.random_day()}'), None
+        if name == 'calendar':
+            start = self.random_day()
+            return 'player', 'get', f'/api/bookings/calendar/?start_date={start}&end_date={start + timedelta(days=7)}', None
+        if name == 'club_calendar':
+            start = self.random_day()
+            return 'admin', 'get', (f'/api/bookings/calendar/?club={self.rng.choice(self.club_ids)}'
+                                    f'&start_date={start}&end_date={start + timedelta(days=6)}'), None
+        if name == 'club_utilization':
+            # The whole seeded window, as far as the range cap allows
+            start = max(self.first_day, self.last_day - timedelta(days=settings.UTILIZATION_MAX_DAYS - 1))
+            return 'admin', 'get', (f'/api/clubs/{self.rng.choice(self.club_ids)}/utilization/'
+                                    f'?start_date={start}&end_date={self.last_day}'), None
+        court_id, opening = self.courts[self.next_court % len(self.courts)]
+        day = self.last_day + timedelta(days=1 + self.next_court // len(self.courts))
+        self.next_court += 1
+        return 'player', 'post', '/api/bookings/', {
+            'court': court_id, 'booking_date': day.isoformat(), 'start_time': opening.isoformat(),
+            'end_time': slot_time(opening, 2).isoformat(), 'notes': RUN_NOTE,
+        }
+
+    def run(self, name, counter, options):
+        timings, queries, statuses = [], [], []
+        for number in range(options['warmup'] + options['requests']):
+            role, method, path, data = self.request(name)
+            client = self.clients[role]
+            counter.count = 0
+            started = time.perf_counter()
+            response = getattr(client, method)(path, data, format='json') if data else getattr(client, method)(path)
+            elapsed = (time.perf_counter() - started) * 1000
+            if number >= options['warmup']:
+                timings.append(elapsed)
+                queries.append(counter.count)
+                statuses.append(response.status_code)
+        return summarize(timings, queries, statuses)
@@ -0,0 +1,126 @@
+import itertools
+import json
+import random
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from api.geo import ClubLocationIndex
+from api.models import Club
+from api.search import autocomplete_clubs, search_clubs, search_terms
+
+BENCH_ADDRESS = 'club-search-benchmark'
+NAME_WORDS = [
+    'Riverside', 'Lakeside', 'Oakwood', 'Maple', 'Cedar', 'Highland', 'Sunset', 'Harbor', 'Valley', 'Summit',
+    'Meadow', 'Willow', 'Granite', 'Pinecrest', 'Brookfield', 'Fairview', 'Westgate', 'Northridge', 'Eastwood',
+    'Silverlake', 'Ashford', 'Kingsley', 'Bayview', 'Stonebridge', 'Greenfield', 'Hillcrest', 'Redwood',
+]
+NAME_SUFFIXES = ['Tennis Club', 'Racquet Club', 'Tennis Center', 'Country Club', 'Sports Club', 'Tennis Academy']
+CITIES = [
+    ('Springfield', 'IL'), ('Portland', 'OR'), ('Austin', 'TX'), ('Denver', 'CO'), ('Madison', 'WI'),
+    ('Savannah', 'GA'), ('Boulder', 'CO'), ('Raleigh', 'NC'), ('Tucson', 'AZ'), ('Burlington', 'VT'),
+    ('Sacramento', 'CA'), ('Richmond', 'VA'), ('Columbus', 'OH'), ('Spokane', 'WA'), ('Albany', 'NY'),
+]
+SEARCHES = ['riverside', 'river', 'riverside tennis', 'rivrside', 'oakwod racquet', 'denver', 'tennis academy co']
+AUTOCOMPLETES = ['r', 'ri', 'riv', 'oakw', 'silverl']
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic clubs and time ranked club search and autocomplete against the old "
+        "icontains search, and nearest-club lookups in the in-memory location index. Only run "
+        "against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clubs', type=int, default=100_000, help='Synthetic clubs to seed')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs of each query')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded clubs')
+        parser.add_argument('--skip-seed', action='store_true', help='Reuse clubs seeded by an earlier run')
+
+    def handle(self, *args, **options):
+        results = {'clubs': options['clubs'], 'vendor': connection.vendor}
+        if not options['skip_seed']:
+            started = time.monotonic()
+            self.seed(options['clubs'])
+            results['seed_seconds'] = round(time.monotonic() - started, 2)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Club._meta.db_table}')
+
+        clubs = Club.objects.filter(address=BENCH_ADDRESS)
+        results['search'] = {
+            text: {
+                'ranked': self.measure(lambda: list(search_clubs(clubs, text)[:20]), options['repeat']),
+                'icontains': self.measure(lambda: list(self.icontains(clubs, text)[:20]), options['repeat']),
+                'matches': search_clubs(clubs, text).count(),
+                'indexes': self.indexes_used(search_clubs(clubs, text)[:20]),
+            }
+            for text in SEARCHES
+        }
+        results['autocomplete'] = {
+            text: self.measure(lambda: autocomplete_clubs(clubs, text), options['repeat'])
+            for text in AUTOCOMPLETES
+        }
+
+        results['nearby'] = self.nearby(options['clubs'], options['repeat'])
+
+        if not options['keep']:
+            clubs.delete()
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def seed(self, count):
+        rng = random.Random(0)
+        batch = []
+        for number in range(count):
+            city, state = rng.choice(CITIES)
+            batch.append(Club(
+                name=f'{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {rng.choice(NAME_SUFFIXES)}',
+                address=BENCH_ADDRESS, city=city, state=state, zip_code=f'{number % 100000:05d}', is_approved=True,
+            ))
+            if len(batch) == 5000:
+                Club.objects.bulk_create(batch)
+                batch = []
+        Club.objects.bulk_create(batch)
+
+    def nearby(self, count, repeat):
+        """Nearest 20 clubs within 50 and 300 miles, among `count` random points over the US"""
+        rng = random.Random(0)
+        index = ClubLocationIndex()
+        index.load([(club_id, rng.uniform(25, 49), rng.uniform(-124, -67), True) for club_id in range(count)])
+        # A realistic overlay of recent changes on top of the tree
+        index.apply([(club_id, rng.uniform(25, 49), rng.uniform(-124, -67), True)
+                     for club_id in range(min(count, 500))])
+        # A different point on each run
+        points = itertools.cycle([(rng.uniform(30, 45), rng.uniform(-110, -80)) for _ in range(repeat)])
+        return {
+            f'{miles}_miles': self.measure(lambda: index.nearest(*next(points), 20, miles), repeat)
+            for miles in (50, 300)
+        }
+
+    def icontains(self, queryset, text):
+        """The SearchFilter query this search replaced"""
+        for term in search_terms(text):
+            queryset = queryset.filter(Q(name__icontains=term) | Q(city__icontains=term) | Q(state__icontains=term))
+        return queryset
+
+    def measure(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {
+            'median_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        }
+
+    def indexes_used(self, queryset):
+        if connection.vendor != 'postgresql':
+            return []
+        return sorted(set(re.findall(r'Index Scan on (\w+)', queryset.explain())))
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.models import Club, Court
+from api.tokens import ClaimsRefreshToken
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many simultaneous connections against a running server and report latency for the "
+        "read-heavy endpoints. Run it once against the async views and once with ASYNC_READ_VIEWS=0, "
+        "e.g. with the server started as `uvicorn backend.asgi:application --workers 4`. "
+        "1000 connections need an open file limit above 1000 on both ends (ulimit -n), and the "
+        "availability throttles (TOKEN_BUCKET_THROTTLES) should be raised for the run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server')
+        parser.add_argument('--connections', type=int, default=1000, help='Simultaneous connections')
+        parser.add_argument('--requests', type=int, default=5, help='Requests per connection (keep-alive)')
+        parser.add_argument('--username', help='User to authenticate as (default: first superuser)')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request, repeatable (default: the async read endpoints)')
+        parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout in seconds')
+
+    def handle(self, *args, **options):
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError("No user to authenticate as; pass --username")
+        token = str(ClaimsRefreshToken.for_user(user).access_token)
+
+        paths = options['paths'] or self.default_paths()
+        results = {
+            'url': options['url'],
+            'connections': options['connections'],
+            'requests_per_connection': options['requests'],
+            'endpoints': {},
+        }
+        for path in paths:
+            results['endpoints'][path] = asyncio.run(self.run(path, token, options))
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def default_paths(self):
+        club = Club.objects.filter(is_approved=True).first()
+        court = Court.objects.filter(club=club).first() if club else None
+        if court is None:
+            raise CommandError("Need an approved club with a court; pass --path explicitly")
+        today = timezone.now().date()
+        return [
+            '/api/clubs/',
+            f'/api/bookings/available_slots/?club_id={club.id}&date={today}',
+            '/api/bookings/calendar/',
+            f'/api/courts/{court.id}/availability/',
+        ]
+
+    async def run(self, path, token, options):
+        parts = urlsplit(options['url'])
+        host, port = parts.hostname, parts.port or 80
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            f"Authorization: Bearer {token}\r\n"
+            "Accept: application/json\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode()
+
+        latencies = []
+        errors = {}
+        # All connections wait here so they hit the server at the same moment
+        start_gate = asyncio.Event()
+
+        async def client():
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError as exc:
+                errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + options['requests']
+                return
+            await start_gate.wait()
+            try:
+                for _ in range(options['requests']):
+                    started = time.perf_counter()
+                    try:
+                        writer.write(request)
+                        status = await asyncio.wait_for(self.read_response(reader), options['timeout'])
+                    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as exc:
+                        errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+                        return
+                    if status == 200:
+                        latencies.append(time.perf_counter() - started)
+                    else:
+                        errors[str(status)] = errors.get(str(status), 0) + 1
+            finally:
+                writer.close()
+
+        tasks = [asyncio.create_task(client()) for _ in range(options['connections'])]
+        # Let the connections open before releasing them
+        await asyncio.sleep(0.5)
+        started = time.perf_counter()
+        start_gate.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'ok': len(latencies),
+            'errors': errors,
+            'seconds': round(elapsed, 3),
+            'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+            'latency_ms': {
+                'mean': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+                'p50': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+                'p95': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+                'p99': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+                'max': round(latencies[-1] * 1000, 2) if latencies else None,
+            },
+        }
+
+    async def read_response(self, reader):
+        """Read one HTTP/1.1 response and return its status code"""
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).strip(), 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await reader.readexactly(int(headers.get('content-length', 0)))
+        return status
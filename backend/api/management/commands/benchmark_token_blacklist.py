@@ -0,0 +1,167 @@
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from api.blacklist import blacklist_filter
+from .purge_expired_tokens import purge_chunk
+
+JTI_PREFIX = 'bench-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic refresh tokens and measure blacklist lookups and expired token purging. "
+        "Only run against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000, help='Outstanding tokens to seed')
+        parser.add_argument('--expired-fraction', type=float, default=0.9)
+        parser.add_argument('--blacklisted-fraction', type=float, default=0.5)
+        parser.add_argument('--batch-size', type=int, default=100_000)
+        parser.add_argument('--lookups', type=int, default=10_000)
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Purge chunk size')
+        parser.add_argument('--skip-seed', action='store_true', help='Reuse tokens seeded by an earlier run')
+
+    def handle(self, *args, **options):
+        results = {'rows': options['rows'], 'vendor': connection.vendor}
+
+        if not options['skip_seed']:
+            started = time.monotonic()
+            self.seed(options)
+            results['seed_seconds'] = round(time.monotonic() - started, 2)
+
+        results['lookups'] = self.measure_lookups(options)
+        results['purge'] = self.measure_purge(options)
+
+        # Remove the unexpired tokens the purge left behind
+        OutstandingToken.objects.filter(jti__startswith=JTI_PREFIX).delete()
+        blacklist_filter.clear()
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def seed(self, options):
+        now = timezone.now()
+        rows = options['rows']
+        batch_size = options['batch_size']
+        expired_cut = int(options['expired_fraction'] * 1000)
+        blacklisted_cut = int(options['blacklisted_fraction'] * 1000)
+
+        for start in range(0, rows, batch_size):
+            end = min(start + batch_size, rows)
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    self.seed_batch_sql(start, end, now, expired_cut, blacklisted_cut)
+                else:
+                    self.seed_batch_orm(start, end, now, expired_cut, blacklisted_cut)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Seeded {end} tokens")
+
+    def seed_batch_sql(self, start, end, now, expired_cut, blacklisted_cut):
+        outstanding = OutstandingToken._meta.db_table
+        blacklisted = BlacklistedToken._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {outstanding} (jti, token, created_at, expires_at)
+                SELECT %s || g, '', %s,
+                       CASE WHEN g %% 1000 < %s THEN %s ELSE %s END
+                FROM generate_series(%s, %s) AS g
+                """,
+                [JTI_PREFIX, now - timedelta(days=2), expired_cut,
+                 now - timedelta(days=1), now + timedelta(days=1), start, end - 1],
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {blacklisted} (token_id, blacklisted_at)
+                SELECT id, %s FROM {outstanding}
+                WHERE jti LIKE %s AND id > (SELECT COALESCE(MAX(token_id), 0) FROM {blacklisted})
+                  AND id %% 1000 < %s
+                """,
+                [now, JTI_PREFIX + '%', blacklisted_cut],
+            )
+
+    def seed_batch_orm(self, start, end, now, expired_cut, blacklisted_cut):
+        tokens = OutstandingToken.objects.bulk_create([
+            OutstandingToken(
+                jti=f'{JTI_PREFIX}{i}',
+                token='',
+                created_at=now - timedelta(days=2),
+                expires_at=now - timedelta(days=1) if i % 1000 < expired_cut else now + timedelta(days=1),
+            )
+            for i in range(start, end)
+        ], batch_size=5000)
+        if tokens and tokens[0].pk is None:
+            tokens = OutstandingToken.objects.filter(jti__in=[t.jti for t in tokens])
+        BlacklistedToken.objects.bulk_create([
+            BlacklistedToken(token=token) for token in tokens if token.pk % 1000 < blacklisted_cut
+        ], batch_size=5000)
+
+    def measure_lookups(self, options):
+        count = options['lookups']
+        blacklisted = list(
+            BlacklistedToken.objects.filter(token__jti__startswith=JTI_PREFIX, token__expires_at__gt=timezone.now())
+            .values_list('token__jti', flat=True)[:count // 10]
+        )
+        # Mostly fresh JTIs, as seen on /api/token/refresh/, plus some blacklisted ones
+        jtis = [f'{JTI_PREFIX}miss-{i}' for i in range(count - len(blacklisted))] + blacklisted
+        random.shuffle(jtis)
+
+        started = time.monotonic()
+        for jti in jtis:
+            BlacklistedToken.objects.filter(token__jti=jti).exists()
+        database_seconds = time.monotonic() - started
+
+        started = time.monotonic()
+        blacklist_filter.rebuild()
+        rebuild_seconds = time.monotonic() - started
+
+        queries = 0
+        false_positives = 0
+        blacklisted_set = set(blacklisted)
+        started = time.monotonic()
+        for jti in jtis:
+            if blacklist_filter.might_contain(jti):
+                queries += 1
+                found = BlacklistedToken.objects.filter(token__jti=jti).exists()
+                false_positives += not found
+            elif jti in blacklisted_set:
+                raise AssertionError(f"Blacklist filter missed {jti}")
+        filter_seconds = time.monotonic() - started
+
+        return {
+            'lookups': len(jtis),
+            'database_us_per_lookup': round(database_seconds / len(jtis) * 1e6, 1),
+            'filter_us_per_lookup': round(filter_seconds / len(jtis) * 1e6, 1),
+            'filter_rebuild_seconds': round(rebuild_seconds, 2),
+            'queries_after_filter': queries,
+            'false_positive_rate': round(false_positives / max(len(jtis) - len(blacklisted), 1), 4),
+        }
+
+    def measure_purge(self, options):
+        cutoff = timezone.now()
+        last_id = 0
+        total = 0
+        slowest = 0.0
+        started = time.monotonic()
+        while True:
+            chunk_started = time.monotonic()
+            deleted, last_id = purge_chunk(last_id, cutoff, options['chunk_size'])
+            if not deleted:
+                break
+            slowest = max(slowest, time.monotonic() - chunk_started)
+            total += deleted
+        elapsed = time.monotonic() - started
+
+        return {
+            'deleted': total,
+            'seconds': round(elapsed, 2),
+            'rows_per_second': round(total / elapsed) if elapsed else None,
+            'slowest_chunk_seconds': round(slowest, 3),
+        }
@@ -0,0 +1,60 @@
+import csv
+import gzip
+import io
+import zipfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.geo import zip_centroids
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the ZIP centroid file used for club coordinates from the Census ZCTA gazetteer "
+        "(the national ZCTA file from https://www.census.gov/geographies/reference-files/time-series/geo/"
+        "gazetteer-files.html, as .zip or extracted .txt). Run geocode_clubs afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('gazetteer', help='Gazetteer .zip or tab-separated .txt file')
+        parser.add_argument('--output', default=str(settings.ZIP_CENTROIDS_PATH),
+                            help='Where to write the gzipped CSV (default: ZIP_CENTROIDS_PATH)')
+
+    def handle(self, *args, **options):
+        try:
+            rows = list(self.read(options['gazetteer']))
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile) as error:
+            raise CommandError(f"Can't read the gazetteer: {error}")
+        if not rows:
+            raise CommandError("The gazetteer has no rows")
+
+        output = Path(options['output'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(output, 'wt', newline='') as stream:
+            writer = csv.writer(stream)
+            writer.writerow(['zip', 'latitude', 'longitude'])
+            writer.writerows(sorted(rows))
+        zip_centroids.cache_clear()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(rows)} ZIP centroids to {output}"))
+
+    def read(self, path):
+        if path.endswith('.zip'):
+            with zipfile.ZipFile(path) as archive:
+                name = next(name for name in archive.namelist() if name.endswith('.txt'))
+                with archive.open(name) as raw:
+                    yield from self.parse(io.TextIOWrapper(raw, encoding='utf-8-sig'))
+        else:
+            with open(path, encoding='utf-8-sig') as stream:
+                yield from self.parse(stream)
+
+    def parse(self, stream):
+        reader = csv.reader(stream, delimiter='\t')
+        # The last header cell carries trailing spaces
+        header = [cell.strip() for cell in next(reader)]
+        zip_column, lat_column, lon_column = (header.index(name) for name in ('GEOID', 'INTPTLAT', 'INTPTLONG'))
+        for row in reader:
+            if row:
+                yield (row[zip_column].strip().zfill(5), round(float(row[lat_column]), 6),
+                       round(float(row[lon_column]), 6))
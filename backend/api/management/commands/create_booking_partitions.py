@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.partitioning import add_months, ensure_partitions, is_partitioned, month_start
+
+
+class Command(BaseCommand):
+    help = "Create monthly booking partitions ahead of time (run daily from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Create partitions up to this many months past the current one')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError("The booking table is not partitioned (PostgreSQL only, see migration 0007)")
+
+        this_month = month_start(timezone.localdate())
+        created = ensure_partitions(this_month, add_months(this_month, options['months_ahead']))
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partitions created"))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.geo import locations_changed_on_commit, zip_centroids, zip_location
+from api.models import Club
+
+
+class Command(BaseCommand):
+    help = "Set club coordinates from their ZIP codes (clubs get them on save; this backfills the rest)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute clubs that already have coordinates')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not zip_centroids():
+            raise CommandError("No ZIP centroids loaded; run build_zip_centroids first")
+
+        clubs = Club.objects.order_by('pk')
+        if not options['all']:
+            clubs = clubs.filter(latitude__isnull=True)
+        updated = unknown = 0
+        last_pk = 0
+        while True:
+            batch = list(clubs.filter(pk__gt=last_pk).only('pk', 'zip_code', 'latitude', 'longitude', 'updated_at')[
+                :options['batch_size']
+            ])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for club in batch:
+                location = zip_location(club.zip_code)
+                if location is None:
+                    unknown += 1
+                    location = (None, None)
+                if location != (club.latitude, club.longitude):
+                    club.latitude, club.longitude = location
+                    # The nearby search indexes sync by updated_at
+                    club.updated_at = timezone.now()
+                    changed.append(club)
+            with transaction.atomic():
+                Club.objects.bulk_update(changed, ['latitude', 'longitude', 'updated_at'])
+                if changed:
+                    locations_changed_on_commit()
+            updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f"Geocoded {updated} clubs; {unknown} have unknown ZIP codes"))
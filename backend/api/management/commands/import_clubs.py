@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import CHUNK_SIZE, MAX_REPORTED_ERRORS, RECORDS, CSVImportError, import_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Import clubs, courts, special hours and court restrictions from a CSV file "
+        "(see api.importer for the format). Existing objects are updated; invalid rows "
+        "are skipped and listed with their line numbers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file, or - for standard input')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Rows validated and written per transaction')
+        parser.add_argument('--max-errors', type=int, default=MAX_REPORTED_ERRORS,
+                            help='Row errors to list; the rest are only counted')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        try:
+            if options['path'] == '-':
+                sys.stdin.reconfigure(encoding='utf-8-sig', newline='')
+                report = import_csv(sys.stdin, options['chunk_size'], options['max_errors'])
+            else:
+                with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                    report = import_csv(stream, options['chunk_size'], options['max_errors'])
+        except (OSError, CSVImportError) as error:
+            raise CommandError(str(error))
+
+        for error in report.errors:
+            self.stderr.write(f"Line {error['line']}: {error['error']}")
+        if report.error_count > len(report.errors):
+            self.stderr.write(f"... and {report.error_count - len(report.errors)} more errors")
+        for record in RECORDS:
+            self.stdout.write(
+                f"{record}: {report.created[record]} created, {report.updated[record]} updated"
+            )
+        style = self.style.WARNING if report.error_count else self.style.SUCCESS
+        self.stdout.write(style(f"Imported {report.rows} rows with {report.error_count} errors"))
+        if report.stopped_at:
+            self.stdout.write(self.style.WARNING(
+                f"Stopped at line {report.stopped_at[0]}: {report.committed_rows} rows were committed"
+            ))
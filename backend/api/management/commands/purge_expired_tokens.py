@@ -0,0 +1,71 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+CHECKPOINT_KEY = 'auth:token-purge-checkpoint'
+
+
+def purge_chunk(last_id, cutoff, chunk_size):
+    """
+    Delete the next chunk of tokens that expired before the cutoff.
+
+    Walks the primary key from last_id so every chunk is an index range scan
+    and each transaction only locks chunk_size rows. Returns the number of
+    deleted tokens and the new watermark.
+    """
+    ids = list(
+        OutstandingToken.objects.filter(id__gt=last_id, expires_at__lte=cutoff)
+        .order_by('id')
+        .values_list('id', flat=True)[:chunk_size]
+    )
+    if not ids:
+        return 0, last_id
+
+    with transaction.atomic():
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).only('id').delete()
+    return len(ids), ids[-1]
+
+
+class Command(BaseCommand):
+    help = "Delete expired refresh tokens from the outstanding and blacklist tables in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Tokens deleted per transaction')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between chunks')
+        parser.add_argument('--max-chunks', type=int, help='Stop after this many chunks (resume later)')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an interrupted run')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now()
+        chunk_size = options['chunk_size']
+        last_id = 0 if options['restart'] else cache.get(CHECKPOINT_KEY, 0)
+        if last_id:
+            self.stdout.write(f"Resuming after token id {last_id}")
+
+        total = 0
+        chunks = 0
+        started = time.monotonic()
+        while options['max_chunks'] is None or chunks < options['max_chunks']:
+            deleted, last_id = purge_chunk(last_id, cutoff, chunk_size)
+            if not deleted:
+                # Finished: the next run starts from the beginning again
+                cache.delete(CHECKPOINT_KEY)
+                break
+
+            cache.set(CHECKPOINT_KEY, last_id, timeout=None)
+            total += deleted
+            chunks += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Deleted {deleted} tokens up to id {last_id}")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {total} expired tokens in {chunks} chunks ({elapsed:.1f}s)"
+        ))
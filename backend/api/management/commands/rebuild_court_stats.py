@@ -0,0 +1,76 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+
+from api.models import Booking
+from api.rollups import date_chunks, rebuild_range
+
+
+def _setup_worker():
+    import django
+    django.setup()
+
+
+def _rebuild_chunk(start_date, end_date, club_id):
+    try:
+        return start_date, end_date, rebuild_range(start_date, end_date, club_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill or repair DailyCourtStats by recomputing date ranges from the bookings table. "
+        "Chunks of the range are rebuilt in parallel worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=date.fromisoformat,
+                            help='First day to rebuild (default: earliest booking)')
+        parser.add_argument('--end-date', type=date.fromisoformat,
+                            help='Last day to rebuild (default: latest booking)')
+        parser.add_argument('--club', type=int, help='Only rebuild this club')
+        parser.add_argument('--chunk-days', type=int, default=31, help='Days per chunk')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Worker processes; 1 rebuilds in this process')
+
+    def handle(self, *args, **options):
+        start_date, end_date = options['start_date'], options['end_date']
+        if start_date is None or end_date is None:
+            bounds = Booking.objects.order_by().aggregate(first=Min('booking_date'), last=Max('booking_date'))
+            if bounds['first'] is None:
+                self.stdout.write("No bookings to roll up")
+                return
+            start_date = start_date or bounds['first']
+            end_date = end_date or bounds['last']
+        if end_date < start_date:
+            raise CommandError("--end-date is before --start-date")
+        if options['chunk_days'] < 1:
+            raise CommandError("--chunk-days must be at least 1")
+
+        chunks = list(date_chunks(start_date, end_date, options['chunk_days']))
+        total = 0
+        if options['workers'] <= 1:
+            for chunk_start, chunk_end in chunks:
+                total += self.report(chunk_start, chunk_end, rebuild_range(chunk_start, chunk_end, options['club']))
+        else:
+            # Forked workers must not share this process's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_setup_worker) as pool:
+                futures = [
+                    pool.submit(_rebuild_chunk, chunk_start, chunk_end, options['club'])
+                    for chunk_start, chunk_end in chunks
+                ]
+                for future in as_completed(futures):
+                    total += self.report(*future.result())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {total} court-days from {start_date} to {end_date} in {len(chunks)} chunks"
+        ))
+
+    def report(self, start_date, end_date, rows):
+        self.stdout.write(f"{start_date} - {end_date}: {rows} court-days")
+        return rows
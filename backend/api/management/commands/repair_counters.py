@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.counters import rebuild_booking_counts, rebuild_court_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the club court counters and the users' booking counts from the courts and bookings "
+        "tables, e.g. after bulk writes that skipped the signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courts-only', action='store_true', help='Only repair the club court counters')
+        parser.add_argument('--bookings-only', action='store_true', help="Only repair the users' booking counts")
+        parser.add_argument('--club', type=int, action='append', help='Only repair this club (repeatable)')
+        parser.add_argument('--user', type=int, action='append', help='Only repair this user (repeatable)')
+
+    def handle(self, *args, **options):
+        if options['courts_only'] and options['bookings_only']:
+            raise CommandError("--courts-only and --bookings-only are exclusive")
+        if not options['bookings_only']:
+            clubs = rebuild_court_counts(options['club'])
+            self.stdout.write(f"Repaired the court counters of {clubs} clubs")
+        if not options['courts_only']:
+            users = rebuild_booking_counts(options['user'])
+            self.stdout.write(f"Repaired the booking counts of {users} users")
+        self.stdout.write(self.style.SUCCESS("Counters are up to date"))
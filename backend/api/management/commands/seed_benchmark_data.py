@@ -0,0 +1,259 @@
+import csv
+import io
+import random
+import time
+from datetime import datetime, time as dtime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import Booking, Club, ClubSpecialHours, Court, CourtAvailabilityRestriction
+from api.counters import rebuild_booking_counts, rebuild_court_counts
+from api.partitioning import ensure_partitions, is_partitioned
+
+BENCH_ADDRESS = 'benchmark-data'
+USERNAME_PREFIX = 'bench-user-'
+BENCH_PASSWORD = 'benchmark-password'
+SLOT_MINUTES = 30
+# Booking lengths in 30-minute slots
+DURATIONS = (2, 2, 2, 3, 4)
+HOURS = ((dtime(6), dtime(22)), (dtime(7), dtime(21)), (dtime(8), dtime(20)), (dtime(8), dtime(22)))
+COURT_TYPES = ('hard', 'hard', 'hard', 'clay', 'clay', 'grass')
+CITIES = [
+    ('Springfield', 'IL'), ('Portland', 'OR'), ('Austin', 'TX'), ('Denver', 'CO'), ('Madison', 'WI'),
+    ('Savannah', 'GA'), ('Boulder', 'CO'), ('Raleigh', 'NC'), ('Tucson', 'AZ'), ('Burlington', 'VT'),
+    ('Sacramento', 'CA'), ('Richmond', 'VA'), ('Columbus', 'OH'), ('Spokane', 'WA'), ('Albany', 'NY'),
+]
+NAME_WORDS = [
+    'Riverside', 'Lakeside', 'Oakwood', 'Maple', 'Cedar', 'Highland', 'Sunset', 'Harbor', 'Valley', 'Summit',
+    'Meadow', 'Willow', 'Granite', 'Pinecrest', 'Brookfield', 'Fairview', 'Westgate', 'Northridge',
+]
+NAME_SUFFIXES = ['Tennis Club', 'Racquet Club', 'Tennis Center', 'Country Club', 'Sports Club']
+BOOKING_COLUMNS = (
+    'court_id', 'user_id', 'booking_date', 'start_time', 'end_time', 'created_at', 'updated_at', 'status', 'notes',
+)
+
+
+def benchmark_clubs():
+    return Club.objects.filter(address=BENCH_ADDRESS)
+
+
+def clear_benchmark_data():
+    """Delete everything an earlier run seeded"""
+    with connection.cursor() as cursor:
+        # Bookings go first, in one statement: deleting them through the ORM
+        # would load every row for the stats signals
+        cursor.execute(
+            f'DELETE FROM {Booking._meta.db_table} WHERE court_id IN ('
+            f'SELECT court.id FROM {Court._meta.db_table} court '
+            f'JOIN {Club._meta.db_table} club ON club.id = court.club_id WHERE club.address = %s)',
+            [BENCH_ADDRESS],
+        )
+    benchmark_clubs().delete()
+    User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+
+def day_slots(opening, closing):
+    return (closing.hour * 60 + closing.minute - opening.hour * 60 - opening.minute) // SLOT_MINUTES
+
+
+def slot_time(opening, slot):
+    minutes = opening.hour * 60 + opening.minute + slot * SLOT_MINUTES
+    return dtime(minutes // 60, minutes % 60)
+
+
+def place_bookings(rng, count, slots):
+    """Non-overlapping (first slot, length) pairs, up to `count` of them, in a day of `slots` slots"""
+    lengths = [rng.choice(DURATIONS) for _ in range(count)]
+    while lengths and sum(lengths) > slots:
+        lengths.pop()
+    free = slots - sum(lengths)
+    # Spread the free slots over the gaps before, between and after the bookings
+    cuts = sorted(rng.sample(range(free + len(lengths)), len(lengths)))
+    placed, position = [], 0
+    for index, (cut, length) in enumerate(zip(cuts, lengths)):
+        start = position + cut - index
+        placed.append((start, length))
+        position += length
+    return placed
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large synthetic dataset (clubs, courts, users, bookings, restrictions and special hours) "
+        "for benchmark_api. Bookings are streamed with COPY on PostgreSQL. Only run against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clubs', type=int, default=2000)
+        parser.add_argument('--courts-per-club', type=int, default=10, help='Average courts per club')
+        parser.add_argument('--users', type=int, default=20_000)
+        parser.add_argument('--bookings', type=int, default=2_000_000, help='Approximate number of bookings')
+        parser.add_argument('--days', type=int, default=60, help='Days of bookings, half of them in the past')
+        parser.add_argument('--restricted-fraction', type=float, default=0.3,
+                            help='Share of courts with a weekly maintenance restriction')
+        parser.add_argument('--special-days', type=int, default=3, help='Special hours per club')
+        parser.add_argument('--batch-size', type=int, default=50_000)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        started = time.monotonic()
+        # Data from an earlier run is replaced
+        clear_benchmark_data()
+        timings = {'clear': time.monotonic() - started}
+
+        today = timezone.localdate()
+        first_day = today - timedelta(days=options['days'] // 2)
+        days = [first_day + timedelta(days=offset) for offset in range(options['days'])]
+
+        step = time.monotonic()
+        users = self.seed_users(options['users'])
+        clubs = self.seed_clubs(rng, options['clubs'])
+        courts = self.seed_courts(rng, clubs, options['courts_per_club'])
+        restrictions = self.seed_restrictions(rng, courts, options['restricted_fraction'])
+        special_hours = self.seed_special_hours(rng, clubs, days, options['special_days'])
+        timings['clubs_courts_users'] = time.monotonic() - step
+
+        step = time.monotonic()
+        if is_partitioned():
+            ensure_partitions(days[0], days[-1])
+        bookings = self.seed_bookings(rng, courts, users, days, today, options)
+        timings['bookings'] = time.monotonic() - step
+
+        # The bulk inserts skipped the signals that keep the counters
+        step = time.monotonic()
+        rebuild_court_counts([club.pk for club in clubs])
+        rebuild_booking_counts(users)
+        timings['counters'] = time.monotonic() - step
+
+        if connection.vendor == 'postgresql':
+            step = time.monotonic()
+            with connection.cursor() as cursor:
+                for model in (Club, Court, Booking, CourtAvailabilityRestriction, ClubSpecialHours, User):
+                    cursor.execute(f'ANALYZE {model._meta.db_table}')
+            timings['analyze'] = time.monotonic() - step
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(clubs)} clubs, {len(courts)} courts, {len(users)} users, {bookings} bookings, "
+            f"{restrictions} restrictions and {special_hours} special hours in "
+            f"{time.monotonic() - started:.1f}s "
+            f"({', '.join(f'{name} {seconds:.1f}s' for name, seconds in timings.items())})"
+        ))
+
+    def seed_users(self, count):
+        # One hash for everyone: hashing each password would dominate the run
+        password = make_password(BENCH_PASSWORD)
+        users = User.objects.bulk_create(
+            [User(username=f'{USERNAME_PREFIX}{number}', password=password) for number in range(count)],
+            batch_size=5000,
+        )
+        return [user.id for user in users]
+
+    def seed_clubs(self, rng, count):
+        clubs = []
+        for number in range(count):
+            city, state = rng.choice(CITIES)
+            opening, closing = rng.choice(HOURS)
+            clubs.append(Club(
+                name=f'{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {rng.choice(NAME_SUFFIXES)}',
+                address=BENCH_ADDRESS, city=city, state=state, zip_code=f'{number % 100000:05d}',
+                opening_time=opening, closing_time=closing, is_approved=True,
+                latitude=rng.uniform(25, 48), longitude=rng.uniform(-124, -67),
+            ))
+        return Club.objects.bulk_create(clubs, batch_size=5000)
+
+    def seed_courts(self, rng, clubs, per_club):
+        courts = []
+        for club in clubs:
+            types = [rng.choice(COURT_TYPES) for _ in range(max(1, round(rng.uniform(0.4, 1.6) * per_club)))]
+            courts.extend(
+                Court(club=club, court_type=court_type, court_number=number, is_active=rng.random() > 0.03)
+                for number, court_type in enumerate(types, start=1)
+            )
+        return Court.objects.bulk_create(courts, batch_size=5000)
+
+    def seed_restrictions(self, rng, courts, fraction):
+        restrictions = [
+            CourtAvailabilityRestriction(court=court, weekday=rng.randrange(7), start_time=dtime(8),
+                                         end_time=dtime(rng.choice((9, 10))), reason='Maintenance')
+            for court in courts if rng.random() < fraction
+        ]
+        CourtAvailabilityRestriction.objects.bulk_create(restrictions, batch_size=5000)
+        return len(restrictions)
+
+    def seed_special_hours(self, rng, clubs, days, per_club):
+        special_hours = []
+        for club in clubs:
+            for day in rng.sample(days, min(per_club, len(days))):
+                if rng.random() < 0.5:
+                    special_hours.append(ClubSpecialHours(club=club, date=day, is_closed=True, reason='Holiday'))
+                else:
+                    special_hours.append(ClubSpecialHours(
+                        club=club, date=day, opening_time=club.opening_time,
+                        closing_time=slot_time(club.opening_time, day_slots(club.opening_time, club.closing_time) // 2),
+                        reason='Tournament',
+                    ))
+        ClubSpecialHours.objects.bulk_create(special_hours, batch_size=5000)
+        return len(special_hours)
+
+    def booking_rows(self, rng, courts, users, days, today, total):
+        """Rows of BOOKING_COLUMNS, never two overlapping bookings on one court"""
+        clubs = {court.club_id: court.club for court in courts}
+        per_court_day = total / max(1, len(courts) * len(days))
+        now = timezone.now()
+        # Bookings are made 1-14 days ahead, never in the future
+        noons = {day: timezone.make_aware(datetime.combine(day, dtime(12))) for day in days}
+        created_at = {day: [min(now, noon - timedelta(days=ahead)) for ahead in range(1, 15)]
+                      for day, noon in noons.items()}
+        for court in courts:
+            club = clubs[court.club_id]
+            slots = day_slots(club.opening_time, club.closing_time)
+            times = [slot_time(club.opening_time, slot) for slot in range(slots + 1)]
+            for day in days:
+                count = int(per_court_day) + (rng.random() < per_court_day % 1)
+                past = day < today
+                for first, length in place_bookings(rng, count, slots):
+                    roll = rng.random()
+                    if roll < 0.1:
+                        status = 'canceled'
+                    elif past:
+                        status = 'completed'
+                    else:
+                        status = 'pending' if roll < 0.25 else 'confirmed'
+                    created = rng.choice(created_at[day])
+                    yield (court.id, rng.choice(users), day, times[first], times[first + length],
+                           created, created, status, None)
+
+    def seed_bookings(self, rng, courts, users, days, today, options):
+        rows = self.booking_rows(rng, courts, users, days, today, options['bookings'])
+        batch_size = options['batch_size']
+        written = 0
+        while True:
+            batch = [row for _, row in zip(range(batch_size), rows)]
+            if not batch:
+                return written
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    self.copy_bookings(batch)
+                else:
+                    Booking.objects.bulk_create([Booking(**dict(zip(BOOKING_COLUMNS, row))) for row in batch],
+                                                batch_size=5000)
+            written += len(batch)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Seeded {written} bookings")
+
+    def copy_bookings(self, batch):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in batch:
+            writer.writerow([r'\N' if value is None else value for value in row])
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {Booking._meta.db_table} ({', '.join(BOOKING_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
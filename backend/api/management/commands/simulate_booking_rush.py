@@ -0,0 +1,282 @@
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.counters import rebuild_court_counts
+from api.models import Booking, Club, Court
+from api.tokens import ClaimsRefreshToken
+from .benchmark_concurrency import percentile
+
+RUSH_ADDRESS = 'booking-rush-simulation'
+USERNAME_PREFIX = 'rush-user-'
+
+
+def minutes(value):
+    hours, mins = value.split(':')[:2]
+    return int(hours) * 60 + int(mins)
+
+
+def clock(total):
+    return f'{total // 60:02d}:{total % 60:02d}'
+
+
+def overlapping(bookings):
+    """Pairs of bookings on the same court whose times overlap"""
+    by_court = defaultdict(list)
+    for booking in bookings:
+        by_court[booking.court_id].append(booking)
+    pairs = []
+    for court_bookings in by_court.values():
+        court_bookings.sort(key=lambda booking: booking.start_time)
+        # Compare against the latest-ending booking so far, which catches chains as well as pairs
+        latest = None
+        for booking in court_bookings:
+            if latest is not None and booking.start_time < latest.end_time:
+                pairs.append((latest, booking))
+            if latest is None or booking.end_time > latest.end_time:
+                latest = booking
+    return pairs
+
+
+def latency_summary(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return None
+    return {
+        'count': len(latencies),
+        'p50': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99': round(percentile(latencies, 0.99) * 1000, 2),
+        'max': round(latencies[-1] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate the rush when a new booking day opens: many users poll available_slots for the same "
+        "evening, then race to POST /api/bookings/. Runs against a running server that shares this "
+        "database, and reports throughput, the error mix, tail latency and any overlapping bookings "
+        "found afterwards. Creates its own club and users and removes them unless --keep is given. "
+        "Raise TOKEN_BUCKET_THROTTLES on the server for the run, or the throttles dominate the results."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server')
+        parser.add_argument('--users', type=int, default=300, help='Simultaneous users')
+        parser.add_argument('--courts', type=int, default=6, help='Courts at the simulated club')
+        parser.add_argument('--evening', default='17:00-21:00', help='Slots the users want, as HH:MM-HH:MM')
+        parser.add_argument('--polls', type=int, default=2, help='available_slots polls before the first attempt')
+        parser.add_argument('--attempts', type=int, default=3, help='Booking attempts per user')
+        parser.add_argument('--think-ms', type=int, default=200, help='Maximum pause between a user\'s requests')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Keep the club, users and bookings afterwards')
+
+    def handle(self, *args, **options):
+        try:
+            window_start, window_end = (minutes(part) for part in options['evening'].split('-'))
+        except ValueError:
+            raise CommandError("--evening must look like 17:00-21:00")
+
+        club, day, tokens = self.prepare(options)
+        try:
+            outcome = asyncio.run(self.rush(club, day, tokens, (window_start, window_end), options))
+            outcome['double_bookings'] = self.double_bookings(club, day)
+            outcome['bookings_in_database'] = Booking.objects.filter(
+                court__club=club, booking_date=day, status__in=Booking.ACTIVE_STATUSES).count()
+        finally:
+            if not options['keep']:
+                self.clean_up()
+        self.stdout.write(json.dumps(outcome, indent=2))
+        if outcome['double_bookings']:
+            self.stderr.write(self.style.ERROR(f"{len(outcome['double_bookings'])} double bookings"))
+
+    def prepare(self, options):
+        self.clean_up()
+        club = Club.objects.create(
+            name='Booking rush club', address=RUSH_ADDRESS, city='Springfield', state='IL', zip_code='62701',
+            is_approved=True,
+        )
+        Court.objects.bulk_create([
+            Court(club=club, court_type='hard', court_number=number) for number in range(1, options['courts'] + 1)
+        ])
+        rebuild_court_counts([club.pk])
+        # The day that just became bookable
+        day = timezone.localdate() + timedelta(days=club.max_advance_booking_days)
+
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(username=f'{USERNAME_PREFIX}{number}', password=password) for number in range(options['users'])
+        ])
+        tokens = [str(ClaimsRefreshToken.for_user(user).access_token) for user in users]
+        return club, day, tokens
+
+    def clean_up(self):
+        for club in Club.objects.filter(address=RUSH_ADDRESS):
+            club.delete()
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def double_bookings(self, club, day):
+        bookings = list(Booking.objects.filter(
+            court__club=club, booking_date=day, status__in=Booking.ACTIVE_STATUSES,
+        ).select_related('court'))
+        return [
+            {
+                'court_number': first.court.court_number,
+                'first': {'id': first.id, 'start': str(first.start_time), 'end': str(first.end_time)},
+                'second': {'id': second.id, 'start': str(second.start_time), 'end': str(second.end_time)},
+            }
+            for first, second in overlapping(bookings)
+        ]
+
+    async def rush(self, club, day, tokens, window, options):
+        parts = urlsplit(options['url'])
+        host, port = parts.hostname, parts.port or 80
+        rng = random.Random(options['seed'])
+        slots_path = f'/api/bookings/available_slots/?club_id={club.id}&date={day}'
+        latencies = {'available_slots': [], 'create': []}
+        outcomes = Counter()
+        errors = Counter()
+        # The first response body of each kind of error
+        samples = {}
+
+        def error(kind, content=b''):
+            errors[kind] += 1
+            samples.setdefault(kind, content[:300].decode('utf-8', 'replace'))
+        # Everyone is released at once, like the moment the day opens
+        start_gate = asyncio.Event()
+
+        async def call(reader, writer, token, method, path, payload=None):
+            body = json.dumps(payload).encode() if payload is not None else b''
+            head = (
+                f"{method} {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nAuthorization: Bearer {token}\r\n"
+                f"Accept: application/json\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                "Connection: keep-alive\r\n\r\n"
+            ).encode()
+            started = time.perf_counter()
+            writer.write(head + body)
+            status, content = await asyncio.wait_for(self.read_response(reader), options['timeout'])
+            return status, content, time.perf_counter() - started
+
+        def choose(courts, user_rng):
+            """A free (court, start, end) in the evening, favouring the earliest slots"""
+            if not courts:
+                return None
+            # Every court carries the club's booking settings
+            rules = courts[0]
+            increment, duration = rules['booking_increment'], rules['min_duration']
+            if user_rng.random() < 0.3:
+                duration = min(rules['max_duration'], duration + increment)
+            first = max(window[0], minutes(rules['operating_hours']['open']))
+            last = min(window[1], minutes(rules['operating_hours']['close'])) - duration
+            starts = list(range(first, last + 1, increment))
+            # Earlier evening slots are the most wanted
+            for start in sorted(starts, key=lambda start: start + user_rng.expovariate(1 / 60)):
+                end = start + duration
+                free = [
+                    court for court in courts
+                    if all(end <= minutes(booked['start']) or start >= minutes(booked['end'])
+                           for booked in court['booked_ranges'])
+                ]
+                if free:
+                    return user_rng.choice(free)['court_id'], start, end
+            return None
+
+        async def user(token, user_rng):
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError as exc:
+                error(type(exc).__name__)
+                outcomes['connection_failed'] += 1
+                return
+            await start_gate.wait()
+            try:
+                courts = []
+                for attempt in range(options['attempts']):
+                    for _ in range(options['polls'] if attempt == 0 else 1):
+                        await asyncio.sleep(user_rng.uniform(0, options['think_ms'] / 1000))
+                        status, content, elapsed = await call(reader, writer, token, 'GET', slots_path)
+                        latencies['available_slots'].append(elapsed)
+                        if status != 200:
+                            error(f'available_slots {status}', content)
+                            continue
+                        courts = json.loads(content)
+                    choice = choose(courts, user_rng)
+                    if choice is None:
+                        outcomes['sold_out'] += 1
+                        return
+                    court_id, start, end = choice
+                    status, content, elapsed = await call(reader, writer, token, 'POST', '/api/bookings/', {
+                        'court': court_id, 'booking_date': str(day), 'start_time': clock(start), 'end_time': clock(end),
+                    })
+                    latencies['create'].append(elapsed)
+                    if status == 201:
+                        outcomes['booked'] += 1
+                        return
+                    # Lost the race, to the overlap check or to the unique start time constraint
+                    if status == 400 and (b'already booked' in content or b'unique set' in content):
+                        error('create conflict', content)
+                    else:
+                        error(f'create {status}', content)
+                        if status >= 500 or status == 429:
+                            outcomes['failed'] += 1
+                            return
+                outcomes['gave_up'] += 1
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as exc:
+                error(type(exc).__name__)
+                outcomes['failed'] += 1
+            finally:
+                writer.close()
+
+        tasks = [asyncio.create_task(user(token, random.Random(rng.random()))) for token in tokens]
+        # Let the connections open before releasing them
+        await asyncio.sleep(0.5)
+        started = time.perf_counter()
+        start_gate.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        requests = sum(len(values) for values in latencies.values())
+        return {
+            'url': options['url'],
+            'users': len(tokens),
+            'courts': options['courts'],
+            'day': str(day),
+            'seconds': round(elapsed, 3),
+            'requests': requests,
+            'requests_per_second': round(requests / elapsed, 1) if elapsed else None,
+            'bookings_per_second': round(outcomes['booked'] / elapsed, 1) if elapsed else None,
+            'outcomes': dict(outcomes),
+            'errors': dict(errors),
+            'error_samples': samples,
+            'latency_ms': {name: latency_summary(values) for name, values in latencies.items()},
+        }
+
+    async def read_response(self, reader):
+        """Read one HTTP/1.1 response; returns (status code, body)"""
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).strip(), 16)
+                chunks.append((await reader.readexactly(size + 2))[:-2])
+                if size == 0:
+                    return status, b''.join(chunks)
+        return status, await reader.readexactly(int(headers.get('content-length', 0)))
@@ -0,0 +1,42 @@
+import json
+import textwrap
+
+from django.core.management.base import BaseCommand
+
+from api.slow_queries import ORDERS, clear, top_offenders
+
+
+class Command(BaseCommand):
+    help = (
+        "List the SQL fingerprints that cost the most, merged over the workers that published their "
+        "slow query log to the shared cache, with the plan captured for slow ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', choices=list(ORDERS), default='total', help='Rank by this statistic')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='Print the entries as JSON')
+        parser.add_argument('--reset', action='store_true', help='Forget the statistics of every worker')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            clear()
+            self.stdout.write("Slow query log cleared")
+            return
+
+        entries = top_offenders(options['order'], options['limit'])
+        if options['json']:
+            self.stdout.write(json.dumps(entries, indent=2))
+            return
+        if not entries:
+            self.stdout.write("No statements recorded (is the cache shared with the workers?)")
+            return
+        for rank, entry in enumerate(entries, start=1):
+            self.stdout.write(
+                f"{rank}. [{entry['key']}] {entry['count']} runs, {entry['slow']} slow, total "
+                f"{entry['total_ms']:.1f}ms, mean {entry['mean_ms']:.2f}ms, max {entry['max_ms']:.2f}ms"
+            )
+            self.stdout.write(textwrap.indent(textwrap.fill(entry['fingerprint'], 110), '    '))
+            if entry['explain']:
+                self.stdout.write(textwrap.indent(entry['explain'], '      | '))
+            self.stdout.write('')
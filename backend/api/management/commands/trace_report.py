@@ -0,0 +1,147 @@
+import json
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def load_spans(paths):
+    """{trace ID: [span, ...]} from OTLP/JSON lines files"""
+    traces = defaultdict(list)
+    for path in paths:
+        try:
+            lines = open(path, encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+        with lines:
+            for line in lines:
+                if not line.strip():
+                    continue
+                for resource in json.loads(line).get('resourceSpans', []):
+                    for scope in resource.get('scopeSpans', []):
+                        for span in scope.get('spans', []):
+                            traces[span['traceId']].append(span)
+    return traces
+
+
+def duration(span):
+    return int(span['endTimeUnixNano']) - int(span['startTimeUnixNano'])
+
+
+def attribute(span, key):
+    for item in span.get('attributes', []):
+        if item['key'] == key:
+            return next(iter(item['value'].values()))
+    return None
+
+
+def tree(spans):
+    """(roots, {span ID: children}) with each list in start order"""
+    ids = {span['spanId'] for span in spans}
+    children = defaultdict(list)
+    roots = []
+    for span in sorted(spans, key=lambda span: int(span['startTimeUnixNano'])):
+        parent = span.get('parentSpanId')
+        if parent and parent in ids:
+            children[parent].append(span)
+        else:
+            roots.append(span)
+    return roots, children
+
+
+class Node:
+    def __init__(self):
+        self.calls = 0
+        self.total = 0
+        self.own = 0
+        self.children = {}
+
+
+def aggregate(node, span, children):
+    """Add `span` and its descendants to `node`, merging siblings of the same name"""
+    node.calls += 1
+    node.total += duration(span)
+    node.own += duration(span) - sum(duration(child) for child in children[span['spanId']])
+    for child in children[span['spanId']]:
+        aggregate(node.children.setdefault(child['name'], Node()), child, children)
+
+
+class Command(BaseCommand):
+    help = (
+        "Flame-style text report of a trace file written by TracingMiddleware (rotated files may be "
+        "given too). By default spans are merged by their path from the root for each endpoint and "
+        "shown per request; --trace prints one trace span by span."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='Trace files (OTLP/JSON lines)')
+        parser.add_argument('--trace', help='Show only this trace ID, span by span')
+        parser.add_argument('--endpoint', help='Only endpoints whose root span name contains this')
+        parser.add_argument('--min-percent', type=float, default=1.0,
+                            help='Hide spans below this share of their endpoint\'s time')
+        parser.add_argument('--width', type=int, default=40, help='Width of the bars')
+
+    def handle(self, *args, **options):
+        traces = load_spans(options['files'])
+        if options['trace']:
+            if options['trace'] not in traces:
+                raise CommandError(f"Trace {options['trace']} is not in the file")
+            self.show_trace(traces[options['trace']], options['width'])
+            return
+
+        endpoints = defaultdict(Node)
+        requests = defaultdict(int)
+        for spans in traces.values():
+            roots, children = tree(spans)
+            for root in roots:
+                if options['endpoint'] and options['endpoint'] not in root['name']:
+                    continue
+                requests[root['name']] += 1
+                aggregate(endpoints[root['name']], root, children)
+        if not endpoints:
+            raise CommandError("No traces to report")
+
+        self.stdout.write(f"{len(traces)} traces\n")
+        for name, root in sorted(endpoints.items(), key=lambda item: -item[1].total):
+            count = requests[name]
+            self.stdout.write(f"{name}: {count} requests, {root.total / count / 1e6:.2f}ms each")
+            self.stdout.write(f"{'':{options['width']}}  share  ms/req  self/req  calls/req")
+            self.show_node(name, root, root.total, count, 0, options)
+            self.stdout.write('')
+
+    def show_node(self, name, node, whole, count, depth, options):
+        share = node.total / whole if whole else 0
+        if depth and share * 100 < options['min_percent']:
+            return
+        bar = '█' * max(1, round(share * options['width']))
+        self.stdout.write(
+            f"{bar:<{options['width']}} {share * 100:5.1f}% {node.total / count / 1e6:7.2f} "
+            f"{node.own / count / 1e6:9.2f} {node.calls / count:10.1f}  {'  ' * depth}{name}"
+        )
+        for child_name, child in sorted(node.children.items(), key=lambda item: -item[1].total):
+            self.show_node(child_name, child, whole, count, depth + 1, options)
+
+    def show_trace(self, spans, width):
+        roots, children = tree(spans)
+        start = min(int(span['startTimeUnixNano']) for span in spans)
+        whole = max(int(span['endTimeUnixNano']) for span in spans) - start or 1
+
+        def show(span, depth):
+            offset = int(span['startTimeUnixNano']) - start
+            # The bar is placed on the request's timeline
+            lead = round(offset / whole * width)
+            bar = ' ' * lead + '█' * max(1, round(duration(span) / whole * width))
+            label = span['name']
+            statement = attribute(span, 'db.statement')
+            if statement:
+                label += f": {statement[:120]}"
+            if span.get('status', {}).get('message'):
+                label += f" [error: {span['status']['message']}]"
+            self.stdout.write(
+                f"{bar[:width + 1]:<{width + 1}} {offset / 1e6:8.2f} {duration(span) / 1e6:8.2f}ms  {'  ' * depth}{label}"
+            )
+            for child in children[span['spanId']]:
+                show(child, depth + 1)
+
+        self.stdout.write(f"{'':{width + 1}} start ms  duration")
+        for root in roots:
+            show(root, 0)
@@ -0,0 +1,344 @@
+"""
+Per-endpoint request metrics in the Prometheus text format.
+
+MetricsMiddleware times each request, an execute wrapper on every
+database connection counts the request's queries and their time, and
+serializer .data is timed as it builds the response data, and
+TimedJSONRenderer adds the time spent encoding it. Everything
+is recorded per resolved URL name (club-list, booking-available-slots,
+...), method and status in histograms and counters held in process
+memory, which costs a few microseconds per request and less than one
+per query.
+
+Each worker copies its totals into the cache every METRICS_FLUSH_SECONDS,
+so the /metrics endpoint reports the sum over all workers whichever one
+answers the scrape. A worker that stops flushing drops out after
+WORKER_TTL, which Prometheus sees as a counter reset.
+"""
+import functools
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.renderers import JSONRenderer
+
+WORKERS_KEY = 'metrics:workers'
+SNAPSHOT_KEY = 'metrics:snapshot:{}'
+WORKER_TTL = 24 * 3600
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+RENDER_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+LABEL_NAMES = ('view', 'method', 'status')
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets, label_names=LABEL_NAMES):
+        self.name, self.help_text, self.buckets = name, help_text, buckets
+        self.label_names = label_names
+
+    def empty(self):
+        # Count per bucket (the last one is +Inf), then the sum
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, series, value):
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def merge(self, series, other):
+        for position, value in enumerate(other):
+            series[position] += value
+
+    def lines(self, labels, series):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), series):
+            cumulative += count
+            yield f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{self.name}_sum{{{labels}}} {series[-1]}'
+        yield f'{self.name}_count{{{labels}}} {cumulative}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=LABEL_NAMES):
+        self.name, self.help_text = name, help_text
+        self.label_names = label_names
+
+    def empty(self):
+        return [0.0]
+
+    def observe(self, series, value):
+        series[0] += value
+
+    def merge(self, series, other):
+        series[0] += other[0]
+
+    def lines(self, labels, series):
+        yield f'{self.name}{{{labels}}} {series[0]}'
+
+
+REQUEST_METRICS = [
+    Histogram('http_request_duration_seconds', 'Request latency', LATENCY_BUCKETS),
+    Histogram('http_response_size_bytes', 'Response body size', SIZE_BUCKETS),
+    Histogram('db_queries_per_request', 'SQL queries issued per request', QUERY_COUNT_BUCKETS),
+    Counter('db_queries_total', 'SQL queries issued'),
+    Counter('db_query_duration_seconds_total', 'Time spent in SQL queries'),
+    Histogram('response_render_duration_seconds', 'Time spent encoding the response body', RENDER_BUCKETS),
+    Histogram('response_serialize_duration_seconds', 'Time spent building serializer data', RENDER_BUCKETS),
+]
+# Request metrics plus those other modules register, e.g. cache hit counts
+METRICS = list(REQUEST_METRICS)
+
+
+class Registry:
+    """Series of every metric, keyed by (view, method, status)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {metric.name: {} for metric in METRICS}
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.flushed_at = time.monotonic()
+
+    def record(self, labels, values):
+        with self.lock:
+            for metric, value in zip(REQUEST_METRICS, values):
+                if value is None:
+                    continue
+                series = self.series[metric.name].get(labels)
+                if series is None:
+                    series = self.series[metric.name][labels] = metric.empty()
+                metric.observe(series, value)
+
+    def increment(self, name, labels, amount=1):
+        with self.lock:
+            series = self.series[name].get(labels)
+            if series is None:
+                series = self.series[name][labels] = [0.0]
+            series[0] += amount
+
+    def snapshot(self):
+        with self.lock:
+            return {name: {labels: list(values) for labels, values in series.items()}
+                    for name, series in self.series.items()}
+
+    def flush(self):
+        """Publish this worker's totals for the /metrics endpoint"""
+        self.flushed_at = time.monotonic()
+        cache.set(SNAPSHOT_KEY.format(self.worker), self.snapshot(), timeout=WORKER_TTL)
+        workers = cache.get(WORKERS_KEY, [])
+        if self.worker not in workers:
+            cache.set(WORKERS_KEY, workers + [self.worker], timeout=None)
+
+    def flush_if_due(self):
+        if time.monotonic() - self.flushed_at >= getattr(settings, 'METRICS_FLUSH_SECONDS', 10):
+            self.flush()
+
+    def reset(self):
+        with self.lock:
+            self.series = {metric.name: {} for metric in METRICS}
+
+
+registry = Registry()
+
+
+def register(metric):
+    """Export another metric, recorded with registry.increment (counters) by its owner"""
+    with registry.lock:
+        METRICS.append(metric)
+        registry.series.setdefault(metric.name, {})
+    return metric
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.render_seconds = None
+        self.serialize_seconds = None
+        self.serializing = False
+        # A list while ?profile=sql asks for the statements themselves
+        self.statements = None
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection; idle outside measured requests"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.query_seconds += elapsed
+        if metrics.statements is not None:
+            metrics.statements.append((context['connection'].alias, sql, params, many, elapsed))
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    # Connections keep their wrappers when they reconnect
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def timed_data(data):
+    """Serializer .data getter that reports its time to the request metrics"""
+    @functools.wraps(data)
+    def wrapper(serializer):
+        metrics = _current.get()
+        # A serializer reading another's .data inside its own is counted once
+        if metrics is None or metrics.serializing:
+            return data(serializer)
+        metrics.serializing = True
+        started = time.perf_counter()
+        try:
+            return data(serializer)
+        finally:
+            metrics.serializing = False
+            elapsed = time.perf_counter() - started
+            metrics.serialize_seconds = (metrics.serialize_seconds or 0) + elapsed
+    return wrapper
+
+
+_serializer_timed = False
+
+
+def install_serializer_timer():
+    """Time serializer .data; idempotent, as every test client loads the middleware again"""
+    global _serializer_timed
+    if _serializer_timed:
+        return
+    _serializer_timed = True
+
+    from rest_framework.serializers import BaseSerializer
+    # Serializer.data and ListSerializer.data both end in BaseSerializer.data
+    BaseSerializer.data = property(timed_data(BaseSerializer.data.fget))
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that reports its encoding time to the request metrics"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            metrics = _current.get()
+            if metrics is not None:
+                elapsed = time.perf_counter() - started
+                metrics.render_seconds = (metrics.render_seconds or 0) + elapsed
+
+
+class MetricsMiddleware:
+    """Records latency, queries, render time and size of every request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # Connections opened before the middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(None, connection)
+        install_serializer_timer()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, metrics)
+        return response
+
+    def _record(self, request, response, metrics):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else 'unresolved'
+        size = None if response.streaming else len(response.content)
+        registry.record((view, request.method, str(response.status_code)), (
+            time.perf_counter() - metrics.started,
+            size,
+            metrics.queries,
+            metrics.queries,
+            metrics.query_seconds,
+            metrics.render_seconds,
+            metrics.serialize_seconds,
+        ))
+        registry.flush_if_due()
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def collect():
+    """Series of all workers merged, with this worker's live totals"""
+    registry.flush()
+    workers = cache.get(WORKERS_KEY, [])
+    snapshots = cache.get_many([SNAPSHOT_KEY.format(worker) for worker in workers])
+    live = [worker for worker in workers if SNAPSHOT_KEY.format(worker) in snapshots]
+    if len(live) < len(workers):
+        cache.set(WORKERS_KEY, live, timeout=None)
+
+    merged = {metric.name: {} for metric in METRICS}
+    for snapshot in snapshots.values():
+        for metric in METRICS:
+            for labels, values in snapshot.get(metric.name, {}).items():
+                series = merged[metric.name].setdefault(labels, metric.empty())
+                metric.merge(series, values)
+    return merged
+
+
+def exposition(merged):
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.help_text}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for labels, series in sorted(merged[metric.name].items()):
+            label_text = ','.join(f'{name}="{escape(value)}"' for name, value in zip(metric.label_names, labels))
+            lines.extend(metric.lines(label_text, series))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; set METRICS_TOKEN to require it as a bearer token"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(collect()), content_type=CONTENT_TYPE)
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_alter_booking_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'confirmed'])), fields=['court', 'booking_date', 'start_time'], name='booking_active_court_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'booking_date', 'start_time'], name='booking_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_date', 'start_time'], name='booking_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='court',
+            index=models.Index(fields=['club', 'is_active', 'court_type'], name='court_club_active_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='courtavailabilityrestriction',
+            index=models.Index(fields=['court', 'weekday'], name='restriction_court_weekday_idx'),
+        ),
+    ]
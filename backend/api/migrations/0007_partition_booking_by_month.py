@@ -0,0 +1,108 @@
+"""
+Convert api_booking into a table range-partitioned by booking_date month.
+
+PostgreSQL only; on other databases this migration does nothing. The
+primary key becomes (id, booking_date) because every unique index on a
+partitioned table must include the partition key; id stays unique in
+practice since it is still drawn from a single sequence.
+"""
+from datetime import date
+
+from django.db import migrations
+
+TABLE = 'api_booking'
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+
+def _create_indexes(cursor, primary_key):
+    # Mirrors the constraints and indexes declared on the Booking model
+    cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY ({primary_key})')
+    cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT unique_booking UNIQUE (court_id, booking_date, start_time)')
+    cursor.execute(
+        f"CREATE INDEX booking_active_court_date_idx ON {TABLE} (court_id, booking_date, start_time) "
+        f"WHERE status IN ('pending', 'confirmed')"
+    )
+    cursor.execute(f'CREATE INDEX booking_user_date_idx ON {TABLE} (user_id, booking_date, start_time)')
+    cursor.execute(f'CREATE INDEX booking_date_idx ON {TABLE} (booking_date, start_time)')
+    cursor.execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_court_id_fk_api_court_id '
+        f'FOREIGN KEY (court_id) REFERENCES api_court (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    cursor.execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_user_id_fk_auth_user_id '
+        f'FOREIGN KEY (user_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+
+
+def partition_booking_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_unpartitioned')
+        cursor.execute(
+            f'CREATE TABLE {TABLE} (LIKE {TABLE}_unpartitioned INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE (booking_date)'
+        )
+        cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+        # One partition per month from the oldest booking to a few months ahead
+        cursor.execute(f'SELECT MIN(booking_date), MAX(id) FROM {TABLE}_unpartitioned')
+        oldest, max_id = cursor.fetchone()
+        month = (oldest or date.today()).replace(day=1)
+        last_month = _add_months(date.today().replace(day=1), MONTHS_AHEAD)
+        while month <= last_month:
+            next_month = _add_months(month, 1)
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [month.isoformat(), next_month.isoformat()],
+            )
+            month = next_month
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_unpartitioned')
+        cursor.execute(f'DROP TABLE {TABLE}_unpartitioned')
+
+        # Identity columns are not supported on partitioned tables before
+        # PostgreSQL 17, so ids come from a sequence owned by the column
+        cursor.execute(f'CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id')
+        if max_id:
+            cursor.execute(f"SELECT setval('{TABLE}_id_seq', %s)", [max_id])
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+
+        _create_indexes(cursor, 'id, booking_date')
+
+
+def unpartition_booking_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned')
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned)')
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_partitioned')
+        cursor.execute(f'SELECT MAX(id) FROM {TABLE}')
+        max_id = cursor.fetchone()[0]
+        # Drops every partition and the sequence owned by the old id column
+        cursor.execute(f'DROP TABLE {TABLE}_partitioned CASCADE')
+
+        cursor.execute(f'ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        if max_id:
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), %s)", [max_id])
+
+        _create_indexes(cursor, 'id')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_booking_court_restriction_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_booking_table, unpartition_booking_table),
+    ]
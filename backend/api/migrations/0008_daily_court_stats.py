@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-19 04:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_partition_booking_by_month'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCourtStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('booked_minutes', models.PositiveIntegerField(default=0)),
+                ('booking_count', models.PositiveIntegerField(default=0)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('unique_users', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('court', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='api.court')),
+            ],
+            options={
+                'verbose_name': 'Daily court stats',
+                'verbose_name_plural': 'Daily court stats',
+                'indexes': [models.Index(fields=['date'], name='court_stats_date_idx')],
+                'unique_together': {('court', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+"""
+GIN indexes for club search (api.search).
+
+PostgreSQL only; on other databases both steps do nothing. The full-text index is built over the same weighted tsvector
+expression api.search queries, and the trigram indexes serve the
+typo-tolerant word similarity matches on name and city.
+"""
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def search_indexes():
+    return [
+        GinIndex(
+            SearchVector('name', weight='A', config='simple')
+            + SearchVector('city', weight='B', config='simple')
+            + SearchVector('state', weight='C', config='simple'),
+            name='club_search_vector_idx',
+        ),
+        GinIndex(OpClass('name', name='gin_trgm_ops'), name='club_name_trgm_idx'),
+        GinIndex(OpClass('city', name='gin_trgm_ops'), name='club_city_trgm_idx'),
+    ]
+
+
+def add_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Club = apps.get_model('api', 'Club')
+    for index in search_indexes():
+        schema_editor.add_index(Club, index)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Club = apps.get_model('api', 'Club')
+    for index in search_indexes():
+        schema_editor.remove_index(Club, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_daily_court_stats'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
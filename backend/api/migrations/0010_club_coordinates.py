@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-19 05:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_club_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='club',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='club',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.1.1 on 2026-10-19 06:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+COURT_TYPES = ['hard', 'clay', 'grass']
+
+
+def fill_counters(apps, schema_editor):
+    Booking = apps.get_model('api', 'Booking')
+    BookingCounts = apps.get_model('api', 'BookingCounts')
+    Club = apps.get_model('api', 'Club')
+    Court = apps.get_model('api', 'Court')
+
+    counts = {}
+    for row in Court.objects.order_by().values('club_id', 'court_type', 'is_active').annotate(count=Count('id')):
+        field = f"{'active' if row['is_active'] else 'inactive'}_{row['court_type']}_courts"
+        counts.setdefault(row['club_id'], {})[field] = row['count']
+    for club_id, fields in counts.items():
+        Club.objects.filter(pk=club_id).update(**fields)
+
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    users = {user_id: {} for user_id in User.objects.values_list('pk', flat=True)}
+    for row in Booking.objects.order_by().values('user_id', 'status').annotate(count=Count('id')):
+        users[row['user_id']][row['status']] = row['count']
+    BookingCounts.objects.bulk_create(
+        [BookingCounts(user_id=user_id, **statuses) for user_id, statuses in users.items()], batch_size=1000,
+    )
+
+
+def fill_courts_summary(apps, schema_editor):
+    Club = apps.get_model('api', 'Club')
+    for club in Club.objects.all():
+        club.courts_summary = [
+            {'type': court_type, 'count': total}
+            for court_type in COURT_TYPES
+            if (total := getattr(club, f'active_{court_type}_courts') + getattr(club, f'inactive_{court_type}_courts'))
+        ]
+        club.save(update_fields=['courts_summary'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_club_coordinates'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingCounts',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='booking_counts', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('pending', models.IntegerField(default=0)),
+                ('confirmed', models.IntegerField(default=0)),
+                ('canceled', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Booking counts',
+                'verbose_name_plural': 'Booking counts',
+            },
+        ),
+        migrations.AddField(
+            model_name='club',
+            name='active_clay_courts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='club',
+            name='active_grass_courts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='club',
+            name='active_hard_courts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='club',
+            name='inactive_clay_courts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='club',
+            name='inactive_grass_courts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='club',
+            name='inactive_hard_courts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, fill_courts_summary),
+        migrations.RemoveField(
+            model_name='club',
+            name='courts_summary',
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from datetime import datetime, time
@@ -22,10 +22,13 @@ class Club(models.Model):
     phone_number = models.CharField(max_length=15, null=True, blank=True)
     email = models.EmailField(null=True, blank=True)
     website = models.URLField(null=True, blank=True)
-    courts_summary = models.JSONField(
-        default=list,
-        help_text="Store a summary of courts, e.g., [{'type': 'hard', 'count': 3}]"
-    )
+    # Courts by type and active state, kept up to date by api.counters
+    active_hard_courts = models.IntegerField(default=0)
+    inactive_hard_courts = models.IntegerField(default=0)
+    active_clay_courts = models.IntegerField(default=0)
+    inactive_clay_courts = models.IntegerField(default=0)
+    active_grass_courts = models.IntegerField(default=0)
+    inactive_grass_courts = models.IntegerField(default=0)
     # Add new fields for booking settings
     opening_time = models.TimeField(default=time(8, 0))  # Default: 8:00 AM
     closing_time = models.TimeField(default=time(20, 0))  # Default: 8:00 PM
@@ -34,12 +37,32 @@ class Club(models.Model):
     booking_increment = models.IntegerField(default=30, help_text="Booking time increment in minutes")
     max_advance_booking_days = models.IntegerField(default=14, help_text="Maximum days in advance for booking")
     same_day_booking_cutoff = models.IntegerField(default=0, help_text="Hours before start time that same-day booking is cut off")
+    # Centroid of zip_code, filled in when the club is saved (see api.geo)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_approved = models.BooleanField(default=False)
 
     def __str__(self):
         return self.name
+
+    @property
+    def court_counts(self):
+        """{court type: {'active': n, 'inactive': n}}"""
+        return {
+            court_type: {state: getattr(self, f'{state}_{court_type}_courts') for state in ('active', 'inactive')}
+            for court_type, _ in Court.COURT_TYPES
+        }
+
+    @property
+    def courts_summary(self):
+        """Courts per type, e.g. [{'type': 'hard', 'count': 3}], for the types the club has"""
+        summary = []
+        for court_type, counts in self.court_counts.items():
+            if counts['active'] + counts['inactive']:
+                summary.append({'type': court_type, 'count': counts['active'] + counts['inactive']})
+        return summary
     
 # Add to api/models.py
 
@@ -75,6 +98,15 @@ class Court(models.Model):
     
     class Meta:
         unique_together = ['club', 'court_number']
+        indexes = [
+            # Active courts of a club by type (available_slots, court filters)
+            models.Index(fields=['club', 'is_active', 'court_type'], name='court_club_active_type_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        # In one transaction with the club's court counts (api.signals)
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.club.name} - {self.get_court_type_display()} Court #{self.court_number}"
@@ -100,6 +132,9 @@ class CourtAvailabilityRestriction(models.Model):
     class Meta:
         verbose_name = 'Court restriction'
         verbose_name_plural = 'Court restrictions'
+        indexes = [
+            models.Index(fields=['court', 'weekday'], name='restriction_court_weekday_idx'),
+        ]
     
     def __str__(self):
         return f"{self.court} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
@@ -111,6 +146,10 @@ class Booking(models.Model):
         ('canceled', 'Canceled'),
         ('completed', 'Completed'),
     ]
+    # Statuses that occupy the court
+    ACTIVE_STATUSES = ['pending', 'confirmed']
+    # Statuses that count as used court time in statistics
+    BOOKED_STATUSES = ['pending', 'confirmed', 'completed']
     
     court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name='bookings')
     user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='bookings')
@@ -131,6 +170,20 @@ class Booking(models.Model):
                 name='unique_booking'
             ),
         ]
+        # Every index ends with (booking_date, start_time) so rows come back
+        # in the default ordering without a separate sort
+        indexes = [
+            # Conflict checks and available_slots only look at active bookings
+            models.Index(
+                fields=['court', 'booking_date', 'start_time'],
+                condition=models.Q(status__in=['pending', 'confirmed']),
+                name='booking_active_court_date_idx',
+            ),
+            # A user's own bookings by date
+            models.Index(fields=['user', 'booking_date', 'start_time'], name='booking_user_date_idx'),
+            # Date-range scans across all courts (admin calendar)
+            models.Index(fields=['booking_date', 'start_time'], name='booking_date_idx'),
+        ]
     
     def clean(self):
         # Check if end time is after start time
@@ -138,11 +191,12 @@ class Booking(models.Model):
             raise ValidationError("End time must be after start time")
         
         # Check if court is available during requested time
+        # No ordering needed here, so skip the default sort
         overlapping_bookings = Booking.objects.filter(
             court=self.court,
             booking_date=self.booking_date,
-            status__in=['pending', 'confirmed'],
-        ).exclude(id=self.id)
+            status__in=self.ACTIVE_STATUSES,
+        ).exclude(id=self.id).order_by()
         
         for booking in overlapping_bookings:
             # Check for time overlap
@@ -150,18 +204,60 @@ class Booking(models.Model):
                 self.end_time > booking.start_time):
                 raise ValidationError(f"This court is already booked from {booking.start_time} to {booking.end_time}")
         
-        # Check if booking is within club operating hours
-        club_opening = self.court.club.opening_time
-        club_closing = self.court.club.closing_time
+        # Check if booking is within club operating hours, from the cached club settings
+        from .club_config import get_club_config
+        club = get_club_config(self.court.club_id)
+        club_opening = club.opening_time
+        club_closing = club.closing_time
         
         if self.start_time < club_opening or self.end_time > club_closing:
             raise ValidationError(f"Booking must be within club hours: {club_opening} - {club_closing}")
     
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        # In one transaction with the user's booking counts (api.signals)
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.court} - {self.booking_date} ({self.start_time}-{self.end_time})"
 
 
+class DailyCourtStats(models.Model):
+    """Booking totals per court and day, maintained by api.rollups"""
+    court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    booked_minutes = models.PositiveIntegerField(default=0)
+    booking_count = models.PositiveIntegerField(default=0)
+    cancellations = models.PositiveIntegerField(default=0)
+    unique_users = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['court', 'date']
+        indexes = [
+            # Date-range scans across courts (rebuilds, club totals)
+            models.Index(fields=['date'], name='court_stats_date_idx'),
+        ]
+        verbose_name = 'Daily court stats'
+        verbose_name_plural = 'Daily court stats'
+
+    def __str__(self):
+        return f"{self.court} - {self.date}"
+
+
+class BookingCounts(models.Model):
+    """A user's bookings by status, kept up to date by api.counters"""
+    user = models.OneToOneField(UserProfile, on_delete=models.CASCADE, primary_key=True,
+                                related_name='booking_counts')
+    pending = models.IntegerField(default=0)
+    confirmed = models.IntegerField(default=0)
+    canceled = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Booking counts'
+        verbose_name_plural = 'Booking counts'
+
+    def __str__(self):
+        return f"{self.user} - bookings by status"
@@ -0,0 +1,109 @@
+"""
+Court creation for new and existing clubs.
+
+Courts are described as [{'type': 'hard', 'count': 3}, ...] (the format
+of Club.courts_summary), inserted with one bulk_create and numbered
+after the club's highest court. bulk_create skips the signals that keep
+the club's court counters, so the new courts are added to them in one
+update, and adding any number of courts costs the same few queries.
+Callers wrap the club and court writes in one transaction.
+"""
+from collections import Counter
+
+from django.db.models import F, Max
+from django.utils import timezone
+from rest_framework import serializers
+
+from .club_config import bump_config_version_on_commit
+from .counters import COURT_COUNT_FIELDS, court_count_field
+from .dashboard import bump_generation_on_commit
+from .models import Club, Court
+from .response_cache import invalidate_tags_on_commit
+
+COURT_TYPES = [choice for choice, _ in Court.COURT_TYPES]
+
+
+def validate_courts_data(courts_data):
+    """Validated list of (court type, count); raises ValidationError"""
+    if not isinstance(courts_data, list):
+        raise serializers.ValidationError({'courts': ['Expected a list of {"type", "count"} entries.']})
+
+    cleaned, errors = [], {}
+    for index, entry in enumerate(courts_data):
+        try:
+            court_type, count = entry.get('type'), int(entry.get('count', 0))
+        except (AttributeError, TypeError, ValueError):
+            errors[index] = 'Each entry needs a type and a whole number count.'
+            continue
+        if court_type not in COURT_TYPES:
+            errors[index] = f'Unknown court type "{court_type}", expected one of {", ".join(COURT_TYPES)}.'
+        elif count < 0:
+            errors[index] = 'Count cannot be negative.'
+        elif count:
+            cleaned.append((court_type, count))
+    if errors:
+        raise serializers.ValidationError({'courts': errors})
+    return cleaned
+
+
+def new_courts(club, courts_data, first_number):
+    """Unsaved Court objects for validated courts data, numbered from first_number"""
+    courts = []
+    for court_type, count in courts_data:
+        for _ in range(count):
+            courts.append(Court(club=club, court_type=court_type, court_number=first_number + len(courts)))
+    return courts
+
+
+def new_court_counts(courts_data):
+    """{counter field: count} of the active courts described by courts_data"""
+    counts = Counter()
+    for court_type, count in courts_data:
+        counts[court_count_field(court_type, True)] += count
+    return counts
+
+
+def count_new_courts(club, courts_data):
+    """Add bulk-created courts to an existing club's counters, in the database and on `club`"""
+    added = new_court_counts(courts_data)
+    for field, count in added.items():
+        setattr(club, field, getattr(club, field) + count)
+    club.updated_at = timezone.now()
+    # update() rather than save(): no second round of Club signals
+    Club.objects.filter(pk=club.pk).update(
+        updated_at=club.updated_at, **{field: F(field) + count for field, count in added.items()}
+    )
+
+
+def invalidate_club_courts_on_commit(club):
+    """Drop what was cached from the club's courts; bulk_create and update() skip the signals that would"""
+    bump_generation_on_commit({club.pk})
+    bump_config_version_on_commit({club.pk})
+    invalidate_tags_on_commit({'clubs', 'courts', f'club:{club.pk}'})
+
+
+def create_club_courts(club, courts_data):
+    """
+    Create the courts of a club just saved with new_court_counts(courts_data).
+    Must run in the club's transaction; returns the created courts.
+    """
+    courts = Court.objects.bulk_create(new_courts(club, courts_data, first_number=1))
+    invalidate_club_courts_on_commit(club)
+    return courts
+
+
+def add_club_courts(club, courts_data):
+    """
+    Create courts for an existing club and add them to its counters.
+    Must run inside a transaction; returns the created courts.
+    """
+    # Concurrent additions to the same club wait here instead of picking the same numbers
+    counts = Club.objects.select_for_update().filter(pk=club.pk).values(*COURT_COUNT_FIELDS).get()
+    for field, count in counts.items():
+        setattr(club, field, count)
+
+    highest = Court.objects.filter(club=club).aggregate(highest=Max('court_number'))['highest'] or 0
+    courts = Court.objects.bulk_create(new_courts(club, courts_data, highest + 1))
+    count_new_courts(club, courts_data)
+    invalidate_club_courts_on_commit(club)
+    return courts
@@ -0,0 +1,119 @@
+"""
+Monthly range partitions of the booking table on PostgreSQL.
+
+Migration 0007 turns api_booking into a table partitioned by booking_date,
+with one partition per month plus a default partition that catches rows
+for months that have no partition yet. These helpers create upcoming
+partitions and detach old ones; the management commands
+create_booking_partitions and archive_booking_partitions wrap them.
+
+On other databases the booking table stays a plain table and the helpers
+report that partitioning is unavailable.
+"""
+import re
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import Booking
+
+TABLE = Booking._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+ARCHIVE_SCHEMA = 'booking_archive'
+PARTITION_NAME = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def is_partitioned():
+    """True if the booking table is a partitioned table"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [TABLE])
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """Months that currently have an attached partition, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    months = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_month_partition(month):
+    """
+    Create the partition for one month.
+
+    Rows for that month that already landed in the default partition are
+    moved into the new partition before it is attached, otherwise
+    PostgreSQL would refuse the attach.
+    """
+    month = month_start(month)
+    name = partition_name(month)
+    start, end = month, add_months(month, 1)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE booking_date >= %s AND booking_date < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            [start, end],
+        )
+        cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+                       [start.isoformat(), end.isoformat()])
+    return name
+
+
+def ensure_partitions(first_month, last_month):
+    """Create any missing monthly partitions between the two months (inclusive)"""
+    existing = set(list_partitions())
+    created = []
+    month = month_start(first_month)
+    while month <= month_start(last_month):
+        if month not in existing:
+            created.append(create_month_partition(month))
+        month = add_months(month, 1)
+    return created
+
+
+def detach_partition(month, schema=ARCHIVE_SCHEMA):
+    """Detach a month's partition and move it into the archive schema"""
+    name = partition_name(month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+        cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {schema}')
+        cursor.execute(f'ALTER TABLE {name} SET SCHEMA {schema}')
+    return f'{schema}.{name}'
+
+
+def export_and_drop(table, path):
+    """Write an archived partition to CSV and drop it"""
+    with connection.cursor() as cursor, open(path, 'w', newline='') as output:
+        cursor.copy_expert(f'COPY {table} TO STDOUT WITH CSV HEADER', output)
+        cursor.execute(f'DROP TABLE {table}')
@@ -0,0 +1,249 @@
+"""
+On-demand profiling of a single request, for superusers.
+
+Adding ?profile=cprofile to any request returns a cProfile summary of it
+instead of the normal body (?profile_sort=cumulative|tottime|calls and
+?profile_limit=N pick the rows), and ?profile=sql the statements it ran
+with their timings and the database's plan for each SELECT. Apart from
+that the request runs as usual, writes included.
+
+The parameter is ignored unless the request authenticates as an active
+superuser, which is checked against the database rather than trusted from
+the token. Requests without it only pay for a substring check of the query
+string, and REQUEST_PROFILING=0 removes the middleware altogether.
+
+The interpreter has one profiler at a time, so a process runs one cProfile
+profile at once and answers 409 to another arriving meanwhile. Under ASGI,
+cProfile only sees the event loop thread, so ORM work an async view hands
+to sync_to_async shows up as time spent waiting, and other requests'
+coroutines running on the loop during the profile are counted in it.
+"""
+import cProfile
+import os
+import pstats
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import metrics
+from .authentication import ClaimsJWTAuthentication
+from .slow_queries import explain
+
+PARAMETER = 'profile'
+MODES = ('cprofile', 'sql')
+# Position in a pstats entry (primitive calls, calls, tottime, cumtime, callers)
+SORT_KEYS = {'cumulative': 3, 'tottime': 2, 'calls': 1}
+DEFAULT_LIMIT = 40
+# Held while a cProfile profile runs in this process
+profiler_lock = threading.Lock()
+
+
+def profile_running():
+    return JsonResponse({'error': "A profile is already running, try again shortly"}, status=409)
+
+
+def is_superuser(request):
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    user = result[0] if result else getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return False
+    return User.objects.filter(pk=user.pk, is_active=True, is_superuser=True).exists()
+
+
+def parse_options(request):
+    """(mode, sort, limit) of a profiled request; ValueError describes a bad one"""
+    mode = request.GET.get(PARAMETER)
+    if mode not in MODES:
+        raise ValueError(f"profile must be one of: {', '.join(MODES)}")
+    sort = request.GET.get('profile_sort', 'cumulative')
+    if sort not in SORT_KEYS:
+        raise ValueError(f"profile_sort must be one of: {', '.join(SORT_KEYS)}")
+    try:
+        limit = int(request.GET.get('profile_limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError("profile_limit must be a number")
+    return mode, sort, max(limit, 1)
+
+
+def location(key):
+    filename, line, function = key
+    if filename == '~':
+        return function
+    if 'site-packages' + os.sep in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    elif filename.startswith(str(settings.BASE_DIR)):
+        filename = os.path.relpath(filename, settings.BASE_DIR)
+    return f'{filename}:{line}({function})'
+
+
+def cprofile_report(profiler, sort, limit):
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][SORT_KEYS[sort]], reverse=True)
+    return {
+        'total_calls': sum(entry[1] for entry in stats.values()),
+        'sort': sort,
+        'functions': [
+            {
+                'function': location(key),
+                'calls': calls,
+                'primitive_calls': primitive_calls,
+                'tottime': round(tottime, 6),
+                'cumtime': round(cumtime, 6),
+            }
+            for key, (primitive_calls, calls, tottime, cumtime, callers) in rows[:limit]
+        ],
+    }
+
+
+def plain(params, many):
+    if many:
+        return f'{len(params)} rows'
+    if isinstance(params, dict):
+        return {name: plain([value], False)[0] for name, value in params.items()}
+    return [value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+            for value in params or ()]
+
+
+def sql_report(statements):
+    plans = {}
+    repeats = Counter((alias, sql) for alias, sql, params, many, seconds in statements)
+    entries = []
+    for alias, sql, params, many, seconds in statements:
+        entry = {
+            'alias': alias,
+            'sql': sql,
+            'params': plain(params, many),
+            'ms': round(seconds * 1000, 3),
+            'repeated': repeats[alias, sql],
+        }
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            key = (alias, sql, repr(params))
+            if key not in plans:
+                plans[key] = explain(connections[alias], sql, params, analyze=True)
+            entry['explain'] = plans[key]
+        entries.append(entry)
+    return {
+        'queries': len(statements),
+        'query_ms': round(sum(statement[-1] for statement in statements) * 1000, 3),
+        'duplicates': sum(count - 1 for count in repeats.values()),
+        'statements': entries,
+    }
+
+
+class ProfilingMiddleware:
+    """Answers ?profile=cprofile|sql from a superuser with a profile of the request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        # The statements come from the metrics query counter
+        for connection in connections.all(initialized_only=True):
+            metrics.install_query_counter(None, connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if PARAMETER + '=' not in request.META.get('QUERY_STRING', '') or not is_superuser(request):
+            return self.get_response(request)
+        try:
+            mode, sort, limit = parse_options(request)
+        except ValueError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+
+        started = time.perf_counter()
+        if mode == 'cprofile':
+            if not profiler_lock.acquire(blocking=False):
+                return profile_running()
+            try:
+                profiler = cProfile.Profile()
+                response = profiler.runcall(self.get_response, request)
+            finally:
+                profiler_lock.release()
+            seconds = time.perf_counter() - started
+            return self._respond(request, response, seconds, cprofile_report(profiler, sort, limit))
+        recording, token = self._record_statements()
+        try:
+            response = self.get_response(request)
+        finally:
+            statements = self._stop_recording(recording, token)
+        seconds = time.perf_counter() - started
+        return self._respond(request, response, seconds, sql_report(statements))
+
+    async def __acall__(self, request):
+        if PARAMETER + '=' not in request.META.get('QUERY_STRING', ''):
+            return await self.get_response(request)
+        if not await sync_to_async(is_superuser)(request):
+            return await self.get_response(request)
+        try:
+            mode, sort, limit = parse_options(request)
+        except ValueError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+
+        started = time.perf_counter()
+        if mode == 'cprofile':
+            if not profiler_lock.acquire(blocking=False):
+                return profile_running()
+            try:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    profiler.disable()
+            finally:
+                profiler_lock.release()
+            seconds = time.perf_counter() - started
+            return self._respond(request, response, seconds, cprofile_report(profiler, sort, limit))
+        recording, token = self._record_statements()
+        try:
+            response = await self.get_response(request)
+        finally:
+            statements = self._stop_recording(recording, token)
+        seconds = time.perf_counter() - started
+        return self._respond(request, response, seconds, await sync_to_async(sql_report)(statements))
+
+    def _record_statements(self):
+        # Share the request's metrics when MetricsMiddleware is installed
+        recording = metrics._current.get()
+        token = None
+        if recording is None:
+            recording = metrics.RequestMetrics()
+            token = metrics._current.set(recording)
+        recording.statements = []
+        return recording, token
+
+    def _stop_recording(self, recording, token):
+        # Stop before the report runs its EXPLAINs
+        statements, recording.statements = recording.statements, None
+        if token is not None:
+            metrics._current.reset(token)
+        return statements
+
+    def _respond(self, request, response, seconds, report):
+        """The profile in place of the response; `seconds` includes the profiler's own overhead"""
+        return JsonResponse({
+            'mode': request.GET[PARAMETER],
+            'path': request.get_full_path(),
+            'method': request.method,
+            'status': response.status_code,
+            'seconds': round(seconds, 6),
+            **report,
+        }, encoder=DjangoJSONEncoder)
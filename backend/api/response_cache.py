@@ -0,0 +1,248 @@
+"""
+Tag-invalidated cache of API response data.
+
+ResponseCacheMixin serves a viewset's list (and the other actions in its
+cached_actions) from the RESPONSE_CACHE_ALIAS cache, keyed by the full URL
+and the audience (what the user is allowed to see). Each entry lists the
+tags it depends on, such as `club:12` for a club in the page or `clubs`
+for the list as a whole. invalidate_tags() stamps tags with the current
+value of a logical clock kept in the cache (incremented on every
+invalidation, so it does not depend on the hosts' clocks agreeing), and an
+entry is only served while none of its tags were stamped after it started
+building, so a write never has to find the entries it affects. api.signals
+stamps the tags of clubs, courts and users as they change.
+
+Entries are fresh for RESPONSE_CACHE_SECONDS and may then be served stale
+for RESPONSE_CACHE_STALE_SECONDS while one request rebuilds them. Builds
+are single-flight: a request that finds a key missing or invalidated
+takes a lock in the cache, and the others wait up to
+RESPONSE_CACHE_WAIT_SECONDS for its result instead of building it too.
+Locks, the clock, tags and entries share one backend, which must be shared
+by every worker that serves these endpoints: a file-based cache (one
+host), the database cache or memcached/Redis. Local memory only suits a
+single process, so settings leave the cache off by default there. Lookups
+are counted in response_cache_requests_total.
+"""
+import asyncio
+import hashlib
+import secrets
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from .metrics import Counter, register, registry
+from .roles import has_role, is_admin
+
+CLOCK_KEY = 'response_cache:clock'
+TAG_KEY = 'response_cache:tag:{}'
+ENTRY_KEY = 'response_cache:entry:{}'
+LOCK_KEY = 'response_cache:lock:{}'
+POLL_SECONDS = 0.02
+
+REQUESTS = register(Counter('response_cache_requests_total', 'Response cache lookups by endpoint and result',
+                            label_names=('endpoint', 'result')))
+
+
+def backend():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def enabled():
+    return getattr(settings, 'RESPONSE_CACHE_SECONDS', 0) > 0
+
+
+def clock():
+    """The current value of the logical clock that tags are stamped with"""
+    cache = backend()
+    value = cache.get(CLOCK_KEY)
+    if value is None:
+        # A lost clock restarts from the time in microseconds, above any value it handed out
+        cache.add(CLOCK_KEY, time.time_ns() // 1000, timeout=None)
+        value = cache.get(CLOCK_KEY)
+    return value
+
+
+def tick():
+    """Advance the clock; returns its new value"""
+    cache = backend()
+    try:
+        return cache.incr(CLOCK_KEY)
+    except ValueError:
+        clock()
+        return cache.incr(CLOCK_KEY)
+
+
+def invalidate_tags(tags):
+    stamp = tick()
+    backend().set_many({TAG_KEY.format(tag): stamp for tag in tags}, timeout=None)
+
+
+def invalidate_tags_on_commit(tags):
+    """
+    Invalidate the tags now, so the rest of the transaction reads its own
+    writes, and again once it commits, for entries other requests built
+    from the rows it replaced in between
+    """
+    tags = set(tags)
+    if tags:
+        invalidate_tags(tags)
+        transaction.on_commit(lambda: invalidate_tags(tags), robust=True)
+
+
+def audience(user):
+    """Users who may see the same clubs and courts share cached responses"""
+    if is_admin(user):
+        return 'admin'
+    if has_role(user, 'Manager'):
+        # Plus the clubs they manage
+        return f'manager:{user.pk}'
+    return 'user'
+
+
+def cache_key(endpoint, vary, url):
+    return f'{endpoint}:{vary}:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+def lookup(key):
+    """
+    The entry under `key` and whether it is 'fresh' or 'stale', or
+    (None, None) if it is missing or one of its tags changed since
+    """
+    cache = backend()
+    entry = cache.get(ENTRY_KEY.format(key))
+    if entry is None:
+        return None, None
+    stamps = cache.get_many([TAG_KEY.format(tag) for tag in entry['tags']])
+    # A tag that fell out of the cache may have been stamped since
+    if len(stamps) < len(entry['tags']) or any(stamp > entry['started_at'] for stamp in stamps.values()):
+        return None, None
+    return entry, 'fresh' if time.time() < entry['fresh_until'] else 'stale'
+
+
+def acquire(key):
+    """A token if this request gets to build the key, else None"""
+    token = secrets.token_hex(8)
+    if backend().add(LOCK_KEY.format(key), token, timeout=getattr(settings, 'RESPONSE_CACHE_LOCK_SECONDS', 10)):
+        return token
+    return None
+
+
+def release(key, token):
+    cache = backend()
+    if cache.get(LOCK_KEY.format(key)) == token:
+        cache.delete(LOCK_KEY.format(key))
+
+
+def save(key, started_at, data, status, tags):
+    """Cache a built response, if it is a 200, and return it as an entry"""
+    entry = {'data': data, 'status': status}
+    if status != 200:
+        return entry
+    fresh_seconds = getattr(settings, 'RESPONSE_CACHE_SECONDS', 0)
+    entry.update(tags=sorted(set(tags)), started_at=started_at, fresh_until=time.time() + fresh_seconds)
+    cache = backend()
+    # Tags never stamped count from this build on, which leaves older entries invalid
+    for tag in entry['tags']:
+        cache.add(TAG_KEY.format(tag), started_at, timeout=None)
+    cache.set(ENTRY_KEY.format(key), entry,
+              timeout=fresh_seconds + getattr(settings, 'RESPONSE_CACHE_STALE_SECONDS', 0))
+    return entry
+
+
+def fetch(endpoint, key, build):
+    """
+    The entry under `key`, calling build() for (data, status, tags) when
+    it has to be built
+    """
+    entry, state = lookup(key)
+    if state == 'fresh':
+        registry.increment(REQUESTS.name, (endpoint, 'hit'))
+        return entry
+    token = acquire(key)
+    if token is None and state == 'stale':
+        # Someone else is rebuilding it
+        registry.increment(REQUESTS.name, (endpoint, 'stale'))
+        return entry
+    if token is None:
+        deadline = time.monotonic() + getattr(settings, 'RESPONSE_CACHE_WAIT_SECONDS', 2)
+        while time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            entry, state = lookup(key)
+            if entry is not None:
+                registry.increment(REQUESTS.name, (endpoint, 'wait'))
+                return entry
+    registry.increment(REQUESTS.name, (endpoint, 'miss'))
+    try:
+        started_at = clock()
+        return save(key, started_at, *build())
+    finally:
+        if token is not None:
+            release(key, token)
+
+
+async def afetch(endpoint, key, build):
+    """fetch() for async views, where build is a coroutine function"""
+    entry, state = await sync_to_async(lookup)(key)
+    if state == 'fresh':
+        registry.increment(REQUESTS.name, (endpoint, 'hit'))
+        return entry
+    token = await sync_to_async(acquire)(key)
+    if token is None and state == 'stale':
+        registry.increment(REQUESTS.name, (endpoint, 'stale'))
+        return entry
+    if token is None:
+        deadline = time.monotonic() + getattr(settings, 'RESPONSE_CACHE_WAIT_SECONDS', 2)
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_SECONDS)
+            entry, state = await sync_to_async(lookup)(key)
+            if entry is not None:
+                registry.increment(REQUESTS.name, (endpoint, 'wait'))
+                return entry
+    registry.increment(REQUESTS.name, (endpoint, 'miss'))
+    try:
+        started_at = await sync_to_async(clock)()
+        return await sync_to_async(save)(key, started_at, *await build())
+    finally:
+        if token is not None:
+            await sync_to_async(release)(key, token)
+
+
+def results(data):
+    """The objects of a paginated or plain list response"""
+    return data['results'] if isinstance(data, dict) else data
+
+
+class ResponseCacheMixin:
+    """
+    Serves list and the other cached_actions from the response cache.
+    Views name the tags of a response's data in get_cache_tags(); actions
+    other than list call cached_response() themselves.
+    """
+    cached_actions = ('list',)
+
+    def get_cache_vary(self, request):
+        return audience(request.user)
+
+    def get_cache_tags(self, data):
+        return ()
+
+    def cached_response(self, request, respond):
+        if not enabled() or request.method != 'GET' or self.action not in self.cached_actions:
+            return respond()
+
+        def build():
+            response = respond()
+            return response.data, response.status_code, self.get_cache_tags(response.data)
+
+        endpoint = f'{self.basename}-{self.action}'
+        key = cache_key(endpoint, self.get_cache_vary(request), request.build_absolute_uri())
+        entry = fetch(endpoint, key, build)
+        return Response(entry['data'], status=entry['status'])
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(ResponseCacheMixin, self).list(request, *args, **kwargs))
+
@@ -0,0 +1,94 @@
+"""
+Role and club-scope lookups shared by the views and permissions.
+
+Users authenticated from a claims-carrying access token (see
+api.authentication) already have their group names and managed club IDs
+attached, so these helpers answer without touching the database. Users
+loaded from the database fall back to one query each, cached on the user
+instance for the rest of the request.
+
+The visible_* functions hold the scoping rules shared by the sync
+viewsets and the async read views.
+"""
+from django.db.models import Q
+
+from .models import Booking, Club, Court
+
+
+def get_roles(user):
+    """Return the set of group names for the user"""
+    roles = getattr(user, '_role_names', None)
+    if roles is None:
+        if user.is_authenticated:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+        else:
+            roles = frozenset()
+        user._role_names = roles
+    return roles
+
+
+def has_role(user, *names):
+    """True if the user belongs to any of the given groups"""
+    return not get_roles(user).isdisjoint(names)
+
+
+def is_admin(user):
+    """Superusers and members of the Admin group"""
+    return user.is_superuser or has_role(user, 'Admin')
+
+
+def get_managed_club_ids(user):
+    """Return the set of club IDs the user manages"""
+    club_ids = getattr(user, '_managed_club_ids', None)
+    if club_ids is None:
+        if user.is_authenticated:
+            club_ids = frozenset(user.managed_clubs.values_list('id', flat=True))
+        else:
+            club_ids = frozenset()
+        user._managed_club_ids = club_ids
+    return club_ids
+
+
+async def aload_roles(user):
+    """Prime the role and managed-club caches from async code"""
+    if not user.is_authenticated:
+        return
+    if getattr(user, '_role_names', None) is None:
+        user._role_names = frozenset([name async for name in user.groups.values_list('name', flat=True)])
+    if getattr(user, '_managed_club_ids', None) is None:
+        user._managed_club_ids = frozenset([pk async for pk in user.managed_clubs.values_list('id', flat=True)])
+
+
+def visible_clubs(user):
+    """Clubs the user may see"""
+    if is_admin(user):
+        # Admins and superusers can see all clubs including unapproved ones
+        return Club.objects.all()
+    # Managers can see their own clubs regardless of approval status
+    if has_role(user, "Manager"):
+        return Club.objects.filter(Q(is_approved=True) | Q(manager=user))
+    # Regular users can only see approved clubs
+    return Club.objects.filter(is_approved=True)
+
+
+def visible_courts(user):
+    """Courts the user may see"""
+    if is_admin(user):
+        return Court.objects.all()
+    if has_role(user, "Manager"):
+        # Managers can see courts from their clubs
+        return Court.objects.filter(Q(club__is_approved=True) | Q(club__manager=user))
+    # Regular users can only see courts from approved clubs
+    return Court.objects.filter(club__is_approved=True)
+
+
+def visible_bookings(user):
+    """Bookings the user may see"""
+    # For managers: show all bookings for their clubs
+    if has_role(user, "Manager"):
+        return Booking.objects.filter(court__club_id__in=get_managed_club_ids(user))
+    # For admins: show all bookings
+    if is_admin(user):
+        return Booking.objects.all()
+    # For regular users: show only their own bookings
+    return Booking.objects.filter(user=user)
@@ -0,0 +1,169 @@
+"""
+Daily per-court booking rollups (DailyCourtStats).
+
+A saved or deleted booking marks its (court, date) bucket, and the old
+one if the booking moved, for recomputation once the transaction
+commits. A bucket holds one court's bookings for one day, so each
+refresh is a single grouped query over a handful of rows. Distinct users
+can't be kept up to date by adding and subtracting, so the bucket is
+recomputed rather than adjusted.
+
+Bulk writes (bulk_create, queryset update/delete, raw SQL) skip the
+signals; `manage.py rebuild_court_stats` recomputes date ranges from the
+bookings table to backfill or repair the rollups. A rebuild locks the
+range's rows before counting, so refreshes of those buckets wait and then
+write their newer counts over it, and it upserts rather than replaces, so
+it never collides with a refresh creating a row. Buckets that had no row
+yet cannot be locked; the rebuild refreshes those with bookings changed
+while it ran once it commits.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Count, DateField, Q, Sum
+
+from .analytics import minute_of_day
+from .models import Booking, DailyCourtStats
+
+STAT_FIELDS = ['booked_minutes', 'booking_count', 'cancellations', 'unique_users']
+# Bookings saved this long before a rebuild started may commit while it runs
+REBUILD_OVERLAP = timedelta(minutes=1)
+
+
+def compute_stats(bookings):
+    """DailyCourtStats rows (unsaved) for the given bookings queryset"""
+    booked = Q(status__in=Booking.BOOKED_STATUSES)
+    rows = bookings.order_by().values('court_id', 'booking_date').annotate(
+        booked_minutes=Sum(minute_of_day('end_time') - minute_of_day('start_time'), filter=booked),
+        booking_count=Count('id', filter=booked),
+        cancellations=Count('id', filter=Q(status='canceled')),
+        unique_users=Count('user_id', distinct=True, filter=booked),
+    )
+    return [
+        DailyCourtStats(
+            court_id=row['court_id'],
+            date=row['booking_date'],
+            booked_minutes=row['booked_minutes'] or 0,
+            booking_count=row['booking_count'],
+            cancellations=row['cancellations'],
+            unique_users=row['unique_users'],
+        )
+        for row in rows
+    ]
+
+
+def refresh_buckets(buckets):
+    """Recompute the stats of the given (court_id, date) pairs"""
+    if not buckets:
+        return
+    match = Q()
+    for court_id, date in buckets:
+        match |= Q(court_id=court_id, booking_date=date)
+
+    with transaction.atomic():
+        # Counted inside the transaction, so a rebuild holding these rows makes it wait
+        stats = compute_stats(Booking.objects.filter(match))
+        if stats:
+            DailyCourtStats.objects.bulk_create(
+                stats, update_conflicts=True, unique_fields=['court', 'date'],
+                update_fields=STAT_FIELDS + ['updated_at'],
+            )
+        # Buckets whose last booking is gone
+        empty = set(buckets) - {(row.court_id, row.date) for row in stats}
+        if empty:
+            stale = Q()
+            for court_id, date in empty:
+                stale |= Q(court_id=court_id, date=date)
+            DailyCourtStats.objects.filter(stale).delete()
+
+
+def rebuild_range(start_date, end_date, club_id=None):
+    """Replace the stats between two dates (inclusive); returns the rows written"""
+    bookings = Booking.objects.filter(booking_date__range=(start_date, end_date))
+    existing = DailyCourtStats.objects.filter(date__range=(start_date, end_date))
+    if club_id is not None:
+        bookings = bookings.filter(court__club_id=club_id)
+        existing = existing.filter(court__club_id=club_id)
+
+    started = timezone.now()
+    with transaction.atomic():
+        # Lock before counting: refreshes of these buckets then land after this rebuild
+        locked = {(court_id, date): row_id for row_id, court_id, date in
+                  existing.select_for_update().values_list('id', 'court_id', 'date')}
+        stats = compute_stats(bookings)
+        DailyCourtStats.objects.bulk_create(
+            stats, batch_size=1000, update_conflicts=True, unique_fields=['court', 'date'],
+            update_fields=STAT_FIELDS + ['updated_at'],
+        )
+        # Rows whose bookings are all gone
+        for key in {(row.court_id, row.date) for row in stats}:
+            locked.pop(key, None)
+        stale = sorted(locked.values())
+        for start in range(0, len(stale), 1000):
+            DailyCourtStats.objects.filter(id__in=stale[start:start + 1000]).delete()
+
+    # Buckets created by bookings that committed after the count
+    changed = sorted(set(bookings.filter(updated_at__gte=started - REBUILD_OVERLAP).order_by().values_list(
+        'court_id', 'booking_date')))
+    for start in range(0, len(changed), 500):
+        refresh_buckets(changed[start:start + 500])
+    return len(stats)
+
+
+def _totals(rows):
+    return {
+        'booked_minutes': rows['booked_minutes'] or 0,
+        'booking_count': rows['booking_count'] or 0,
+        'cancellations': rows['cancellations'] or 0,
+    }
+
+
+TOTALS = {
+    'booked_minutes': Sum('booked_minutes'),
+    'booking_count': Sum('booking_count'),
+    'cancellations': Sum('cancellations'),
+}
+
+
+def club_totals(club_ids, start_date, end_date):
+    """Booked minutes, bookings and cancellations of the clubs between two dates"""
+    rows = DailyCourtStats.objects.filter(
+        court__club_id__in=club_ids, date__range=(start_date, end_date)
+    ).aggregate(**TOTALS)
+    return _totals(rows)
+
+
+def club_daily_stats(club, start_date, end_date):
+    """Totals for a club between two dates, overall, per day and per court"""
+    stats = DailyCourtStats.objects.filter(court__club=club, date__range=(start_date, end_date)).order_by()
+    return {
+        'start_date': str(start_date),
+        'end_date': str(end_date),
+        'totals': _totals(stats.aggregate(**TOTALS)),
+        'days': [
+            {'date': str(row['date']), **_totals(row)}
+            for row in stats.values('date').annotate(**TOTALS).order_by('date')
+        ],
+        'courts': [
+            {'court_id': row['court_id'], 'court_number': row['court__court_number'], **_totals(row)}
+            for row in stats.values('court_id', 'court__court_number').annotate(**TOTALS).order_by('court__court_number')
+        ],
+    }
+
+
+def date_chunks(start_date, end_date, days):
+    """Split a date range into consecutive (start, end) ranges of at most `days` days"""
+    while start_date <= end_date:
+        chunk_end = min(start_date + timedelta(days=days - 1), end_date)
+        yield start_date, chunk_end
+        start_date = chunk_end + timedelta(days=1)
+
+
+def refresh_on_commit(buckets):
+    """Refresh the buckets after the current transaction commits"""
+    # Dates assigned as strings haven't been converted yet
+    buckets = {(court_id, DateField().to_python(date)) for court_id, date in buckets}
+    # robust: a failed refresh is logged instead of failing the committed request;
+    # rebuild_court_stats repairs it
+    transaction.on_commit(lambda: refresh_buckets(buckets), robust=True)
@@ -0,0 +1,88 @@
+"""
+Ranked club search.
+
+On PostgreSQL a club matches when every search term is a prefix of a
+word in its name, city or state (full text over a weighted tsvector), or
+when the whole search is close to its name or city by trigram word
+similarity, which catches typos. Results are ordered by full-text rank
+plus name similarity. Both conditions are served by the GIN indexes of
+migration 0009. The similarity operator compares against the session's
+pg_trgm.word_similarity_threshold, which every new connection sets to
+CLUB_SEARCH_TYPO_THRESHOLD; a filter on the similarity value itself could
+not use the index. Other databases fall back to SearchFilter's matching:
+every term contained in one of the fields.
+"""
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity,
+)
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models import F, Q
+from django.dispatch import receiver
+from rest_framework.filters import SearchFilter
+
+# Must stay the same expression as the club_search_vector_idx index
+SEARCH_VECTOR = (
+    SearchVector('name', weight='A', config='simple')
+    + SearchVector('city', weight='B', config='simple')
+    + SearchVector('state', weight='C', config='simple')
+)
+AUTOCOMPLETE_LIMIT = 10
+TERM = re.compile(r'[^\W_]+')
+
+
+@receiver(connection_created)
+def set_typo_threshold(sender, connection, **kwargs):
+    """Give PostgreSQL sessions the word similarity threshold typo matches use"""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        # set_config rather than SET, which takes no parameters; it works before pg_trgm is loaded
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)",
+                       [str(getattr(settings, 'CLUB_SEARCH_TYPO_THRESHOLD', 0.5))])
+
+
+def search_terms(text):
+    return TERM.findall(text.lower())
+
+
+def prefix_query(terms):
+    """tsquery matching words that start with every term"""
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config='simple')
+
+
+def search_clubs(queryset, text, typos=True):
+    """The clubs of `queryset` matching `text`, best match first"""
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+
+    if connections[queryset.db].vendor != 'postgresql':
+        for term in terms:
+            queryset = queryset.filter(Q(name__icontains=term) | Q(city__icontains=term) | Q(state__icontains=term))
+        return queryset.order_by('name', 'pk')
+
+    query = prefix_query(terms)
+    phrase = ' '.join(terms)
+    matches = Q(search_vector=query)
+    if typos:
+        matches |= Q(name__trigram_word_similar=phrase) | Q(city__trigram_word_similar=phrase)
+    # alias() rather than annotate(): the vector and rank are only filtered and sorted on
+    return queryset.alias(search_vector=SEARCH_VECTOR).filter(matches).alias(
+        rank=SearchRank(F('search_vector'), query) + TrigramWordSimilarity(phrase, 'name'),
+    ).order_by('-rank', 'name', 'pk')
+
+
+def autocomplete_clubs(queryset, text, limit=AUTOCOMPLETE_LIMIT):
+    """Names of the best prefix matches, for search-as-you-type"""
+    return list(search_clubs(queryset, text, typos=False).values('id', 'name', 'city', 'state')[:limit])
+
+
+class ClubSearchFilter(SearchFilter):
+    """SearchFilter's ?search= parameter backed by search_clubs"""
+
+    def filter_queryset(self, request, queryset, view):
+        return search_clubs(queryset, request.query_params.get(self.search_param, ''))
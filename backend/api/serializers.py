@@ -1,6 +1,8 @@
-from rest_framework import serializers
+from rest_framework import exceptions, serializers, status
 from django.contrib.auth.models import User
+from .club_config import get_club_config
 from .models import Club, Court, Booking, CourtAvailabilityRestriction, ClubSpecialHours
+from .suggestions import minutes, suggest_slots
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False)
@@ -51,10 +53,16 @@ class CourtSerializer(serializers.ModelSerializer):
         fields = ['id', 'club', 'club_name', 'court_type', 'court_number', 'is_active']
     
     def get_club_name(self, obj):
-        return obj.club.name
+        # Lists load the club with the court; a single court takes the name from the cached club settings
+        if Court.club.is_cached(obj):
+            return obj.club.name
+        return get_club_config(obj.club_id).name
 
 class ClubSerializer(serializers.ModelSerializer):
     court_details = CourtSerializer(many=True, read_only=True)
+    # From the club's court counters
+    courts_summary = serializers.ReadOnlyField()
+    court_counts = serializers.ReadOnlyField()
     
     class Meta:
         model = Club
@@ -70,14 +78,17 @@ class ClubSerializer(serializers.ModelSerializer):
             "email",
             "website",
             "courts_summary",
+            "court_counts",
             "court_details",
             "opening_time",
             "closing_time",
             "created_at",
             "updated_at",
             "is_approved",
+            "latitude",
+            "longitude",
         ]
-        read_only_fields = ['manager', 'is_approved']
+        read_only_fields = ['manager', 'is_approved', 'latitude', 'longitude']
 
     def create(self, validated_data):
         request = self.context.get('request')
@@ -85,6 +96,20 @@ class ClubSerializer(serializers.ModelSerializer):
             validated_data['manager'] = request.user
         return super().create(validated_data)
 
+class BookingConflict(exceptions.APIException):
+    """
+    A 400 for a slot that is already booked, listing free alternatives. Not
+    a ValidationError, which run_validation would flatten into strings; so
+    validate with is_valid(raise_exception=True).
+    """
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_code = 'booking_conflict'
+
+    def __init__(self, message, suggestions):
+        super().__init__(message)
+        self.detail = {'non_field_errors': [self.detail], 'suggestions': suggestions}
+
+
 # In serializers.py
 class BookingSerializer(serializers.ModelSerializer):
     court_details = CourtSerializer(source='court', read_only=True)
@@ -112,8 +137,8 @@ class BookingSerializer(serializers.ModelSerializer):
         overlapping_bookings = Booking.objects.filter(
             court=court,
             booking_date=booking_date,
-            status__in=['pending', 'confirmed']
-        )
+            status__in=Booking.ACTIVE_STATUSES
+        ).order_by()
         
         # Exclude current booking in case of update
         if self.instance:
@@ -121,8 +146,11 @@ class BookingSerializer(serializers.ModelSerializer):
         
         for booking in overlapping_bookings:
             if (start_time < booking.end_time and end_time > booking.start_time):
-                raise serializers.ValidationError(
-                    f"This court is already booked from {booking.start_time} to {booking.end_time}"
+                # With the nearest free slots, so the client need not reload the whole grid
+                raise BookingConflict(
+                    f"This court is already booked from {booking.start_time} to {booking.end_time}",
+                    suggest_slots(court, booking_date, start_time, minutes(end_time) - minutes(start_time),
+                                  exclude_id=self.instance.id if self.instance else None),
                 )
         
         return data
@@ -141,6 +169,9 @@ class CourtAvailabilityRestrictionSerializer(serializers.ModelSerializer):
 # Update ClubSerializer to include new fields
 class ClubSerializer(serializers.ModelSerializer):
     court_details = CourtSerializer(many=True, read_only=True)
+    # From the club's court counters
+    courts_summary = serializers.ReadOnlyField()
+    court_counts = serializers.ReadOnlyField()
     
     class Meta:
         model = Club
@@ -156,6 +187,7 @@ class ClubSerializer(serializers.ModelSerializer):
             "email",
             "website",
             "courts_summary",
+            "court_counts",
             "court_details",
             "opening_time",
             "closing_time",
@@ -167,8 +199,10 @@ class ClubSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
             "is_approved",
+            "latitude",
+            "longitude",
         ]
-        read_only_fields = ['manager', 'is_approved']
+        read_only_fields = ['manager', 'is_approved', 'latitude', 'longitude']
 
     def create(self, validated_data):
         request = self.context.get('request')
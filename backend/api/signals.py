@@ -1,9 +1,17 @@
 from django.dispatch import receiver
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
-from django.db.models.signals import post_save, post_migrate
+from django.db.models.signals import post_save, post_migrate, pre_save, post_delete, m2m_changed
 from django.core.mail import send_mail
-from .models import Club
+from .club_config import bump_config_version_on_commit
+from .counters import adjust_booking_counts, adjust_court_counts
+from .dashboard import bump_generation_on_commit
+from .geo import locations_changed_on_commit, zip_location
+from .models import Booking, BookingCounts, Club, ClubSpecialHours, Court, CourtAvailabilityRestriction
+from .response_cache import invalidate_tags_on_commit
+from .rollups import refresh_on_commit
+from .throttling import club_id_for_court
+from .tokens import bump_token_version
 from django.contrib.auth.models import User
 
 # Setup groups and permissions after migrations
@@ -30,6 +38,12 @@ def setup_groups_and_permissions(sender, **kwargs):
     except ContentType.DoesNotExist:
         print("ContentType for Club does not exist yet. Skipping permissions setup.")
 
+# Place clubs at their ZIP code's centroid; an unknown ZIP code leaves them off the map
+@receiver(pre_save, sender=Club)
+def set_club_coordinates(sender, instance, **kwargs):
+    instance.latitude, instance.longitude = zip_location(instance.zip_code) or (None, None)
+
+
 # Notify superusers when a new Club is created
 @receiver(post_save, sender=Club)
 def notify_superusers(sender, instance, created, **kwargs):
@@ -43,4 +57,202 @@ def notify_superusers(sender, instance, created, **kwargs):
                 [superuser.email],
                 fail_silently=True,
             )
-        print("Notification email sent to superusers.")
\ No newline at end of file
+        print("Notification email sent to superusers.")
+
+
+# Invalidate token claims (roles, managed clubs) when they change
+@receiver(m2m_changed, sender=User.groups.through)
+def refresh_claims_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        bump_token_version(instance.pk)
+        return
+    # Changed from the group side: instance is a Group
+    if action == 'pre_clear':
+        pk_set = instance.user_set.values_list('pk', flat=True)
+    for user_id in pk_set or ():
+        bump_token_version(user_id)
+
+
+@receiver(post_save, sender=User)
+def refresh_claims_on_user_change(sender, instance, **kwargs):
+    bump_token_version(instance.pk)
+
+
+@receiver(pre_save, sender=Club)
+def remember_previous_manager(sender, instance, **kwargs):
+    instance._previous_manager_id = None
+    instance._previous_listing = None
+    if instance.pk:
+        previous = Club.objects.filter(pk=instance.pk).values_list(
+            'manager_id', 'is_approved', 'latitude', 'longitude'
+        ).first()
+        if previous:
+            instance._previous_manager_id = previous[0]
+            instance._previous_listing = previous[1:]
+
+
+@receiver(post_save, sender=Club)
+def refresh_claims_on_manager_change(sender, instance, created, **kwargs):
+    previous_manager_id = getattr(instance, '_previous_manager_id', None)
+    if not created and previous_manager_id == instance.manager_id:
+        return
+    for user_id in {previous_manager_id, instance.manager_id} - {None}:
+        bump_token_version(user_id)
+
+
+@receiver(post_delete, sender=Club)
+def refresh_claims_on_club_delete(sender, instance, **kwargs):
+    if instance.manager_id:
+        bump_token_version(instance.manager_id)
+
+
+# Keep the daily court rollups in step with booking changes
+@receiver(pre_save, sender=Booking)
+def remember_previous_bucket(sender, instance, **kwargs):
+    instance._previous_bucket = None
+    instance._previous_count = None
+    if instance.pk:
+        previous = Booking.objects.filter(pk=instance.pk).values_list(
+            'court_id', 'booking_date', 'user_id', 'status'
+        ).first()
+        if previous:
+            instance._previous_bucket = previous[:2]
+            # For the user's booking counts
+            instance._previous_count = previous[2:]
+
+
+@receiver(post_save, sender=Booking)
+def refresh_stats_on_booking_save(sender, instance, **kwargs):
+    buckets = {(instance.court_id, instance.booking_date)}
+    if getattr(instance, '_previous_bucket', None):
+        buckets.add(instance._previous_bucket)
+    refresh_on_commit(buckets)
+
+
+@receiver(post_delete, sender=Booking)
+def refresh_stats_on_booking_delete(sender, instance, **kwargs):
+    refresh_on_commit({(instance.court_id, instance.booking_date)})
+
+
+# Let the nearby search indexes pick up clubs that were approved, moved or removed
+@receiver(post_save, sender=Club)
+def refresh_locations_on_club_save(sender, instance, **kwargs):
+    listing = (instance.is_approved, instance.latitude, instance.longitude)
+    if getattr(instance, '_previous_listing', None) != listing:
+        locations_changed_on_commit()
+
+
+@receiver(post_delete, sender=Club)
+def refresh_locations_on_club_delete(sender, instance, **kwargs):
+    locations_changed_on_commit(deleted_id=instance.pk)
+
+
+# Start a new cache generation for clubs whose dashboard data changed
+@receiver(post_save, sender=Club)
+@receiver(post_delete, sender=Club)
+def bump_generation_on_club_change(sender, instance, **kwargs):
+    bump_generation_on_commit({instance.pk})
+
+
+@receiver(post_save, sender=Court)
+@receiver(post_delete, sender=Court)
+@receiver(post_save, sender=ClubSpecialHours)
+@receiver(post_delete, sender=ClubSpecialHours)
+def bump_generation_on_club_data_change(sender, instance, **kwargs):
+    bump_generation_on_commit({instance.club_id})
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(post_save, sender=CourtAvailabilityRestriction)
+@receiver(post_delete, sender=CourtAvailabilityRestriction)
+def bump_generation_on_court_data_change(sender, instance, **kwargs):
+    court_ids = {instance.court_id}
+    # A booking moved to a court of another club changes both clubs
+    previous_bucket = getattr(instance, '_previous_bucket', None)
+    if previous_bucket:
+        court_ids.add(previous_bucket[0])
+    bump_generation_on_commit({club_id_for_court(court_id) for court_id in court_ids})
+
+
+# Drop cached club configuration (hours, booking rules, active courts) everywhere
+@receiver(post_save, sender=Club)
+@receiver(post_delete, sender=Club)
+def bump_config_version_on_club_change(sender, instance, **kwargs):
+    bump_config_version_on_commit({instance.pk})
+
+
+@receiver(post_save, sender=Court)
+@receiver(post_delete, sender=Court)
+def bump_config_version_on_court_change(sender, instance, **kwargs):
+    bump_config_version_on_commit({instance.club_id})
+
+
+# Invalidate cached club, court and profile responses
+@receiver(post_save, sender=Club)
+@receiver(post_delete, sender=Club)
+def invalidate_club_responses(sender, instance, **kwargs):
+    tags = {'clubs', f'club:{instance.pk}'}
+    previous_listing = getattr(instance, '_previous_listing', None)
+    if previous_listing and (previous_listing[0] != instance.is_approved
+                             or instance._previous_manager_id != instance.manager_id):
+        # Who can see the club's courts changed too
+        tags.add('courts')
+    invalidate_tags_on_commit(tags)
+
+
+@receiver(post_save, sender=Court)
+@receiver(post_delete, sender=Court)
+def invalidate_court_responses(sender, instance, **kwargs):
+    invalidate_tags_on_commit({'courts', f'court:{instance.pk}', f'club:{instance.club_id}'})
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_responses(sender, instance, **kwargs):
+    invalidate_tags_on_commit({f'user:{instance.pk}'})
+
+
+# Keep the counter columns (api.counters) in step with court and booking changes
+@receiver(pre_save, sender=Court)
+def remember_previous_court_count(sender, instance, **kwargs):
+    instance._previous_count = None
+    if instance.pk:
+        instance._previous_count = Court.objects.filter(pk=instance.pk).values_list(
+            'club_id', 'court_type', 'is_active'
+        ).first()
+
+
+@receiver(post_save, sender=Court)
+def count_court_on_save(sender, instance, **kwargs):
+    current = (instance.club_id, instance.court_type, instance.is_active)
+    previous = getattr(instance, '_previous_count', None)
+    if previous != current:
+        adjust_court_counts({current: 1, **({previous: -1} if previous else {})})
+
+
+@receiver(post_delete, sender=Court)
+def count_court_on_delete(sender, instance, **kwargs):
+    adjust_court_counts({(instance.club_id, instance.court_type, instance.is_active): -1})
+
+
+@receiver(post_save, sender=User)
+def create_booking_counts(sender, instance, created, **kwargs):
+    # From the start, so each booking write is a single UPDATE
+    if created:
+        BookingCounts.objects.bulk_create([BookingCounts(user=instance)], ignore_conflicts=True)
+
+
+@receiver(post_save, sender=Booking)
+def count_booking_on_save(sender, instance, **kwargs):
+    current = (instance.user_id, instance.status)
+    previous = getattr(instance, '_previous_count', None)
+    if previous != current:
+        adjust_booking_counts({current: 1, **({previous: -1} if previous else {})})
+
+
+@receiver(post_delete, sender=Booking)
+def count_booking_on_delete(sender, instance, **kwargs):
+    adjust_booking_counts({(instance.user_id, instance.status): -1})
@@ -0,0 +1,247 @@
+"""
+Slow query log: rolling statistics for every SQL statement, by fingerprint.
+
+An execute wrapper on every connection times each statement and files it
+under its fingerprint, the SQL with literals, placeholders, IN lists and
+multi-row VALUES collapsed, so one query with different values is one
+entry. The first time a fingerprint runs for longer than SLOW_QUERY_MS its
+plan is captured: EXPLAIN on PostgreSQL and EXPLAIN QUERY PLAN elsewhere.
+Only SELECTs are explained. The statement is queued and explained when the
+request has finished, outside its transaction and after the response,
+so the request never waits for a plan. SLOW_QUERY_EXPLAIN_ANALYZE=True
+asks PostgreSQL for EXPLAIN (ANALYZE, BUFFERS) instead, which runs the
+statement a second time.
+
+Each worker publishes its entries to the cache at the end of a request,
+at most every SLOW_QUERY_FLUSH_SECONDS, and GET /api/slow-queries/ (staff
+only) and `manage.py slow_queries` merge them to list the top offenders.
+SLOW_QUERY_LOG=False leaves new connections unwrapped.
+"""
+import hashlib
+import os
+import re
+import socket
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db import DatabaseError, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+WORKERS_KEY = 'slow_queries:workers'
+ENTRIES_KEY = 'slow_queries:entries:{}'
+WORKER_TTL = 24 * 3600
+SAMPLE_WIDTH = 4000
+EXPLAIN_SAVEPOINT = 'slow_query_explain'
+# Statements waiting for their plan; past this, fingerprints wait for a later slow run
+MAX_PENDING_PLANS = 50
+ORDERS = {
+    'total': lambda entry: entry['total'],
+    'mean': lambda entry: entry['total'] / entry['count'],
+    'max': lambda entry: entry['max'],
+    'count': lambda entry: entry['count'],
+    'slow': lambda entry: entry['slow'],
+}
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%(?:\(\w+\))?s')
+IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+VALUES_ROWS = re.compile(r'(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+')
+WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """(key, normalised SQL) of a statement"""
+    normalised = STRING_LITERAL.sub('?', sql)
+    normalised = NUMBER_LITERAL.sub('?', normalised)
+    normalised = PLACEHOLDER.sub('?', normalised)
+    normalised = IN_LIST.sub('IN (...)', normalised)
+    normalised = VALUES_ROWS.sub(r'\1, ...', normalised)
+    normalised = WHITESPACE.sub(' ', normalised).strip()
+    return hashlib.md5(normalised.encode()).hexdigest()[:16], normalised
+
+
+def explain(connection, sql, params, analyze=False):
+    """The plan of a SELECT as text; with `analyze`, actual timings and buffers on PostgreSQL"""
+    postgres = connection.vendor == 'postgresql'
+    options = {'analyze': True, 'buffers': True} if analyze and postgres else {}
+    prefix = connection.ops.explain_query_prefix(**options)
+    # A bare backend cursor: the EXPLAIN is neither logged nor seen by the execute wrappers
+    connection.ensure_connection()
+    cursor = connection.create_cursor()
+    # A failed EXPLAIN must not abort the transaction the statement ran in
+    savepoint = postgres and connection.in_atomic_block
+    try:
+        if savepoint:
+            cursor.execute(f'SAVEPOINT {EXPLAIN_SAVEPOINT}')
+        try:
+            cursor.execute(f'{prefix} {sql}', params)
+            # The plan line is the last column (SQLite adds node IDs before it)
+            plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        except DatabaseError as exc:
+            if savepoint:
+                cursor.execute(f'ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}')
+            return f'EXPLAIN failed: {exc}'
+        if savepoint:
+            cursor.execute(f'RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}')
+        return plan
+    finally:
+        cursor.close()
+
+
+def is_select(sql):
+    return sql.lstrip()[:6].upper() == 'SELECT'
+
+
+def new_entry(key, normalised, alias):
+    return {
+        'key': key, 'fingerprint': normalised, 'alias': alias,
+        'count': 0, 'total': 0.0, 'max': 0.0, 'slow': 0, 'sample': '', 'explain': None,
+    }
+
+
+class QueryLog:
+    """Per-fingerprint statistics of this process's statements"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.flushed_at = time.monotonic()
+        self.pending = []
+
+    def record(self, connection, sql, params, many, seconds):
+        key, normalised = fingerprint(sql)
+        slow = seconds * 1000 >= getattr(settings, 'SLOW_QUERY_MS', 100)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if len(self.entries) >= getattr(settings, 'SLOW_QUERY_MAX_FINGERPRINTS', 2000):
+                    # Make room by forgetting the fingerprint that has cost the least
+                    del self.entries[min(self.entries.values(), key=ORDERS['total'])['key']]
+                entry = self.entries[key] = new_entry(key, normalised, connection.alias)
+            entry['count'] += 1
+            entry['total'] += seconds
+            if seconds > entry['max']:
+                entry['max'] = seconds
+                entry['sample'] = sql[:SAMPLE_WIDTH]
+            if slow:
+                entry['slow'] += 1
+            if (slow and entry['explain'] is None and not many and is_select(sql)
+                    and len(self.pending) < MAX_PENDING_PLANS):
+                # Claimed, so other threads don't queue it as well
+                entry['explain'] = ''
+                self.pending.append((entry, connection.alias, sql, tuple(params) if isinstance(params, list)
+                                     else params))
+
+    def capture_plans(self):
+        """Explain the queued statements, off the request that ran them"""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        analyze = getattr(settings, 'SLOW_QUERY_EXPLAIN_ANALYZE', False)
+        for entry, alias, sql, params in pending:
+            plan = explain(connections[alias], sql, params, analyze=analyze)
+            with self.lock:
+                entry['explain'] = plan
+
+    def snapshot(self):
+        with self.lock:
+            return {key: dict(entry) for key, entry in self.entries.items()}
+
+    def flush(self):
+        """Publish this worker's entries for the endpoint and the command"""
+        self.flushed_at = time.monotonic()
+        cache.set(ENTRIES_KEY.format(self.worker), self.snapshot(), timeout=WORKER_TTL)
+        workers = cache.get(WORKERS_KEY, [])
+        if self.worker not in workers:
+            cache.set(WORKERS_KEY, workers + [self.worker], timeout=None)
+
+    def flush_if_due(self):
+        if self.entries and time.monotonic() - self.flushed_at >= getattr(settings, 'SLOW_QUERY_FLUSH_SECONDS', 10):
+            self.flush()
+
+    def reset(self):
+        with self.lock:
+            self.entries = {}
+            self.pending = []
+
+
+query_log = QueryLog()
+
+
+def log_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection"""
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    query_log.record(context['connection'], sql, params, many, time.perf_counter() - started)
+    return result
+
+
+@receiver(connection_created)
+def install_query_log(sender, connection, **kwargs):
+    if getattr(settings, 'SLOW_QUERY_LOG', True) and log_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(log_query)
+
+
+@receiver(request_finished)
+def flush_query_log(sender, **kwargs):
+    query_log.capture_plans()
+    query_log.flush_if_due()
+
+
+def collect():
+    """Entries of all live workers merged by fingerprint, with this worker's latest"""
+    query_log.capture_plans()
+    query_log.flush()
+    workers = cache.get(WORKERS_KEY, [])
+    snapshots = cache.get_many([ENTRIES_KEY.format(worker) for worker in workers])
+    live = [worker for worker in workers if ENTRIES_KEY.format(worker) in snapshots]
+    if len(live) < len(workers):
+        cache.set(WORKERS_KEY, live, timeout=None)
+
+    merged = {}
+    for entries in snapshots.values():
+        for key, entry in entries.items():
+            total = merged.get(key)
+            if total is None:
+                merged[key] = dict(entry)
+                continue
+            total['count'] += entry['count']
+            total['total'] += entry['total']
+            total['slow'] += entry['slow']
+            if entry['max'] > total['max']:
+                total['max'], total['sample'] = entry['max'], entry['sample']
+            total['explain'] = total['explain'] or entry['explain']
+    return merged
+
+
+def top_offenders(order='total', limit=20):
+    entries = sorted(collect().values(), key=ORDERS[order], reverse=True)[:limit]
+    return [
+        {
+            'key': entry['key'],
+            'fingerprint': entry['fingerprint'],
+            'alias': entry['alias'],
+            'count': entry['count'],
+            'slow': entry['slow'],
+            'total_ms': round(entry['total'] * 1000, 3),
+            'mean_ms': round(entry['total'] / entry['count'] * 1000, 3),
+            'max_ms': round(entry['max'] * 1000, 3),
+            'slowest_sql': entry['sample'],
+            'explain': entry['explain'] or None,
+        }
+        for entry in entries
+    ]
+
+
+def clear():
+    """Forget the entries of every worker"""
+    query_log.reset()
+    workers = cache.get(WORKERS_KEY, [])
+    cache.delete_many([ENTRIES_KEY.format(worker) for worker in workers] + [WORKERS_KEY])
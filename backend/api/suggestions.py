@@ -0,0 +1,155 @@
+"""
+Alternative slots for a booking request whose slot is taken.
+
+suggest_slots() looks for the nearest free slots on the club's active
+courts of the requested court's type, around the requested time on the
+requested day and on the BOOKING_SUGGESTION_DAYS days either side. The
+active bookings of those courts and days and the courts' weekly
+restrictions go into an IntervalIndex of merged unavailable ranges per
+court and day, so each candidate is checked with a bisect instead of a
+scan of the day's bookings. The club's special hours for the days replace
+its regular hours, and days it is closed get no candidates.
+
+Candidates start on the club's booking_increment grid within that day's
+opening hours and last the requested duration, kept within
+min_booking_duration and max_booking_duration and rounded up to the
+increment. They lie between now (plus the same-day cutoff) and
+max_advance_booking_days ahead, and are ranked by days away, then minutes
+away from the requested start, then the requested court before the
+others. Bookings, restrictions and special hours take one query each.
+"""
+import heapq
+from bisect import bisect_right
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .club_config import get_club_config
+from .models import Booking, ClubSpecialHours, CourtAvailabilityRestriction
+
+
+def minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def as_time(total):
+    return time(total // 60, total % 60)
+
+
+def slot_duration(club, duration=None):
+    """The duration to suggest, in minutes, for a requested one (default: the club's minimum)"""
+    increment = club.booking_increment or 60
+    duration = min(max(duration or 0, club.min_booking_duration), club.max_booking_duration)
+    rounded = -(-duration // increment) * increment
+    # Unless whole increments would go past the maximum
+    return rounded if rounded <= club.max_booking_duration else duration
+
+
+class IntervalIndex:
+    """Merged unavailable ranges, in minutes of the day, per (court_id, day)"""
+
+    def __init__(self, rows):
+        """rows of (court_id, day, start_time, end_time), in any order"""
+        self.starts = {}
+        self.ends = {}
+        for court_id, day, start, end in sorted(
+                (court_id, day, minutes(start_time), minutes(end_time))
+                for court_id, day, start_time, end_time in rows):
+            starts = self.starts.setdefault((court_id, day), [])
+            ends = self.ends.setdefault((court_id, day), [])
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+
+    def is_free(self, court_id, day, start, end):
+        ends = self.ends.get((court_id, day))
+        if not ends:
+            return True
+        # Ranges are disjoint and sorted, so only the first one ending after `start` can overlap
+        position = bisect_right(ends, start)
+        return position == len(ends) or self.starts[(court_id, day)][position] >= end
+
+
+def suggest_slots(court, booking_date, start_time, duration=None, exclude_id=None, limit=None):
+    """
+    The nearest free slots for a booking of `court` at `start_time` on
+    `booking_date`, best first, as booking data (court, booking_date,
+    start_time, end_time) plus the court's number and type. exclude_id
+    leaves out a booking being moved.
+    """
+    club = get_club_config(court.club_id)
+    if club is None:
+        return []
+    courts = club.active_courts(court.court_type)
+    if not courts:
+        return []
+    limit = limit or getattr(settings, 'BOOKING_SUGGESTION_LIMIT', 5)
+    spread = timedelta(days=getattr(settings, 'BOOKING_SUGGESTION_DAYS', 3))
+
+    now = timezone.localtime()
+    first_day = max(booking_date - spread, now.date())
+    last_day = min(booking_date + spread, now.date() + timedelta(days=club.max_advance_booking_days))
+    if first_day > last_day:
+        return []
+
+    court_ids = [candidate.id for candidate in courts]
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+    bookings = Booking.objects.filter(
+        court_id__in=court_ids,
+        booking_date__range=(first_day, last_day),
+        status__in=Booking.ACTIVE_STATUSES,
+    )
+    if exclude_id is not None:
+        bookings = bookings.exclude(pk=exclude_id)
+    unavailable = list(bookings.order_by().values_list('court_id', 'booking_date', 'start_time', 'end_time'))
+    # Recurring restrictions block their hours on each day of their weekday
+    restrictions = CourtAvailabilityRestriction.objects.filter(
+        court_id__in=court_ids, weekday__in={day.weekday() for day in days},
+    ).order_by().values_list('court_id', 'weekday', 'start_time', 'end_time')
+    for court_id, weekday, restricted_from, restricted_to in restrictions:
+        unavailable.extend((court_id, day, restricted_from, restricted_to)
+                           for day in days if day.weekday() == weekday)
+    index = IntervalIndex(unavailable)
+
+    # Special hours replace the regular hours for their date; a missing time keeps the regular one
+    hours = dict.fromkeys(days, (minutes(club.opening_time), minutes(club.closing_time)))
+    for day, is_closed, opening_time, closing_time in ClubSpecialHours.objects.filter(
+            club_id=club.id, date__range=(first_day, last_day)).values_list(
+            'date', 'is_closed', 'opening_time', 'closing_time'):
+        regular_opening, regular_closing = hours[day]
+        hours[day] = None if is_closed else (minutes(opening_time) if opening_time else regular_opening,
+                                             minutes(closing_time) if closing_time else regular_closing)
+
+    length = slot_duration(club, duration)
+    increment = club.booking_increment or 60
+    requested = minutes(start_time)
+    earliest_today = minutes(now) + club.same_day_booking_cutoff * 60
+
+    def candidates():
+        for day in days:
+            if hours[day] is None:
+                continue
+            opening, closing = hours[day]
+            earliest = earliest_today if day == now.date() else opening
+            for start in range(opening, closing - length + 1, increment):
+                if start < earliest:
+                    continue
+                for candidate in courts:
+                    if index.is_free(candidate.id, day, start, start + length):
+                        rank = (abs((day - booking_date).days), abs(start - requested), candidate.id != court.id)
+                        yield rank + (day, start, candidate.court_number), candidate, day, start
+
+    return [
+        {
+            'court': candidate.id,
+            'court_number': candidate.court_number,
+            'court_type': candidate.court_type,
+            'booking_date': day.isoformat(),
+            'start_time': as_time(start).strftime('%H:%M:%S'),
+            'end_time': as_time(start + length).strftime('%H:%M:%S'),
+        }
+        for _, candidate, day, start in heapq.nsmallest(limit, candidates(), key=lambda item: item[0])
+    ]
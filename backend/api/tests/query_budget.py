@@ -0,0 +1,129 @@
+"""
+Query-count budgets for API tests.
+
+QueryBudgetMixin.assertQueryBudget fails when a block runs more queries
+than allowed, and assertQueriesFlat when the count changes as a fixture
+grows (an N+1). Either failure lists the queries grouped by the line of
+application code that issued them, which points straight at the
+serializer field or view that needs a select_related/prefetch_related.
+"""
+import os
+import traceback
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+import django.db
+from django.conf import settings
+from django.db import connections
+
+from api import metrics, slow_queries, tracing
+
+APP_DIR = os.path.join(str(settings.BASE_DIR), 'api') + os.sep
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+ORM_DIR = os.path.dirname(os.path.abspath(django.db.__file__)) + os.sep
+# Execute wrappers sit between every query and the code that issued it
+WRAPPER_FILES = {os.path.abspath(module.__file__) for module in (metrics, slow_queries, tracing)}
+SQL_SAMPLES = 3
+SQL_WIDTH = 300
+
+
+def describe(frame):
+    path = frame.filename
+    if 'site-packages' + os.sep in path:
+        path = path.split('site-packages' + os.sep, 1)[1]
+    else:
+        path = os.path.relpath(path, settings.BASE_DIR)
+    return f'{path}:{frame.lineno} in {frame.name}'
+
+
+def call_site(stack):
+    """
+    The innermost frame of application code outside the tests (else of the
+    tests) and, when it is a different frame, the one that entered the ORM,
+    e.g. the serializer field whose attribute access ran a lazy query
+    """
+    frames = [frame for frame in reversed(stack)
+              if frame.filename not in WRAPPER_FILES and frame.filename != __file__]
+    entry = next((frame for frame in frames if not frame.filename.startswith(ORM_DIR)), None)
+    app = next((frame for frame in frames
+                if frame.filename.startswith(APP_DIR) and not frame.filename.startswith(TESTS_DIR)), None)
+    app = app or next((frame for frame in frames if frame.filename.startswith(TESTS_DIR)), None)
+    if app is None or entry is None:
+        return describe(app or entry) if app or entry else '<unknown>'
+    return describe(app) if app is entry else f'{describe(app)} -> {describe(entry)}'
+
+
+class QueryLog:
+    """Execute wrapper recording each query with its call site"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((call_site(traceback.extract_stack()[:-1]), context['connection'].alias, sql))
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def by_call_site(self):
+        """{call site: [SQL, ...]}, busiest first"""
+        sites = defaultdict(list)
+        for site, alias, sql in self.queries:
+            sites[site].append(sql if alias == 'default' else f'[{alias}] {sql}')
+        return dict(sorted(sites.items(), key=lambda item: -len(item[1])))
+
+    def report(self, baseline=None):
+        """Queries per call site, with how many more there are than in `baseline`"""
+        previous = {site: len(sqls) for site, sqls in baseline.by_call_site().items()} if baseline else {}
+        lines = []
+        for site, sqls in self.by_call_site().items():
+            growth = f' (+{len(sqls) - previous.get(site, 0)})' if baseline and len(sqls) > previous.get(site, 0) else ''
+            lines.append(f'{len(sqls)}x{growth} {site}')
+            for sql in list(dict.fromkeys(sqls))[:SQL_SAMPLES]:
+                lines.append(f'    {sql[:SQL_WIDTH]}{"..." if len(sql) > SQL_WIDTH else ""}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def capture_queries():
+    """Record the queries of every database connection in a QueryLog"""
+    log = QueryLog()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(log))
+        yield log
+
+
+class QueryBudgetMixin:
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        """Fail if the block runs more than `budget` queries"""
+        with capture_queries() as log:
+            yield log
+        if len(log) > budget:
+            self.fail(f'{len(log)} queries, over the budget of {budget}:\n{log.report()}')
+
+    def assertQueriesFlat(self, grow, run, sizes=(1, 10, 100), budget=None):
+        """
+        Call grow(size) to bring the fixture to each size, then run() under
+        capture; fail if the query count changes with the size or exceeds
+        `budget`. Returns the count.
+        """
+        logs = []
+        for size in sizes:
+            grow(size)
+            with capture_queries() as log:
+                run()
+            logs.append((size, log))
+
+        (first_size, first), (last_size, last) = logs[0], logs[-1]
+        for size, log in logs[1:]:
+            if len(log) != len(first):
+                self.fail(
+                    f'{len(first)} queries with {first_size} objects but {len(log)} with {size}:\n'
+                    f'{log.report(baseline=first)}'
+                )
+        if budget is not None and len(last) > budget:
+            self.fail(f'{len(last)} queries with {last_size} objects, over the budget of {budget}:\n{last.report()}')
+        return len(last)
@@ -0,0 +1,128 @@
+from datetime import date, time, timedelta
+
+from django.contrib.auth.models import User, Group
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.analytics import court_utilization
+from api.models import Club, ClubSpecialHours, Court, Booking
+from api.tokens import ClaimsRefreshToken
+
+# A Monday
+WEEK_START = date(2025, 3, 3)
+
+
+class CourtUtilizationTest(APITestCase):
+    def setUp(self):
+        self.player = User.objects.create_user(username='player', password='securepassword123')
+        manager_group = Group.objects.get_or_create(name='Manager')[0]
+        self.manager = User.objects.create_user(username='manager', password='securepassword123')
+        self.manager.groups.add(manager_group)
+        self.other_manager = User.objects.create_user(username='other', password='securepassword123')
+        self.other_manager.groups.add(manager_group)
+
+        self.club = Club.objects.create(
+            name='Utilization Club', address='1 Main St', city='Springfield', state='IL',
+            zip_code='62701', email='club@example.com', manager=self.manager, is_approved=True,
+            opening_time=time(8, 0), closing_time=time(20, 0),
+        )
+        self.court = Court.objects.create(club=self.club, court_type='hard', court_number=1)
+        self.idle_court = Court.objects.create(club=self.club, court_type='clay', court_number=2)
+
+    def book(self, day, start, end, court=None, status='confirmed'):
+        # bulk_create skips Booking.clean so bookings can run past special hours
+        Booking.objects.bulk_create([Booking(
+            court=court or self.court, user=self.player, booking_date=WEEK_START + timedelta(days=day),
+            start_time=start, end_time=end, status=status,
+        )])
+
+    def url(self, start=WEEK_START, end=WEEK_START + timedelta(days=6)):
+        return f'/api/clubs/{self.club.id}/utilization/?start_date={start}&end_date={end}'
+
+    def login(self, user):
+        token = ClaimsRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_heatmap_honors_regular_and_special_hours(self):
+        self.book(0, time(10, 0), time(11, 30))
+        self.book(0, time(14, 0), time(15, 0), status='canceled')
+        # Closed on Tuesday, open 10-12 on Wednesday
+        ClubSpecialHours.objects.create(club=self.club, date=WEEK_START + timedelta(days=1), is_closed=True)
+        ClubSpecialHours.objects.create(
+            club=self.club, date=WEEK_START + timedelta(days=2),
+            opening_time=time(10, 0), closing_time=time(12, 0),
+        )
+        # Only the hour before the special closing time counts
+        self.book(2, time(11, 0), time(13, 0))
+
+        data = court_utilization(self.club, WEEK_START, WEEK_START + timedelta(days=6))
+        court, idle = data['courts']
+        monday, tuesday, wednesday = court['heatmap'][:3]
+
+        self.assertEqual(monday[10], 1.0)
+        self.assertEqual(monday[11], 0.5)
+        self.assertEqual(monday[14], 0.0)
+        self.assertIsNone(monday[7])
+        self.assertEqual(tuesday, [None] * 24)
+        self.assertEqual(wednesday[11], 1.0)
+        self.assertIsNone(wednesday[12])
+
+        # 5 regular days of 12 hours plus 2 hours on Wednesday
+        self.assertEqual(court['open_minutes'], (5 * 12 + 2) * 60)
+        self.assertEqual(court['booked_minutes'], 150)
+        self.assertEqual(idle['booked_minutes'], 0)
+        self.assertEqual(data['booked_minutes'], 150)
+        self.assertEqual(data['open_minutes'], 2 * court['open_minutes'])
+        self.assertEqual(data['heatmap'][0][10], 0.5)
+
+    def test_manager_only(self):
+        self.book(0, time(10, 0), time(11, 0))
+
+        self.login(self.manager)
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['booked_minutes'], 60)
+
+        for user in (self.player, self.other_manager):
+            self.login(user)
+            self.assertEqual(self.client.get(self.url()).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_dates(self):
+        self.login(self.manager)
+        response = self.client.get(f'/api/clubs/{self.club.id}/utilization/?start_date=yesterday')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url(start=WEEK_START, end=WEEK_START - timedelta(days=1)))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(UTILIZATION_MAX_DAYS=7)
+    def test_range_is_capped(self):
+        self.login(self.manager)
+        self.assertEqual(self.client.get(self.url(start=WEEK_START, end=WEEK_START + timedelta(days=6))).status_code,
+                         status.HTTP_200_OK)
+        response = self.client.get(self.url(start=WEEK_START, end=WEEK_START + timedelta(days=7)))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('7 days', response.data['error'])
+
+    def test_year_at_thirty_courts(self):
+        courts = Court.objects.bulk_create([
+            Court(club=self.club, court_type='hard', court_number=number) for number in range(3, 31)
+        ]) + [self.court, self.idle_court]
+        start = date(2024, 1, 1)
+        slots = [(time(hour, 0), time(hour + 1, 30)) for hour in range(8, 19, 2)]
+        Booking.objects.bulk_create([
+            Booking(court=court, user=self.player, booking_date=start + timedelta(days=day),
+                    start_time=slot_start, end_time=slot_end, status='confirmed')
+            for day in range(366)
+            for court in courts
+            for slot_start, slot_end in slots
+        ], batch_size=5000)
+
+        with CaptureQueriesContext(connection) as queries:
+            data = court_utilization(self.club, start, date(2024, 12, 31))
+
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(data['booked_minutes'], 366 * 30 * len(slots) * 90)
+        self.assertEqual(data['utilization'], 0.75)
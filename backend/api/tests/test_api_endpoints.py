@@ -5,7 +5,12 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from api.models import Club, Court, Booking
 from datetime import datetime, date, time, timedelta
 from django.utils import timezone
+from django.core.cache import cache
+from django.test import override_settings
 import json
+import threading
+
+from api.throttling import cache_store
 
 class BookingAPITest(APITestCase):
     def setUp(self):
@@ -492,4 +497,126 @@ class ClubAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
         # Response should contain at least one booking
-        self.assertTrue(len(response.data) >= 1) 
\ No newline at end of file
+        self.assertTrue(len(response.data) >= 1) 
+
+@override_settings(TOKEN_BUCKET_THROTTLES={
+    'availability': {'user': '2/min', 'club': '3/min'},
+    'booking': {'user': '1/min'},
+})
+class ThrottleAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.club = Club.objects.create(
+            name='Test Tennis Club',
+            address='123 Test St',
+            city='Testville',
+            state='TS',
+            zip_code='12345',
+            is_approved=True
+        )
+        self.court = Court.objects.create(club=self.club, court_type='hard', court_number=1)
+        self.users = [
+            User.objects.create_user(username=f'user{i}', password='securepassword123')
+            for i in range(2)
+        ]
+        self.staff = User.objects.create_user(username='staff', password='securepassword123', is_staff=True)
+
+    def authenticate(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_user_bucket_limits_available_slots(self):
+        self.authenticate(self.users[0])
+        url = f'/api/bookings/available_slots/?club_id={self.club.id}'
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    def test_club_bucket_is_shared_between_users(self):
+        url = f'/api/bookings/available_slots/?club_id={self.club.id}'
+        self.authenticate(self.users[0])
+        self.client.get(url)
+        self.client.get(url)
+        self.authenticate(self.users[1])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        # Fourth request for the club is rejected even though this user has tokens left
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_throttled_user_does_not_drain_the_club_bucket(self):
+        day = (timezone.now() + timedelta(days=1)).date().isoformat()
+        for url in (f'/api/bookings/suggest/?court={self.court.id}&date={day}&start_time=10:00',
+                    f'/api/bookings/available_slots/?club_id={self.club.id}'):
+            cache.clear()
+            self.authenticate(self.users[0])
+            statuses = [self.client.get(url).status_code for _ in range(6)]
+            self.assertEqual(statuses, [status.HTTP_200_OK] * 2 + [status.HTTP_429_TOO_MANY_REQUESTS] * 4)
+            # Only the two allowed requests took a token from the club
+            self.authenticate(self.users[1])
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK, url)
+
+    def test_throttled_booking_is_rejected_before_database_work(self):
+        self.authenticate(self.users[0])
+        data = {
+            'court': self.court.id,
+            'booking_date': (timezone.now() + timedelta(days=1)).date().isoformat(),
+            'start_time': '10:00:00',
+            'end_time': '11:00:00'
+        }
+        self.assertEqual(self.client.post('/api/bookings/', data, format='json').status_code, status.HTTP_201_CREATED)
+
+        data['start_time'], data['end_time'] = '12:00:00', '13:00:00'
+        with self.assertNumQueries(1):  # the user lookup from a plain token
+            response = self.client.post('/api/bookings/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_throttle_counters(self):
+        self.authenticate(self.users[0])
+        url = f'/api/bookings/available_slots/?club_id={self.club.id}'
+        for _ in range(3):
+            self.client.get(url)
+
+        self.authenticate(self.staff)
+        response = self.client.get('/api/throttles/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['availability']['user'], {'allowed': 2, 'throttled': 1})
+
+    def test_query_parameter_does_not_pick_the_booking_bucket(self):
+        data = {
+            'court': self.court.id,
+            'booking_date': (timezone.now() + timedelta(days=1)).date().isoformat(),
+            'start_time': '10:00:00',
+            'end_time': '11:00:00'
+        }
+        with override_settings(TOKEN_BUCKET_THROTTLES={'booking': {'club': '1/min'}}):
+            self.authenticate(self.users[0])
+            self.client.post('/api/bookings/', data, format='json')
+            data['start_time'], data['end_time'] = '12:00:00', '13:00:00'
+            self.authenticate(self.users[1])
+            response = self.client.post(f'/api/bookings/?club_id={self.club.id + 100}', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_unknown_club_gets_no_bucket(self):
+        self.authenticate(self.users[0])
+        response = self.client.get(f'/api/bookings/available_slots/?club_id={self.club.id + 100}')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIsNone(cache.get(f'throttle:availability:club:{self.club.id + 100}'))
+
+    def test_concurrent_consumes_share_one_bucket(self):
+        barrier = threading.Barrier(16)
+        results = []
+
+        def consume_one():
+            barrier.wait()
+            results.append(cache_store.consume('throttle:test:club:1', 5, 5 / 3600)[0])
+
+        threads = [threading.Thread(target=consume_one) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 5)
@@ -0,0 +1,197 @@
+from datetime import time, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APIRequestFactory
+
+from api.models import Club, Court, Booking
+from api.tokens import ClaimsRefreshToken
+from api.views.booking_views import BookingViewSet
+from api.views.club_views import ClubViewSet, CourtViewSet
+
+
+class AsyncReadViewsTest(APITestCase):
+    """The async views must answer exactly like the viewset actions they replace"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+        self.user = User.objects.create_user(username='player', password='securepassword123')
+        self.manager = User.objects.create_user(username='manager', password='securepassword123')
+        self.manager.groups.add(Group.objects.get_or_create(name='Manager')[0])
+
+        self.club = Club.objects.create(
+            name='Approved Club', address='1 Main St', city='Springfield', state='IL',
+            zip_code='62701', email='approved@example.com', is_approved=True,
+        )
+        self.hidden_club = Club.objects.create(
+            name='Pending Club', address='2 Main St', city='Shelbyville', state='IL',
+            zip_code='62565', email='pending@example.com', manager=self.manager,
+        )
+        self.court = Court.objects.create(club=self.club, court_type='hard', court_number=1)
+        Court.objects.create(club=self.club, court_type='clay', court_number=2)
+        self.hidden_court = Court.objects.create(club=self.hidden_club, court_type='hard', court_number=1)
+
+        self.date = timezone.now().date() + timedelta(days=1)
+        Booking.objects.create(
+            court=self.court, user=self.user, booking_date=self.date,
+            start_time=time(10, 0), end_time=time(11, 0), status='confirmed',
+        )
+        Booking.objects.create(
+            court=self.hidden_court, user=self.manager, booking_date=self.date,
+            start_time=time(9, 0), end_time=time(10, 0),
+        )
+
+    def token(self, user):
+        return str(ClaimsRefreshToken.for_user(user).access_token)
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token(user)}')
+
+    def sync_response(self, view, url, user, **kwargs):
+        request = self.factory.get(url, HTTP_AUTHORIZATION=f'Bearer {self.token(user)}')
+        return view(request, **kwargs)
+
+    def test_available_slots_matches_sync_action(self):
+        url = f'/api/bookings/available_slots/?club_id={self.club.id}&date={self.date}'
+        self.login(self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        expected = self.sync_response(BookingViewSet.as_view({'get': 'available_slots'}), url, self.user)
+        self.assertEqual(response.json(), expected.data)
+
+    def test_available_slots_errors(self):
+        self.login(self.user)
+        response = self.client.get('/api/bookings/available_slots/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(f'/api/bookings/available_slots/?club_id={self.club.id}&date=tomorrow')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get('/api/bookings/available_slots/?club_id=999999')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_requires_authentication(self):
+        for url in ('/api/clubs/', '/api/bookings/calendar/', f'/api/courts/{self.court.id}/availability/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertIn('WWW-Authenticate', response)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        response = self.client.get('/api/clubs/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_calendar_is_scoped_like_sync_action(self):
+        start, end = self.date - timedelta(days=1), self.date + timedelta(days=1)
+        url = f'/api/bookings/calendar/?start_date={start}&end_date={end}'
+        view = BookingViewSet.as_view({'get': 'calendar'})
+        for user in (self.user, self.manager):
+            self.login(user)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json(), self.sync_response(view, url, user).data)
+
+        # The manager only sees the bookings of the club they manage
+        self.login(self.manager)
+        courts = {booking['court'] for booking in self.client.get(url).json()}
+        self.assertEqual(courts, {self.hidden_court.id})
+
+    def test_court_availability_respects_club_visibility(self):
+        start, end = self.date, self.date + timedelta(days=1)
+        url = f'/api/courts/{self.hidden_court.id}/availability/?start_date={start}&end_date={end}'
+
+        self.login(self.user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.login(self.manager)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = self.sync_response(
+            CourtViewSet.as_view({'get': 'availability'}), url, self.manager, pk=self.hidden_court.id
+        )
+        self.assertEqual(response.json(), expected.data)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_club_list_visibility_and_search(self):
+        self.login(self.user)
+        response = self.client.get('/api/clubs/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([club['name'] for club in response.data['results']], ['Approved Club'])
+        self.assertEqual(len(response.data['results'][0]['court_details']), 2)
+
+        self.login(self.manager)
+        names = {club['name'] for club in self.client.get('/api/clubs/').data['results']}
+        self.assertEqual(names, {'Approved Club', 'Pending Club'})
+
+        response = self.client.get('/api/clubs/?search=shelby')
+        self.assertEqual([club['name'] for club in response.data['results']], ['Pending Club'])
+
+        response = self.client.get('/api/clubs/?is_approved=true')
+        self.assertEqual([club['name'] for club in response.data['results']], ['Approved Club'])
+
+    # The paginator reads PAGE_SIZE when it is defined, as ClubViewSet's does
+    @mock.patch.object(ClubViewSet.pagination_class, 'page_size', 1)
+    def test_club_list_pagination(self):
+        self.login(self.manager)
+        first = self.client.get('/api/clubs/').json()
+        self.assertEqual(first['count'], 2)
+        self.assertIsNone(first['previous'])
+        self.assertTrue(first['next'].endswith('/api/clubs/?page=2'))
+
+        second = self.client.get('/api/clubs/?page=2').json()
+        self.assertIsNone(second['next'])
+        self.assertTrue(second['previous'].endswith('/api/clubs/'))
+        self.assertNotEqual(first['results'][0]['id'], second['results'][0]['id'])
+
+        self.assertEqual(self.client.get('/api/clubs/?page=last').json()['results'], second['results'])
+        for page in ('3', '0', 'two'):
+            response = self.client.get(f'/api/clubs/?page={page}')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+            self.assertEqual(response.json(), {'detail': 'Invalid page.'})
+
+    def test_options_and_other_methods_go_to_the_viewsets(self):
+        self.login(self.manager)
+        response = self.client.options('/api/bookings/calendar/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['name'], 'Calendar')
+        response = self.client.options('/api/clubs/')
+        self.assertEqual(response.json()['name'], 'Club List')
+        self.assertIn('POST', response.json()['actions'])
+
+        response = self.client.post('/api/bookings/available_slots/')
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(response['Allow'], 'GET, HEAD, OPTIONS')
+        response = self.client.delete(f'/api/courts/{self.court.id}/availability/')
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+        response = self.client.head(f'/api/courts/{self.court.id}/availability/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_club_create_still_goes_to_viewset(self):
+        self.login(self.manager)
+        response = self.client.post('/api/clubs/', {
+            'name': 'New Club', 'address': '3 Main St', 'city': 'Capital City', 'state': 'IL',
+            'zip_code': '62702', 'email': 'new@example.com',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(
+        TOKEN_BUCKET_STORE='local',
+        TOKEN_BUCKET_THROTTLES={'availability': {'user': '2/min'}},
+    )
+    def test_availability_is_throttled(self):
+        from api.throttling import local_store
+        local_store.clear()
+        self.login(self.user)
+        url = f'/api/bookings/available_slots/?club_id={self.club.id}'
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
@@ -1,6 +1,17 @@
-from django.test import TestCase, Client
-from django.contrib.auth.models import User
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User, Group
+from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+from api.authentication import ClaimsJWTAuthentication
+from api.blacklist import BloomFilter, blacklist_filter
+from api.tokens import TOKEN_VERSION_KEY, ClaimsRefreshToken
+from api.models import Club, Court
+from api.roles import get_managed_club_ids, has_role
 
 # Create your tests here.
 class UserRegistrationTest(TestCase):
@@ -91,4 +102,171 @@ class LogoutTest(TestCase):
     def test_logout(self):
         self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {self.access_token}'
         response = self.client.post('/api/logout/')
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(response.status_code, 200)
+
+# The test process is the only worker, so its local memory cache counts as shared
+@override_settings(SHARED_CACHE=True)
+class TokenClaimsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.manager_group, _ = Group.objects.get_or_create(name='Manager')
+        self.user = User.objects.create_user(
+            username='manager',
+            email='manager@example.com',
+            password='securepassword123'
+        )
+        self.user.groups.add(self.manager_group)
+        self.club = Club.objects.create(
+            name='Test Tennis Club',
+            address='123 Test St',
+            city='Testville',
+            state='TS',
+            zip_code='12345',
+            manager=self.user
+        )
+
+    def obtain_tokens(self):
+        response = self.client.post('/api/token/', {
+            'username': 'manager',
+            'password': 'securepassword123'
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_access_token_contains_claims(self):
+        access = AccessToken(self.obtain_tokens()['access'])
+        self.assertEqual(access['roles'], ['Manager'])
+        self.assertEqual(access['clubs'], [self.club.id])
+        self.assertEqual(access['username'], 'manager')
+
+    def test_current_token_authenticates_without_queries(self):
+        access = AccessToken(self.obtain_tokens()['access'])
+        with self.assertNumQueries(0):
+            user = ClaimsJWTAuthentication().get_user(access)
+            self.assertTrue(has_role(user, 'Manager'))
+            self.assertEqual(get_managed_club_ids(user), {self.club.id})
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_group_change_invalidates_claims(self):
+        tokens = self.obtain_tokens()
+        self.user.groups.remove(self.manager_group)
+
+        # Stale access tokens fall back to the database user
+        user = ClaimsJWTAuthentication().get_user(AccessToken(tokens['access']))
+        self.assertFalse(getattr(user, '_from_token_claims', False))
+        self.assertFalse(has_role(user, 'Manager'))
+
+        # Refreshing issues tokens with the new claims
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.json()['access'])['roles'], [])
+
+    def test_claims_are_not_trusted_without_a_shared_cache(self):
+        tokens = self.obtain_tokens()
+        # Demoted on another worker, whose version bump this worker's cache never sees
+        key = TOKEN_VERSION_KEY.format(self.user.pk)
+        version = cache.get(key)
+        self.user.groups.remove(self.manager_group)
+        cache.set(key, version, timeout=None)
+
+        with override_settings(SHARED_CACHE=False):
+            user = ClaimsJWTAuthentication().get_user(AccessToken(tokens['access']))
+            self.assertFalse(getattr(user, '_from_token_claims', False))
+            self.assertFalse(has_role(user, 'Manager'))
+            response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(AccessToken(response.json()['access'])['roles'], [])
+
+    def test_manager_change_invalidates_claims(self):
+        tokens = self.obtain_tokens()
+        self.club.manager = None
+        self.club.save()
+
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.json()['access'])['clubs'], [])
+
+
+    def test_booking_shows_the_user_row(self):
+        court = Court.objects.create(club=self.club, court_type='hard', court_number=1)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {self.obtain_tokens()['access']}"
+        response = self.client.post('/api/bookings/', {
+            'court': court.id,
+            'booking_date': (timezone.localdate() + timedelta(days=1)).isoformat(),
+            'start_time': '10:00',
+            'end_time': '11:00',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['user_details']['email'], 'manager@example.com')
+
+
+class TokenBlacklistTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        blacklist_filter.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='testuser@example.com',
+            password='securepassword123'
+        )
+        self.refresh = ClaimsRefreshToken.for_user(self.user)
+
+    def test_rotated_refresh_token_is_rejected(self):
+        response = self.client.post('/api/token/refresh/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/api/token/refresh/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_blacklists_refresh_token(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {self.refresh.access_token}'
+        response = self.client.post('/api/logout/', {'refresh_token': str(self.refresh)})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/api/token/refresh/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        keys = [f'jti-{i}' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f'other-{i}' in bloom for i in range(1000))
+        self.assertLess(false_positives, 50)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_catch_up_reads_rows_committed_out_of_id_order(self):
+        def blacklist(jti, row_id):
+            token = OutstandingToken.objects.create(jti=jti, token='', expires_at=timezone.now() + timedelta(days=1))
+            BlacklistedToken.objects.create(id=row_id, token=token)
+            blacklist_filter.bump_generation()
+
+        blacklist_filter.rebuild()
+        blacklist('later', 20)
+        self.assertTrue(blacklist_filter.might_contain('later'))
+        # A logout that took id 10 commits after the one with id 20 was read
+        blacklist('earlier', 10)
+        self.assertTrue(blacklist_filter.might_contain('earlier'))
+
+    def test_checks_the_table_without_a_shared_cache(self):
+        with override_settings(SHARED_CACHE=True):
+            blacklist_filter.rebuild()
+        # Blacklisted by another worker, whose generation bump this worker's cache never sees
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=self.refresh['jti']))
+        response = self.client.post('/api/token/refresh/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_purge_expired_tokens(self):
+        now = timezone.now()
+        for i in range(5):
+            token = OutstandingToken.objects.create(
+                jti=f'expired-{i}', token='', expires_at=now - timedelta(hours=1)
+            )
+            BlacklistedToken.objects.create(token=token)
+
+        call_command('purge_expired_tokens', chunk_size=2, restart=True, stdout=StringIO())
+
+        self.assertFalse(OutstandingToken.objects.filter(jti__startswith='expired-').exists())
+        self.assertFalse(BlacklistedToken.objects.exists())
+        # The token issued in setUp has not expired yet
+        self.assertTrue(OutstandingToken.objects.filter(jti=self.refresh['jti']).exists())
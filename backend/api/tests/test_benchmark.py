@@ -0,0 +1,68 @@
+import json
+import random
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from api.management.commands.seed_benchmark_data import place_bookings
+from api.metrics import registry
+from api.models import Booking, Club
+
+
+class BenchmarkCommandsTest(TestCase):
+    def seed(self):
+        call_command('seed_benchmark_data', clubs=4, courts_per_club=3, users=10, bookings=400, days=6,
+                     stdout=StringIO())
+
+    def test_bookings_never_overlap(self):
+        rng = random.Random(1)
+        for count in range(10):
+            placed = place_bookings(rng, count, 24)
+            self.assertLessEqual(len(placed), count)
+            end = 0
+            for start, length in placed:
+                self.assertGreaterEqual(start, end)
+                end = start + length
+            self.assertLessEqual(end, 24)
+
+    def test_seed_replaces_earlier_data(self):
+        self.seed()
+        clubs, bookings = Club.objects.count(), Booking.objects.count()
+        self.assertEqual(clubs, 4)
+        self.assertGreater(bookings, 300)
+        self.assertTrue(all(club.courts_summary for club in Club.objects.all()))
+
+        self.seed()
+        self.assertEqual(Club.objects.count(), clubs)
+        self.assertEqual(Booking.objects.count(), bookings)
+
+    def test_runner_reports_every_scenario(self):
+        self.seed()
+        with tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+            call_command('benchmark_api', requests=5, warmup=1, output=output.name, stdout=StringIO())
+            results = json.load(output)
+
+        self.assertEqual(results['dataset']['clubs'], 4)
+        self.assertEqual(set(results['scenarios']), {
+            'club_list', 'club_search', 'available_slots', 'calendar', 'club_calendar', 'club_utilization',
+            'booking_create',
+        })
+        for name, scenario in results['scenarios'].items():
+            self.assertEqual(scenario['requests'], 5)
+            self.assertLessEqual(scenario['p50_ms'], scenario['p99_ms'])
+            self.assertTrue(all(200 <= int(code) < 300 for code in scenario['statuses']), name)
+            self.assertGreater(scenario['queries']['max'], 0)
+        # The bookings the run made are removed again
+        self.assertFalse(Booking.objects.filter(notes='benchmark-api-run').exists())
+
+    def test_runner_without_metrics(self):
+        self.seed()
+        registry.reset()
+        with tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+            call_command('benchmark_api', requests=2, warmup=0, scenario=['club_list'], no_metrics=True,
+                         output=output.name, stdout=StringIO())
+            results = json.load(output)
+        self.assertFalse(results['metrics'])
+        self.assertEqual(registry.snapshot()['http_request_duration_seconds'], {})
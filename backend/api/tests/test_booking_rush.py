@@ -0,0 +1,45 @@
+import json
+from datetime import time
+from io import StringIO
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
+
+from api.management.commands.simulate_booking_rush import overlapping
+from api.models import Booking, Club
+
+
+def booking(court_id, start, end):
+    return SimpleNamespace(court_id=court_id, start_time=time(*start), end_time=time(*end))
+
+
+class OverlapTest(SimpleTestCase):
+    def test_overlaps_on_the_same_court_are_found(self):
+        long = booking(1, (17, 0), (19, 0))
+        inside = booking(1, (17, 30), (18, 0))
+        after_inside = booking(1, (18, 0), (19, 0))
+        adjacent = booking(1, (19, 0), (20, 0))
+        other_court = booking(2, (17, 0), (18, 0))
+        pairs = overlapping([adjacent, after_inside, other_court, inside, long])
+        self.assertEqual(pairs, [(long, inside), (long, after_inside)])
+
+
+@override_settings(TOKEN_BUCKET_THROTTLES={})
+class BookingRushTest(LiveServerTestCase):
+    def test_rush_against_a_live_server(self):
+        output = StringIO()
+        call_command('simulate_booking_rush', url=self.live_server_url, users=12, courts=2, think_ms=0,
+                     stdout=output, stderr=StringIO())
+        report = json.loads(output.getvalue())
+
+        self.assertEqual(report['users'], 12)
+        self.assertEqual(sum(report['outcomes'].values()), 12)
+        self.assertGreater(report['outcomes']['booked'], 0)
+        self.assertEqual(report['bookings_in_database'], report['outcomes']['booked'])
+        self.assertIsNotNone(report['latency_ms']['create']['p99'])
+        # Everything the simulation created is removed again
+        self.assertFalse(Club.objects.filter(name='Booking rush club').exists())
+        self.assertFalse(User.objects.filter(username__startswith='rush-user-').exists())
+        self.assertFalse(Booking.objects.exists())
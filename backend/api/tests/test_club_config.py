@@ -0,0 +1,102 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.club_config import LOOKUPS, club_configs, get_club_config
+from api.metrics import registry
+from api.models import Club, Court
+from api.tests.test_metrics import sample
+from api.tokens import ClaimsRefreshToken
+
+
+# The test process is the only worker, so its local memory cache counts as shared
+@override_settings(SHARED_CACHE=True)
+class ClubConfigCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        club_configs.clear()
+        registry.reset()
+        self.club = Club.objects.create(name='Home Club', address='1 Main St', city='Springfield', state='IL',
+                                        zip_code='62701', is_approved=True)
+        self.hard = Court.objects.create(club=self.club, court_type='hard', court_number=1)
+        Court.objects.create(club=self.club, court_type='clay', court_number=2)
+        Court.objects.create(club=self.club, court_type='hard', court_number=3, is_active=False)
+
+    def lookups(self, result):
+        series = registry.snapshot()[LOOKUPS.name].get((result,))
+        return series[0] if series else 0
+
+    def test_read_through(self):
+        with self.assertNumQueries(1):
+            config = get_club_config(self.club.id)
+        with self.assertNumQueries(0):
+            self.assertIs(get_club_config(str(self.club.id)), config)
+        self.assertEqual(config.name, 'Home Club')
+        self.assertEqual([court.court_number for court in config.active_courts()], [1, 2])
+        self.assertEqual([court.court_number for court in config.active_courts('hard')], [1])
+        self.assertEqual(config.active_courts('grass'), ())
+        self.assertEqual((self.lookups('miss'), self.lookups('hit')), (1, 1))
+
+    def test_unknown_club(self):
+        self.assertIsNone(get_club_config(self.club.id + 100))
+        self.assertIsNone(get_club_config('abc'))
+
+        user = User.objects.create_user(username='player', password='securepassword123')
+        token = ClaimsRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get('/api/bookings/available_slots/', {'club_id': self.club.id + 100})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_club_and_court_writes_invalidate(self):
+        get_club_config(self.club.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.club.name = 'Renamed Club'
+            self.club.save()
+        self.assertEqual(get_club_config(self.club.id).name, 'Renamed Club')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hard.is_active = False
+            self.hard.save()
+        self.assertEqual([court.court_number for court in get_club_config(self.club.id).active_courts()], [2])
+
+    def test_version_change_from_another_worker(self):
+        get_club_config(self.club.id)
+        # Another worker committed a change: only the shared version moves
+        Club.objects.filter(pk=self.club.id).update(name='Elsewhere')
+        cache.set(f'club_config:version:{self.club.id}', 'other')
+        self.assertEqual(get_club_config(self.club.id).name, 'Elsewhere')
+        self.assertEqual(self.lookups('invalidated'), 1)
+
+    @override_settings(CLUB_CONFIG_TTL=0)
+    def test_ttl(self):
+        get_club_config(self.club.id)
+        with self.assertNumQueries(1):
+            get_club_config(self.club.id)
+        self.assertEqual(self.lookups('expired'), 1)
+
+    @override_settings(CLUB_CONFIG_CACHE_SIZE=1)
+    def test_size_bound(self):
+        other = Club.objects.create(name='Other Club', address='2 Main St', city='Springfield', state='IL',
+                                    zip_code='62701', is_approved=True)
+        get_club_config(self.club.id)
+        get_club_config(other.id)
+        self.assertEqual(list(club_configs.entries), [other.id])
+
+    def test_hit_rate_exposed(self):
+        get_club_config(self.club.id)
+        get_club_config(self.club.id)
+        text = self.client.get('/metrics/').content.decode()
+        self.assertEqual(sample(text, 'club_config_cache_lookups_total', result='hit'), 1)
+        self.assertEqual(sample(text, 'club_config_cache_lookups_total', result='miss'), 1)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_bypassed_without_a_shared_cache(self):
+        get_club_config(self.club.id)
+        # Another worker's change: its version bump never reaches this worker's cache
+        Club.objects.filter(pk=self.club.id).update(name='Elsewhere')
+        with self.assertNumQueries(1):
+            self.assertEqual(get_club_config(self.club.id).name, 'Elsewhere')
+        self.assertEqual(list(club_configs.entries), [])
+        self.assertEqual(self.lookups('uncached'), 2)
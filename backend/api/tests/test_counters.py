@@ -0,0 +1,114 @@
+from datetime import date, time, timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.counters import booking_counts
+from api.models import Booking, BookingCounts, Club, Court
+from api.tokens import ClaimsRefreshToken
+
+
+# The test process is the only worker, so its local memory cache counts as shared
+@override_settings(SHARED_CACHE=True)
+class CounterColumnsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.player = User.objects.create_user(username='player', password='securepassword123')
+        self.club = Club.objects.create(name='Home Club', address='1 Main St', city='Springfield', state='IL',
+                                        zip_code='62701', is_approved=True)
+        self.court = Court.objects.create(club=self.club, court_type='hard', court_number=1)
+        token = ClaimsRefreshToken.for_user(self.player).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def counts(self):
+        self.club.refresh_from_db()
+        return self.club.court_counts
+
+    def book(self, days, booking_status='confirmed'):
+        return Booking.objects.create(user=self.player, court=self.court, booking_date=date.today() + timedelta(days),
+                                      start_time=time(10), end_time=time(11), status=booking_status)
+
+    def test_court_writes_move_the_counts(self):
+        clay = Court.objects.create(club=self.club, court_type='clay', court_number=2)
+        self.assertEqual(self.counts()['clay'], {'active': 1, 'inactive': 0})
+
+        clay.is_active = False
+        clay.save()
+        self.assertEqual(self.counts()['clay'], {'active': 0, 'inactive': 1})
+
+        clay.court_type = 'grass'
+        clay.save()
+        self.assertEqual(self.counts()['clay'], {'active': 0, 'inactive': 0})
+        self.assertEqual(self.counts()['grass'], {'active': 0, 'inactive': 1})
+
+        clay.delete()
+        self.assertEqual(self.counts(), {'hard': {'active': 1, 'inactive': 0}, 'clay': {'active': 0, 'inactive': 0},
+                                         'grass': {'active': 0, 'inactive': 0}})
+        self.assertEqual(self.club.courts_summary, [{'type': 'hard', 'count': 1}])
+
+    def test_court_moved_between_clubs(self):
+        other = Club.objects.create(name='Other Club', address='2 Main St', city='Springfield', state='IL',
+                                    zip_code='62701', is_approved=True)
+        self.court.club = other
+        self.court.save()
+        other.refresh_from_db()
+        self.assertEqual(self.counts()['hard']['active'], 0)
+        self.assertEqual(other.court_counts['hard']['active'], 1)
+
+    def test_booking_writes_move_the_counts(self):
+        booking = self.book(1)
+        self.book(2, 'pending')
+        self.assertEqual(booking_counts(self.player.pk),
+                         {'pending': 1, 'confirmed': 1, 'canceled': 0, 'completed': 0})
+
+        booking.status = 'canceled'
+        booking.save()
+        self.assertEqual(booking_counts(self.player.pk)['confirmed'], 0)
+        self.assertEqual(booking_counts(self.player.pk)['canceled'], 1)
+
+        booking.delete()
+        self.assertEqual(booking_counts(self.player.pk)['canceled'], 0)
+
+    def test_profile_reads_the_counters(self):
+        self.book(1)
+        self.book(2, 'pending')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/users/profile/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['bookings_count'], 2)
+        self.assertEqual(response.data['bookings_by_status']['pending'], 1)
+
+    def test_club_list_reads_the_counters(self):
+        Court.objects.create(club=self.club, court_type='clay', court_number=2, is_active=False)
+        response = self.client.get('/api/clubs/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        club = response.data['results'][0]
+        self.assertEqual(club['courts_summary'], [{'type': 'hard', 'count': 1}, {'type': 'clay', 'count': 1}])
+        self.assertEqual(club['court_counts']['clay'], {'active': 0, 'inactive': 1})
+
+    def test_repair_after_bulk_writes(self):
+        Court.objects.bulk_create([Court(club=self.club, court_type='clay', court_number=number)
+                                   for number in (2, 3)])
+        Booking.objects.bulk_create([Booking(user=self.player, court=self.court,
+                                             booking_date=date.today() + timedelta(1), start_time=time(10),
+                                             end_time=time(11), status='confirmed')])
+        BookingCounts.objects.filter(user=self.player).delete()
+        self.assertEqual(self.counts()['clay']['active'], 0)
+
+        out = StringIO()
+        call_command('repair_counters', stdout=out)
+        self.assertIn('court counters of 1 clubs', out.getvalue())
+        self.assertIn('booking counts of 1 users', out.getvalue())
+        self.assertEqual(self.counts()['clay']['active'], 2)
+        self.assertEqual(booking_counts(self.player.pk)['confirmed'], 1)
+
+        # Nothing left to repair
+        out = StringIO()
+        call_command('repair_counters', '--courts-only', stdout=out)
+        self.assertIn('court counters of 0 clubs', out.getvalue())
+        self.assertNotIn('booking counts', out.getvalue())
@@ -0,0 +1,143 @@
+from datetime import date, time, timedelta
+
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.models import Club, ClubSpecialHours, Court, CourtAvailabilityRestriction, Booking
+from api.tokens import ClaimsRefreshToken
+
+# A Wednesday; its week runs from Monday 2025-03-03 to Sunday 2025-03-09
+DAY = date(2025, 3, 5)
+
+
+# The test process is the only worker, so its local memory cache counts as shared
+@override_settings(SHARED_CACHE=True)
+class ManagerDashboardTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        manager_group = Group.objects.get_or_create(name='Manager')[0]
+        self.manager = User.objects.create_user(username='manager', password='securepassword123')
+        self.manager.groups.add(manager_group)
+        self.other_manager = User.objects.create_user(username='other', password='securepassword123')
+        self.other_manager.groups.add(manager_group)
+        self.player = User.objects.create_user(username='player', first_name='Pat', password='securepassword123')
+
+        self.club = self.make_club('Home Club', self.manager)
+        self.second_club = self.make_club('Second Club', self.manager)
+        self.foreign_club = self.make_club('Foreign Club', self.other_manager)
+        self.court = Court.objects.create(club=self.club, court_type='hard', court_number=1)
+
+    def make_club(self, name, manager):
+        return Club.objects.create(
+            name=name, address='1 Main St', city='Springfield', state='IL', zip_code='62701',
+            email='club@example.com', manager=manager, is_approved=True,
+        )
+
+    def login(self, user):
+        token = ClaimsRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def dashboard(self, **params):
+        params.setdefault('date', str(DAY))
+        return self.client.get('/api/clubs/dashboard/', params)
+
+    def add_data(self, club, courts, bookings_per_court):
+        created = Court.objects.bulk_create([
+            Court(club=club, court_type='clay', court_number=100 + number) for number in range(courts)
+        ])
+        Booking.objects.bulk_create([
+            Booking(court=court, user=self.player, booking_date=DAY, start_time=time(8 + slot, 0),
+                    end_time=time(9 + slot, 0), status='confirmed')
+            for court in created
+            for slot in range(bookings_per_court)
+        ])
+        CourtAvailabilityRestriction.objects.bulk_create([
+            CourtAvailabilityRestriction(court=court, weekday=0, start_time=time(8, 0), end_time=time(9, 0))
+            for court in created
+        ])
+        ClubSpecialHours.objects.create(club=club, date=DAY, opening_time=time(9, 0), closing_time=time(17, 0))
+
+    def test_payload(self):
+        Booking.objects.create(court=self.court, user=self.player, booking_date=DAY,
+                               start_time=time(10, 0), end_time=time(11, 0))
+        Booking.objects.create(court=self.court, user=self.player, booking_date=DAY + timedelta(days=1),
+                               start_time=time(10, 0), end_time=time(11, 0))
+        # Outside the week
+        Booking.objects.create(court=self.court, user=self.player, booking_date=DAY + timedelta(days=7),
+                               start_time=time(10, 0), end_time=time(11, 0))
+        ClubSpecialHours.objects.create(club=self.club, date=DAY, is_closed=True)
+        CourtAvailabilityRestriction.objects.create(court=self.court, weekday=0, start_time=time(8, 0),
+                                                    end_time=time(9, 0))
+        self.login(self.manager)
+
+        response = self.dashboard()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(data['week'], {'start': '2025-03-03', 'end': '2025-03-09'})
+        self.assertEqual([club['name'] for club in data['clubs']], ['Home Club', 'Second Club'])
+        self.assertEqual([court['id'] for court in data['courts']], [self.court.id])
+        self.assertEqual(len(data['bookings']), 2)
+        self.assertEqual(data['bookings'][0]['court'], self.court.id)
+        self.assertEqual(data['users'], [{'id': self.player.id, 'username': 'player', 'first_name': 'Pat',
+                                          'last_name': '', 'email': ''}])
+        self.assertEqual(len(data['special_hours']), 1)
+        self.assertEqual(len(data['restrictions']), 1)
+
+        response = self.dashboard(club=self.second_club.id)
+        self.assertEqual([club['name'] for club in response.data['clubs']], ['Second Club'])
+        self.assertEqual(response.data['bookings'], [])
+
+    def test_query_count_does_not_grow_with_data(self):
+        self.login(self.manager)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.dashboard().status_code, status.HTTP_200_OK)
+
+        # bulk_create skips the signals, so drop the cached parts by hand
+        # (which also forgets the token version, hence the new token)
+        cache.clear()
+        self.login(self.manager)
+        self.add_data(self.club, courts=10, bookings_per_court=5)
+        self.add_data(self.second_club, courts=20, bookings_per_court=8)
+        with CaptureQueriesContext(connection) as large:
+            response = self.dashboard()
+        self.assertEqual(len(response.data['bookings']), 210)
+        self.assertEqual(len(large), len(small))
+        self.assertLessEqual(len(large), 5)
+
+    def test_cached_until_club_data_changes(self):
+        self.login(self.manager)
+        self.dashboard()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.dashboard().data['bookings'], [])
+        self.assertEqual(len(queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(court=self.court, user=self.player, booking_date=DAY,
+                                   start_time=time(10, 0), end_time=time(11, 0))
+        self.assertEqual(len(self.dashboard().data['bookings']), 1)
+
+        # Other clubs keep their cached part
+        with self.captureOnCommitCallbacks(execute=True):
+            Court.objects.create(club=self.foreign_club, court_type='hard', court_number=1)
+        with CaptureQueriesContext(connection) as queries:
+            self.dashboard()
+        self.assertEqual(len(queries), 0)
+
+    def test_permissions(self):
+        self.login(self.player)
+        self.assertEqual(self.dashboard().status_code, status.HTTP_403_FORBIDDEN)
+
+        self.login(self.manager)
+        self.assertEqual(self.dashboard(club=self.foreign_club.id).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.dashboard(date='tomorrow').status_code, status.HTTP_400_BAD_REQUEST)
+
+        admin = User.objects.create_superuser(username='admin', password='securepassword123')
+        self.login(admin)
+        response = self.dashboard(club=self.foreign_club.id)
+        self.assertEqual([club['name'] for club in response.data['clubs']], ['Foreign Club'])
+        self.assertEqual(self.dashboard(club=999999).status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,127 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+
+from api.db_router import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, set_request_user
+from api.models import Booking, Club
+
+REPLICA = 'replica_test'
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def route(self, request, user_id=None, status=200):
+        """Run a request through the middleware and return where a read would go"""
+        seen = {}
+
+        def view(request):
+            if user_id is not None:
+                set_request_user(user_id)
+            seen['read'] = self.router.db_for_read(Booking)
+            seen['write'] = self.router.db_for_write(Booking)
+            return HttpResponse(status=status)
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen['read'], seen['write'], response
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Booking), 'default')
+
+    def test_safe_requests_read_from_replicas(self):
+        read, write, _ = self.route(self.factory.get('/api/clubs/'))
+        self.assertIn(read, ['replica1', 'replica2'])
+        self.assertEqual(write, 'default')
+
+    def test_write_requests_use_primary(self):
+        read, write, response = self.route(self.factory.post('/api/bookings/'), status=201)
+        self.assertEqual(read, 'default')
+        self.assertEqual(write, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_refused_and_failed_writes_do_not_pin(self):
+        for status in (400, 403, 409, 500):
+            _, _, response = self.route(self.factory.post('/api/bookings/'), user_id=7, status=status)
+            self.assertNotIn(PIN_COOKIE, response.cookies)
+        read, _, _ = self.route(self.factory.get('/api/bookings/'), user_id=7)
+        self.assertIn(read, ['replica1', 'replica2'])
+
+    def test_user_is_pinned_to_primary_after_write(self):
+        self.route(self.factory.post('/api/bookings/'), user_id=7, status=201)
+
+        read, _, _ = self.route(self.factory.get('/api/bookings/'), user_id=7)
+        self.assertEqual(read, 'default')
+
+        # Other users still read from the replicas
+        read, _, _ = self.route(self.factory.get('/api/bookings/'), user_id=8)
+        self.assertIn(read, ['replica1', 'replica2'])
+
+    def test_pin_cookie_forces_primary(self):
+        request = self.factory.get('/api/clubs/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        read, _, _ = self.route(request)
+        self.assertEqual(read, 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_primary(self):
+        read, _, _ = self.route(self.factory.get('/api/clubs/'))
+        self.assertEqual(read, 'default')
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaDatabaseTest(TestCase):
+    """Reads routed to a second SQLite database holding different rows"""
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        database = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory.name, 'replica.sqlite3')}
+        connections.settings[REPLICA] = connections.configure_settings({'default': database, REPLICA: database})[REPLICA]
+        # Before the class transaction: SQLite can't change its schema inside one
+        with connections[REPLICA].schema_editor() as editor:
+            editor.create_model(User)
+            editor.create_model(Club)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        club = {'address': '1 Main St', 'city': 'Springfield', 'state': 'IL', 'zip_code': '62701'}
+        # bulk_create skips the signals, which write to the primary
+        Club.objects.bulk_create([Club(name='Primary Club', **club)])
+        Club.objects.using(REPLICA).bulk_create([Club(name='Replica Club', **club)])
+
+    def names(self, request):
+        def view(request):
+            return HttpResponse(','.join(Club.objects.values_list('name', flat=True)))
+
+        return ReplicaRoutingMiddleware(view)(request).content.decode()
+
+    def write(self, status):
+        return ReplicaRoutingMiddleware(lambda request: HttpResponse(status=status))(self.factory.post('/api/clubs/'))
+
+    def test_reads_follow_the_pin(self):
+        self.assertEqual(self.names(self.factory.get('/api/clubs/')), 'Replica Club')
+        self.assertNotIn(PIN_COOKIE, self.write(400).cookies)
+
+        request = self.factory.get('/api/clubs/')
+        request.COOKIES[PIN_COOKIE] = self.write(201).cookies[PIN_COOKIE].value
+        self.assertEqual(self.names(request), 'Primary Club')
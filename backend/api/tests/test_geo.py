@@ -0,0 +1,172 @@
+import shutil
+import tempfile
+from datetime import date, time
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.geo import DELETED_KEY, ClubLocationIndex, chord_to_miles, club_locations, unit_vectors, zip_centroids
+from api.models import Booking, Club, ClubSpecialHours, Court
+from api.tokens import ClaimsRefreshToken
+
+# Test fixture in the Census gazetteer layout (approximate centroids)
+GAZETTEER = (
+    'GEOID\tALAND\tAWATER\tALAND_SQMI\tAWATER_SQMI\tINTPTLAT\tINTPTLONG                   \n'
+    '62701\t0\t0\t0\t0\t39.800\t-89.650\n'
+    '62702\t0\t0\t0\t0\t39.830\t-89.640\n'
+    '61602\t0\t0\t0\t0\t40.690\t-89.590\n'
+    '60601\t0\t0\t0\t0\t41.886\t-87.620\n'
+    '10001\t0\t0\t0\t0\t40.750\t-73.997\n'
+)
+
+
+class NearbyClubsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        gazetteer = self.directory / 'gazetteer.txt'
+        gazetteer.write_text(GAZETTEER)
+        settings_override = override_settings(ZIP_CENTROIDS_PATH=self.directory / 'zip_centroids.csv.gz')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(zip_centroids.cache_clear)
+        call_command('build_zip_centroids', str(gazetteer), stdout=StringIO())
+        club_locations.reset()
+
+        self.player = User.objects.create_user(username='player', password='securepassword123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(self.player).access_token}')
+        self.springfield = self.make_club('Springfield Club', '62701')
+        self.north_springfield = self.make_club('North Springfield Club', '62702')
+        self.peoria = self.make_club('Peoria Club', '61602')
+        self.chicago = self.make_club('Chicago Club', '60601')
+        self.pending = self.make_club('Pending Club', '62701', approved=False)
+
+    def make_club(self, name, zip_code, approved=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            club = Club.objects.create(name=name, address='1 Main St', city='City', state='IL', zip_code=zip_code,
+                                       is_approved=approved)
+        Court.objects.create(club=club, court_type='hard', court_number=1)
+        return club
+
+    def nearby(self, **params):
+        return self.client.get('/api/clubs/nearby/', params)
+
+    def names(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [club['name'] for club in response.data['results']]
+
+    def test_coordinates_are_set_on_save(self):
+        self.assertEqual((self.springfield.latitude, self.springfield.longitude), (39.8, -89.65))
+        Club.objects.filter(pk=self.peoria.pk).update(latitude=None, longitude=None)
+        out = StringIO()
+        call_command('geocode_clubs', stdout=out)
+        self.assertIn('Geocoded 1 clubs', out.getvalue())
+        self.assertEqual(Club.objects.get(pk=self.peoria.pk).latitude, 40.69)
+
+        Club.objects.filter(pk=self.peoria.pk).update(zip_code='99999')
+        call_command('geocode_clubs', '--all', stdout=StringIO())
+        self.assertIsNone(Club.objects.get(pk=self.peoria.pk).latitude)
+
+    def test_nearest_first_within_radius(self):
+        response = self.nearby(zip='62701', radius=100)
+        self.assertEqual(self.names(response), ['Springfield Club', 'North Springfield Club', 'Peoria Club'])
+        self.assertEqual(response.data['results'][0]['distance_miles'], 0.0)
+        # Peoria is roughly 62 miles from Springfield
+        self.assertAlmostEqual(response.data['results'][2]['distance_miles'], 62, delta=3)
+
+        self.assertEqual(self.names(self.nearby(latitude=41.9, longitude=-87.6, radius=10)), ['Chicago Club'])
+        self.assertEqual(self.names(self.nearby(zip='10001')), [])
+        self.assertEqual(self.names(self.nearby(zip='62701', radius=250, limit=2)),
+                         ['Springfield Club', 'North Springfield Club'])
+        self.assertEqual(self.nearby(zip='99999').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.nearby(latitude=95, longitude=0).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.nearby(zip='62701', radius=1000).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_approval_and_moves_reach_the_index(self):
+        self.assertEqual(self.names(self.nearby(zip='62701', radius=5)), ['Springfield Club', 'North Springfield Club'])
+
+        self.pending.is_approved = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pending.save()
+        self.springfield.zip_code = '10001'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.springfield.save()
+        self.assertEqual(self.names(self.nearby(zip='62701', radius=5)), ['Pending Club', 'North Springfield Club'])
+        self.assertEqual(self.names(self.nearby(zip='10001', radius=5)), ['Springfield Club'])
+
+        # A ZIP code without a centroid clears the old coordinates
+        self.north_springfield.zip_code = '99999'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.north_springfield.save()
+        self.assertIsNone(self.north_springfield.latitude)
+        self.assertEqual(self.names(self.nearby(zip='62701', radius=5)), ['Pending Club'])
+
+    def test_deleted_clubs_leave_the_index(self):
+        def indexed():
+            club_locations.sync()
+            return {club_id for club_id, _ in club_locations.nearest(39.8, -89.65, 10, 100)}
+
+        self.assertIn(self.springfield.pk, indexed())
+        peoria = self.peoria.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.springfield.delete()
+        self.assertEqual(indexed(), {self.north_springfield.pk, peoria})
+
+        # With its log entry gone, the next sync reloads rather than miss the deletion
+        with self.captureOnCommitCallbacks(execute=True):
+            self.peoria.delete()
+        cache.delete(DELETED_KEY.format(2))
+        self.assertEqual(indexed(), {self.north_springfield.pk})
+
+    def test_court_type_and_availability_filters(self):
+        Court.objects.create(club=self.north_springfield, court_type='clay', court_number=2)
+        self.assertEqual(self.names(self.nearby(zip='62701', radius=100, court_type='clay')), ['North Springfield Club'])
+
+        day = date(2030, 6, 3)
+        Booking.objects.create(court=self.springfield.court_details.get(), user=self.player, booking_date=day,
+                               start_time=time(10, 0), end_time=time(11, 0), status='confirmed')
+        ClubSpecialHours.objects.create(club=self.peoria, date=day, is_closed=True)
+        window = {'zip': '62701', 'radius': 100, 'date': str(day)}
+        self.assertEqual(self.names(self.nearby(**window, start_time='10:30', end_time='11:30')),
+                         ['North Springfield Club'])
+        self.assertEqual(self.names(self.nearby(**window, start_time='11:00', end_time='12:00')),
+                         ['Springfield Club', 'North Springfield Club'])
+        self.assertEqual(self.names(self.nearby(**window, start_time='06:00', end_time='07:00')), [])
+        self.assertEqual(self.nearby(zip='62701', date=str(day)).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ClubLocationIndexTest(APITestCase):
+    def test_matches_brute_force_after_incremental_changes(self):
+        rng = np.random.default_rng(0)
+        count = 100_000
+        latitudes, longitudes = rng.uniform(25, 49, count), rng.uniform(-124, -67, count)
+        index = ClubLocationIndex()
+        index.load([(club_id, lat, lon, True) for club_id, lat, lon in zip(range(count), latitudes, longitudes)])
+
+        # Move, unlist and add clubs without a rebuild
+        changes = [(club_id, 40.0, -90.0, True) for club_id in range(0, 500)]
+        changes += [(club_id, None, None, True) for club_id in range(500, 600)]
+        changes += [(club_id, 41.0, -88.0, True) for club_id in range(count, count + 100)]
+        index.apply(changes)
+        self.assertTrue(index.overlay)
+        for club_id, lat, lon, _ in changes:
+            if club_id < count:
+                latitudes[club_id], longitudes[club_id] = (lat, lon) if lat is not None else (np.nan, np.nan)
+        latitudes = np.append(latitudes, [41.0] * 100)
+        longitudes = np.append(longitudes, [-88.0] * 100)
+        vectors = unit_vectors(latitudes, longitudes)
+
+        for _ in range(100):
+            point = (rng.uniform(30, 45), rng.uniform(-110, -80))
+            found = index.nearest(*point, 20, 300)
+            distances = chord_to_miles(np.linalg.norm(vectors - unit_vectors(*map(list, zip(point)))[0], axis=1))
+            expected = np.sort(distances[distances <= 300])[:20]
+            np.testing.assert_allclose([miles for _, miles in found], expected, rtol=1e-6)
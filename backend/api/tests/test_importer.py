@@ -0,0 +1,141 @@
+import io
+import os
+import tempfile
+from datetime import date, time
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.importer import import_csv
+from api.models import Club, ClubSpecialHours, Court, CourtAvailabilityRestriction
+from api.tokens import ClaimsRefreshToken
+
+HEADER = 'record,club,zip_code,address,city,state,court_number,court_type,is_active,date,is_closed,weekday,start_time,end_time,reason\n'
+
+
+def club_rows(name, courts):
+    rows = [f'club,{name},62701,1 Main St,Springfield,IL,,,,,,,,,\n']
+    rows += [f'court,{name},62701,,,,{number},clay,,,,,,,\n' for number in range(1, courts + 1)]
+    rows.append(f'special_hours,{name},62701,,,,,,,2025-12-25,yes,,,,Christmas\n')
+    rows += [f'restriction,{name},62701,,,,{number},,,,,monday,08:00,10:00,Maintenance\n'
+             for number in range(1, courts + 1)]
+    return rows
+
+
+class ClubImportTest(APITestCase):
+    def run_import(self, rows, **kwargs):
+        return import_csv(io.StringIO(HEADER + ''.join(rows)), **kwargs)
+
+    def test_import_creates_then_updates(self):
+        report = self.run_import(club_rows('Riverside', 3) + club_rows('Lakeside', 2), chunk_size=4)
+        self.assertEqual(report.error_count, 0, report.errors)
+        self.assertEqual(dict(report.created), {'club': 2, 'court': 5, 'special_hours': 2, 'restriction': 5})
+
+        club = Club.objects.get(name='Riverside')
+        self.assertEqual(club.courts_summary, [{'type': 'clay', 'count': 3}])
+        self.assertFalse(club.is_approved)
+        hours = ClubSpecialHours.objects.get(club=club)
+        self.assertEqual((hours.date, hours.is_closed, hours.reason), (date(2025, 12, 25), True, 'Christmas'))
+        restriction = CourtAvailabilityRestriction.objects.filter(court__club=club).first()
+        self.assertEqual((restriction.weekday, restriction.start_time), (0, time(8, 0)))
+
+        # The same file again changes nothing; changed cells update in place
+        report = self.run_import(club_rows('Riverside', 3) + [
+            'club,Riverside,62701,,,,,,,,,,,,\n',
+            'court,Riverside,62701,,,,2,hard,no,,,,,,\n',
+        ])
+        self.assertEqual(sum(report.created.values()), 0)
+        self.assertEqual(+report.updated, {'court': 1})
+        self.assertEqual(Court.objects.filter(club=club).count(), 3)
+        self.assertEqual(CourtAvailabilityRestriction.objects.filter(court__club=club).count(), 3)
+        court = Court.objects.get(club=club, court_number=2)
+        self.assertEqual((court.court_type, court.is_active), ('hard', False))
+        club.refresh_from_db()
+        self.assertEqual(club.address, '1 Main St')
+        self.assertEqual(club.courts_summary, [{'type': 'hard', 'count': 1}, {'type': 'clay', 'count': 2}])
+
+    def test_row_errors_are_reported_by_line(self):
+        report = self.run_import([
+            'club,Good,62701,1 Main St,Springfield,IL,,,,,,,,,\n',
+            'club,Partial,62701,1 Main St,,IL,,,,,,,,,\n',
+            'court,Good,62701,,,,1,sand,,,,,,,\n',
+            'court,Missing,62701,,,,1,clay,,,,,,,\n',
+            'special_hours,Good,62701,,,,,,,2025-13-01,,,,,\n',
+            'special_hours,Good,62701,,,,,,,2025-12-24,no,,,,\n',
+            'restriction,Good,62701,,,,1,,,,someday,10:00,09:00,\n',
+            'booking,Good,62701,,,,,,,,,,,,\n',
+            'court,Good,62701,,,,2,grass,,,,,,,\n',
+        ])
+        lines = {error['line']: error['error'] for error in report.errors}
+        self.assertEqual(sorted(lines), [3, 4, 5, 6, 7, 8, 9])
+        self.assertIn('city', lines[3])
+        self.assertIn('court_type', lines[4])
+        self.assertIn('not found', lines[5])
+        self.assertIn('date', lines[6])
+        self.assertIn('opening_time', lines[7])
+        self.assertIn('weekday', lines[8])
+        self.assertIn('Unknown record', lines[9])
+        self.assertEqual(report.error_count, 7)
+        self.assertEqual(list(Court.objects.values_list('court_number', flat=True)), [2])
+
+    def test_unreadable_rows_and_bytes(self):
+        report = self.run_import([
+            'club,Good,62701,1 Main St,Springfield,IL,,,,,,,,,\n',
+            f'club,"{"x" * 200000}",62701,1 Main St,Springfield,IL,,,,,,,,,\n',
+            'court,Good,62701,,,,1,clay,,,,,,,\n',
+        ])
+        self.assertEqual([error['line'] for error in report.errors], [3])
+        self.assertIn('field larger than field limit', report.errors[0]['error'])
+        self.assertEqual(Court.objects.filter(club__name='Good').count(), 1)
+
+        # Decoded a block at a time, so the bad byte surfaces after some chunks committed
+        rows = [f'club,Club {number},62701,1 Main St,Springfield,IL,,,,,,,,,\n' for number in range(400)]
+        data = (HEADER + ''.join(rows)).encode() + b'club,Caf\xe9,62701,1 Main St,Springfield,IL,,,,,,,,,\n'
+        report = import_csv(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', newline=''), chunk_size=50)
+        self.assertFalse(report.as_dict()['complete'])
+        self.assertGreater(report.committed_rows, 0)
+        self.assertEqual(Club.objects.filter(name__startswith='Club ').count(), report.committed_rows)
+        error = report.errors[-1]
+        self.assertEqual(error['line'], report.stopped_at[0])
+        self.assertIn(f'{report.committed_rows} rows before this line were committed', error['error'])
+
+    def test_query_count_per_chunk_does_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as small:
+            self.run_import(club_rows('Small', 1))
+        with CaptureQueriesContext(connection) as large:
+            self.run_import(club_rows('Large', 100))
+        self.assertEqual(Court.objects.filter(club__name='Large').count(), 100)
+        self.assertEqual(len(large), len(small))
+
+    def test_command_and_endpoint(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'clubs.csv')
+        with open(path, 'w') as stream:
+            stream.write(HEADER + ''.join(club_rows('Command Club', 2)))
+        out = io.StringIO()
+        call_command('import_clubs', path, stdout=out)
+        self.assertIn('Imported 6 rows with 0 errors', out.getvalue())
+        self.assertEqual(Court.objects.filter(club__name='Command Club').count(), 2)
+
+        upload = SimpleUploadedFile('clubs.csv', (HEADER + ''.join(club_rows('Upload Club', 2))).encode())
+        player = User.objects.create_user(username='player', password='securepassword123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(player).access_token}')
+        response = self.client.post('/api/imports/clubs/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        staff = User.objects.create_user(username='staff', password='securepassword123', is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(staff).access_token}')
+        upload.seek(0)
+        response = self.client.post('/api/imports/clubs/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created']['court'], 2)
+
+        bad = SimpleUploadedFile('clubs.csv', b'name,city\nx,y\n')
+        response = self.client.post('/api/imports/clubs/', {'file': bad}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
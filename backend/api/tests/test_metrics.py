@@ -0,0 +1,92 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api.metrics import METRICS, SNAPSHOT_KEY, WORKERS_KEY, registry
+from api.models import Club
+from api.tokens import ClaimsRefreshToken
+
+
+def sample(text, name, **labels):
+    """Value of the sample `name` whose labels include `labels`"""
+    for line in text.splitlines():
+        match = re.fullmatch(rf'{name}\{{(.*)\}} (\S+)', line)
+        if match and all(f'{key}="{value}"' in match.group(1) for key, value in labels.items()):
+            return float(match.group(2))
+    return None
+
+
+class MetricsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.user = User.objects.create_user(username='player', password='securepassword123')
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        for number in range(3):
+            Club.objects.create(name=f'Club {number}', address='1 Main St', city='Springfield', state='IL',
+                                zip_code='62701', is_approved=True)
+
+    def scrape(self, **headers):
+        return self.client.get('/metrics/', **headers)
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get('/api/clubs/')
+        self.client.get('/api/clubs/')
+        self.client.get('/api/users/me/')
+
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        club_list = {'view': 'club-list-async', 'method': 'GET', 'status': '200'}
+        self.assertEqual(sample(text, 'http_request_duration_seconds_count', **club_list), 2)
+        self.assertEqual(sample(text, 'http_request_duration_seconds_bucket', le='+Inf', **club_list), 2)
+        self.assertEqual(sample(text, 'http_request_duration_seconds_count', view='user-me'), 1)
+        self.assertGreater(sample(text, 'db_queries_total', **club_list), 0)
+        self.assertGreater(sample(text, 'db_query_duration_seconds_total', **club_list), 0)
+        self.assertEqual(sample(text, 'response_render_duration_seconds_count', **club_list), 2)
+        self.assertEqual(sample(text, 'response_serialize_duration_seconds_count', **club_list), 2)
+        self.assertGreater(sample(text, 'response_serialize_duration_seconds_sum', view='user-me'), 0)
+        self.assertGreater(sample(text, 'http_response_size_bytes_sum', **club_list), 100)
+        for metric in METRICS:
+            self.assertIn(f'# TYPE {metric.name} {metric.kind}', text)
+
+    def test_query_counts_match_the_queries_run(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get('/api/users/me/')
+        queries = len(captured)
+        # Queries outside a request are not counted
+        Club.objects.count()
+        text = self.scrape().content.decode()
+        self.assertEqual(sample(text, 'db_queries_total', view='user-me'), queries)
+        self.assertEqual(sample(text, 'db_queries_per_request_sum', view='user-me'), queries)
+
+    def test_other_workers_are_added_in(self):
+        self.client.get('/api/users/me/')
+        labels = ('user-me', 'GET', '200')
+        cache.set(SNAPSHOT_KEY.format('other:1'), {'db_queries_total': {labels: [7.0]}})
+        cache.set(WORKERS_KEY, cache.get(WORKERS_KEY, []) + ['other:1', 'gone:2'])
+
+        text = self.scrape().content.decode()
+        own = registry.snapshot()['db_queries_total'][labels][0]
+        self.assertEqual(sample(text, 'db_queries_total', view='user-me'), own + 7)
+        self.assertNotIn('gone:2', cache.get(WORKERS_KEY))
+
+    def test_unresolved_paths_share_one_label(self):
+        self.client.get('/no/such/page/')
+        self.client.get('/another/missing/page/')
+        text = self.scrape().content.decode()
+        self.assertEqual(sample(text, 'http_request_duration_seconds_count', view='unresolved', status='404'), 2)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_is_required_when_configured(self):
+        self.client.credentials()
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
@@ -0,0 +1,100 @@
+from unittest import mock
+
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.models import Club, Court
+from api.response_cache import results
+from api.tokens import ClaimsRefreshToken
+
+
+class ClubOnboardingTest(APITestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='securepassword123')
+        self.manager.groups.add(Group.objects.get_or_create(name='Manager')[0])
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='securepassword123')
+        token = ClaimsRefreshToken.for_user(self.manager).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def create_club(self, name, courts):
+        return self.client.post('/api/clubs/', {
+            'name': name, 'address': '1 Main St', 'city': 'Springfield', 'state': 'IL',
+            'zip_code': '62701', 'email': 'club@example.com', 'courts': courts,
+        }, format='json')
+
+    def test_courts_and_summary_are_created_with_the_club(self):
+        response = self.create_club('New Club', [{'type': 'clay', 'count': 2}, {'type': 'hard', 'count': '3'},
+                                                 {'type': 'grass', 'count': 0}])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        club = Club.objects.get(name='New Club')
+        self.assertEqual(club.courts_summary, [{'type': 'hard', 'count': 3}, {'type': 'clay', 'count': 2}])
+        self.assertEqual(response.data['courts_summary'], club.courts_summary)
+        self.assertEqual(
+            list(Court.objects.filter(club=club).order_by('court_number').values_list('court_number', 'court_type')),
+            [(1, 'clay'), (2, 'clay'), (3, 'hard'), (4, 'hard'), (5, 'hard')],
+        )
+
+    def test_query_count_does_not_grow_with_courts(self):
+        # Warm up the per-user lookups the first request makes
+        self.create_club('First Club', [])
+        with CaptureQueriesContext(connection) as one:
+            self.create_club('Small Club', [{'type': 'hard', 'count': 1}])
+        with CaptureQueriesContext(connection) as many:
+            self.create_club('Large Club', [{'type': 'hard', 'count': 30}, {'type': 'clay', 'count': 20}])
+        self.assertEqual(Court.objects.filter(club__name='Large Club').count(), 50)
+        self.assertEqual(len(many), len(one))
+        # Superusers are notified from a single Club save
+        self.assertEqual(sum('INSERT INTO "api_club"' in query['sql'] for query in many.captured_queries), 1)
+        self.assertFalse(any('UPDATE "api_club"' in query['sql'] for query in many.captured_queries))
+
+    @override_settings(SHARED_CACHE=True, RESPONSE_CACHE_SECONDS=60)
+    def test_new_courts_invalidate_cached_court_lists(self):
+        cache.clear()
+        self.create_club('First Club', [{'type': 'hard', 'count': 1}])
+        self.assertEqual(len(results(self.client.get('/api/courts/').json())), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_club('Second Club', [{'type': 'clay', 'count': 2}])
+        self.assertEqual(len(results(self.client.get('/api/courts/').json())), 3)
+
+    def test_invalid_courts_create_nothing(self):
+        response = self.create_club('Bad Club', [{'type': 'hard', 'count': 2}, {'type': 'sand', 'count': 1}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(1, response.data['courts'])
+        self.assertFalse(Club.objects.filter(name='Bad Club').exists())
+
+    def test_failed_court_insert_rolls_back_the_club(self):
+        with mock.patch.object(Court.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.create_club('Broken Club', [{'type': 'hard', 'count': 2}])
+        self.assertFalse(Club.objects.filter(name='Broken Club').exists())
+
+    def test_add_courts_to_existing_club(self):
+        self.create_club('Growing Club', [{'type': 'hard', 'count': 2}])
+        club = Club.objects.get(name='Growing Club')
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(f'/api/clubs/{club.id}/add-courts/', {'courts': [{'type': 'clay', 'count': 1}]},
+                             format='json')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.post(f'/api/clubs/{club.id}/add-courts/',
+                                        {'courts': [{'type': 'clay', 'count': 10}, {'type': 'hard', 'count': 5}]},
+                                        format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(many), len(few))
+        self.assertEqual([court['court_number'] for court in response.data['courts']], list(range(4, 19)))
+        self.assertEqual(response.data['courts_summary'], [{'type': 'hard', 'count': 7}, {'type': 'clay', 'count': 11}])
+        club.refresh_from_db()
+        self.assertEqual(club.courts_summary, response.data['courts_summary'])
+
+        player = User.objects.create_user(username='player', password='securepassword123')
+        token = ClaimsRefreshToken.for_user(player).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.post(f'/api/clubs/{club.id}/add-courts/', {'courts': [{'type': 'clay', 'count': 1}]},
+                                    format='json')
+        self.assertIn(response.status_code, (status.HTTP_403_FORBIDDEN, status.HTTP_404_NOT_FOUND))
+        self.assertEqual(Court.objects.filter(club=club).count(), 18)
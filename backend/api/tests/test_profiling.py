@@ -0,0 +1,126 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from api.models import Club, Court
+from api.profiling import ProfilingMiddleware, profiler_lock
+from api.tokens import ClaimsRefreshToken
+
+
+class ProfilingTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com',
+                                                   password='securepassword123')
+        self.player = User.objects.create_user(username='player', password='securepassword123')
+        club = Club.objects.create(name='Home Club', address='1 Main St', city='Springfield', state='IL',
+                                   zip_code='62701', is_approved=True)
+        self.court = Court.objects.create(club=club, court_type='hard', court_number=1)
+
+    def login(self, user):
+        token = ClaimsRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_sql_profile_lists_statements_with_plans(self):
+        self.login(self.admin)
+        response = self.client.get('/api/courts/', {'profile': 'sql'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile = response.json()
+        self.assertEqual(profile['mode'], 'sql')
+        self.assertEqual(profile['status'], 200)
+        self.assertEqual(profile['queries'], len(profile['statements']))
+        selects = [statement for statement in profile['statements'] if 'api_court' in statement['sql']]
+        self.assertTrue(selects)
+        self.assertTrue(selects[0]['explain'])
+        self.assertIn('ms', selects[0])
+
+    def test_sql_profile_of_an_async_view(self):
+        self.login(self.admin)
+        profile = self.client.get('/api/clubs/', {'profile': 'sql'}).json()
+        self.assertEqual(profile['status'], 200)
+        self.assertTrue(any('api_club' in statement['sql'] for statement in profile['statements']))
+
+    def test_cprofile_summary(self):
+        self.login(self.admin)
+        response = self.client.get('/api/courts/', {'profile': 'cprofile', 'profile_sort': 'tottime',
+                                                    'profile_limit': 5})
+        profile = response.json()
+        self.assertEqual(profile['mode'], 'cprofile')
+        self.assertEqual(profile['status'], 200)
+        self.assertEqual(len(profile['functions']), 5)
+        tottimes = [function['tottime'] for function in profile['functions']]
+        self.assertEqual(tottimes, sorted(tottimes, reverse=True))
+        self.assertGreater(profile['total_calls'], 0)
+
+    def test_one_cprofile_at_a_time(self):
+        self.login(self.admin)
+        with profiler_lock:
+            response = self.client.get('/api/courts/', {'profile': 'cprofile'})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.get('/api/courts/', {'profile': 'cprofile'}).status_code, status.HTTP_200_OK)
+
+    def test_overlapping_async_profiles(self):
+        async def view(request):
+            await asyncio.sleep(0.01)
+            return HttpResponse('ok')
+
+        middleware = ProfilingMiddleware(view)
+        request = RequestFactory().get('/api/clubs/', {'profile': 'cprofile'})
+
+        async def overlap():
+            return await asyncio.gather(middleware(request), middleware(request))
+
+        with mock.patch('api.profiling.is_superuser', return_value=True):
+            responses = async_to_sync(overlap)()
+        self.assertEqual(sorted(response.status_code for response in responses), [200, 409])
+        self.assertFalse(profiler_lock.locked())
+
+    def test_writes_still_happen(self):
+        self.login(self.admin)
+        response = self.client.post('/api/bookings/?profile=sql', {
+            'court': self.court.pk, 'booking_date': '2025-03-05', 'start_time': '10:00', 'end_time': '11:00',
+        }, format='json')
+        profile = response.json()
+        self.assertEqual(profile['status'], 201)
+        self.assertTrue(any(statement['sql'].startswith('INSERT') for statement in profile['statements']))
+        self.assertNotIn('explain', [statement for statement in profile['statements']
+                                     if statement['sql'].startswith('INSERT')][0])
+
+    def test_bad_mode_is_rejected(self):
+        self.login(self.admin)
+        response = self.client.get('/api/courts/', {'profile': 'memory'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.json())
+
+    def test_ignored_for_other_users(self):
+        self.login(self.player)
+        response = self.client.get('/api/courts/', {'profile': 'sql'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('statements', response.json())
+
+        self.client.credentials()
+        response = self.client.get('/api/courts/', {'profile': 'cprofile'})
+        self.assertNotIn('functions', response.json())
+
+    def test_token_claims_alone_do_not_grant_it(self):
+        token = ClaimsRefreshToken.for_user(self.admin).access_token
+        User.objects.filter(pk=self.admin.pk).update(is_superuser=False)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get('/api/courts/', {'profile': 'sql'})
+        self.assertNotIn('statements', response.json())
+
+    def test_can_be_switched_off(self):
+        token = ClaimsRefreshToken.for_user(self.admin).access_token
+        with override_settings(REQUEST_PROFILING=False):
+            # A new client, since clients keep the middleware they were built with
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            response = client.get('/api/courts/', {'profile': 'sql'})
+        self.assertNotIn('statements', response.json())
@@ -0,0 +1,167 @@
+from datetime import date, time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api.models import Booking, Club, Court
+from api.tokens import ClaimsRefreshToken
+from api.views.booking_views import BookingViewSet
+from api.views.club_views import ClubViewSet
+from .query_budget import QueryBudgetMixin
+
+DAY = date(2025, 3, 5)
+
+
+# The budgets are for building responses, not for serving them from the response cache
+# The test process is the only worker, so its local memory cache counts as shared
+@override_settings(RESPONSE_CACHE_SECONDS=0, SHARED_CACHE=True)
+class QueryBudgetTest(QueryBudgetMixin, APITestCase):
+    """Query counts per endpoint stay within budget and do not grow with the data"""
+
+    def setUp(self):
+        cache.clear()
+        self.player = User.objects.create_user(username='player', password='securepassword123')
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com',
+                                                   password='securepassword123')
+        self.club = self.make_club('Home Club')
+        self.login(self.player)
+
+    def login(self, user):
+        self.token = ClaimsRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def make_club(self, name):
+        return Club.objects.create(name=name, address='1 Main St', city='Springfield', state='IL',
+                                   zip_code='62701', is_approved=True)
+
+    def get(self, path, params=None):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content[:500])
+        return response
+
+    def call_viewset(self, viewset, actions, path, params=None):
+        """The synchronous viewset behind a URL the async views take over"""
+        request = APIRequestFactory().get(path, params, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        response = viewset.as_view(actions)(request)
+        response.render()
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content[:500])
+
+    def grow_clubs(self, count):
+        """`count` approved clubs with two courts each"""
+        clubs = Club.objects.bulk_create([
+            Club(name=f'Club {number}', address='1 Main St', city='Springfield', state='IL', zip_code='62701',
+                 is_approved=True)
+            for number in range(Club.objects.count(), count)
+        ])
+        Court.objects.bulk_create([
+            Court(club=club, court_type=court_type, court_number=number)
+            for club in clubs
+            for number, court_type in enumerate(('hard', 'clay'), start=1)
+        ])
+
+    def grow_courts(self, count):
+        existing = Court.objects.filter(club=self.club).count()
+        Court.objects.bulk_create([
+            Court(club=self.club, court_type=('hard', 'clay', 'grass')[number % 3], court_number=number + 1)
+            for number in range(existing, count)
+        ])
+
+    def grow_bookings(self, count):
+        """`count` of the player's bookings at the home club, spread over courts and days"""
+        self.grow_courts(10)
+        courts = list(Court.objects.filter(club=self.club).order_by('court_number'))
+        existing = Booking.objects.filter(user=self.player).count()
+        Booking.objects.bulk_create([
+            Booking(court=courts[number % 10], user=self.player,
+                    booking_date=DAY + timedelta(days=number // 100), start_time=time(8 + number // 10 % 10),
+                    end_time=time(9 + number // 10 % 10), status='confirmed')
+            for number in range(existing, count)
+        ])
+
+    def test_club_list(self):
+        self.assertQueriesFlat(self.grow_clubs, lambda: self.get('/api/clubs/'), budget=3)
+
+    def test_club_list_viewset(self):
+        self.assertQueriesFlat(self.grow_clubs, lambda: self.call_viewset(ClubViewSet, {'get': 'list'}, '/api/clubs/'),
+                               budget=3)
+
+    def test_club_detail(self):
+        self.assertQueriesFlat(self.grow_courts, lambda: self.get(f'/api/clubs/{self.club.pk}/'), budget=2)
+
+    def test_court_list(self):
+        self.assertQueriesFlat(self.grow_courts, lambda: self.get('/api/courts/'), budget=2)
+
+    def test_booking_list(self):
+        self.assertQueriesFlat(self.grow_bookings, lambda: self.get('/api/bookings/'), budget=2)
+
+    def test_calendar(self):
+        params = {'start_date': DAY, 'end_date': DAY + timedelta(days=7)}
+        self.assertQueriesFlat(self.grow_bookings, lambda: self.get('/api/bookings/calendar/', params), budget=1)
+
+    def test_calendar_viewset(self):
+        params = {'start_date': DAY, 'end_date': DAY + timedelta(days=7)}
+        self.assertQueriesFlat(self.grow_bookings, lambda: self.call_viewset(
+            BookingViewSet, {'get': 'calendar'}, '/api/bookings/calendar/', params), budget=1)
+
+    def test_club_calendar_as_admin(self):
+        self.login(self.admin)
+        params = {'club': self.club.pk, 'start_date': DAY, 'end_date': DAY + timedelta(days=7)}
+        self.assertQueriesFlat(self.grow_bookings, lambda: self.get('/api/bookings/calendar/', params), budget=1)
+
+    def test_available_slots(self):
+        params = {'club_id': self.club.pk, 'date': DAY}
+        # The first request loads the club settings and courts, later ones only read the bookings
+        with self.assertQueryBudget(2):
+            self.get('/api/bookings/available_slots/', params)
+        self.assertQueriesFlat(self.grow_bookings, lambda: self.get('/api/bookings/available_slots/', params),
+                               sizes=(1, 10, 60), budget=1)
+
+    def test_available_slots_viewset(self):
+        params = {'club_id': self.club.pk, 'date': DAY}
+
+        def available_slots():
+            self.call_viewset(BookingViewSet, {'get': 'available_slots'}, '/api/bookings/available_slots/', params)
+
+        with self.assertQueryBudget(2):
+            available_slots()
+        self.assertQueriesFlat(self.grow_bookings, available_slots, sizes=(1, 10, 60), budget=1)
+
+    def test_booking_create(self):
+        self.grow_courts(1)
+        court = Court.objects.get(club=self.club)
+        # Including the user row for user_details and the UPDATE of the user's booking counts
+        with self.assertQueryBudget(9):
+            response = self.client.post('/api/bookings/', {
+                'court': court.pk, 'booking_date': DAY, 'start_time': '10:00', 'end_time': '11:00',
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content[:500])
+        # The club settings are cached by now
+        with self.assertQueryBudget(8):
+            response = self.client.post('/api/bookings/', {
+                'court': court.pk, 'booking_date': DAY, 'start_time': '11:00', 'end_time': '12:00',
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content[:500])
+
+    def test_me(self):
+        with self.assertQueryBudget(1):
+            self.get('/api/users/me/')
+
+    def test_failures_group_queries_by_call_site(self):
+        def club_names():
+            return [court.club.name for court in Court.objects.filter(club=self.club)]
+
+        with self.assertRaises(AssertionError) as failure:
+            self.assertQueriesFlat(self.grow_courts, club_names, sizes=(3, 5))
+        report = str(failure.exception)
+        self.assertIn('4 queries with 3 objects but 6 with 5', report)
+        # The repeated club lookup is singled out with its growth and SQL
+        self.assertIn('5x (+2) api/tests/test_query_budgets.py', report)
+        self.assertIn('SELECT "api_club"."id"', report)
+
+        with self.assertRaises(AssertionError) as failure:
+            with self.assertQueryBudget(2):
+                club_names()
+        self.assertIn('over the budget of 2', str(failure.exception))
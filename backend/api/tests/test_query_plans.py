@@ -0,0 +1,174 @@
+import json
+import re
+from datetime import date, time, timedelta
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+
+from api.models import Club, Court, Booking, ClubSpecialHours, CourtAvailabilityRestriction
+from api import partitioning
+
+# Tables that must never be read with a full scan by the hot-path queries
+GUARDED_TABLES = {
+    Booking._meta.db_table,
+    Court._meta.db_table,
+    ClubSpecialHours._meta.db_table,
+    CourtAvailabilityRestriction._meta.db_table,
+}
+
+
+def sequential_scans(queryset):
+    """Return the guarded tables the query plan reads with a full scan"""
+    if connection.vendor == 'postgresql':
+        scans = set()
+        # EXPLAIN (FORMAT JSON) returns a list with one plan per statement
+        nodes = [json.loads(queryset.explain(format='json'))[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node.get('Node Type') == 'Seq Scan':
+                # Count scans of booking partitions against the booking table
+                relation = node.get('Relation Name', '')
+                scans.add(re.sub(r'_(p\d{4}_\d{2}|default)$', '', relation))
+            nodes.extend(node.get('Plans', []))
+        return scans & GUARDED_TABLES
+
+    # SQLite: "SCAN table" is a full scan, "SEARCH table USING INDEX" is not
+    return set(re.findall(r'\bSCAN (\w+)', queryset.explain())) & GUARDED_TABLES
+
+
+class QueryPlanTest(TestCase):
+    """
+    Runs EXPLAIN on the booking hot-path queries against a seeded dataset and
+    fails if any of them falls back to a sequential scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='planner', password='securepassword123')
+        other_user = User.objects.create_user(username='other', password='securepassword123')
+        clubs = Club.objects.bulk_create([
+            Club(name=f'Club {i}', address='1 Main St', city='Testville', state='TS', zip_code='12345', is_approved=True)
+            for i in range(5)
+        ])
+        courts = Court.objects.bulk_create([
+            Court(club=club, court_type=('hard', 'clay', 'grass')[n % 3], court_number=n, is_active=n % 5 != 0)
+            for club in clubs
+            for n in range(1, 21)
+        ])
+        cls.club = clubs[0]
+        cls.court = courts[0]
+        cls.start = date(2025, 6, 1)
+
+        bookings = []
+        for day in range(30):
+            for court in courts:
+                for hour in (8, 10, 12, 14, 16, 18):
+                    bookings.append(Booking(
+                        court=court,
+                        user=cls.user if hour == 8 else other_user,
+                        booking_date=cls.start + timedelta(days=day),
+                        start_time=time(hour, 0),
+                        end_time=time(hour + 1, 0),
+                        status='canceled' if hour == 18 else 'confirmed',
+                    ))
+        Booking.objects.bulk_create(bookings, batch_size=2000)
+        ClubSpecialHours.objects.bulk_create([
+            ClubSpecialHours(club=club, date=cls.start + timedelta(days=d), is_closed=True)
+            for club in clubs
+            for d in range(0, 30, 7)
+        ])
+        CourtAvailabilityRestriction.objects.bulk_create([
+            CourtAvailabilityRestriction(court=court, weekday=court.court_number % 7, start_time=time(8), end_time=time(10))
+            for court in courts
+        ])
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            if connection.vendor == 'postgresql':
+                # The seeded tables are small enough that a scan would be
+                # cheapest; this checks that an index *can* serve each query
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertNoSequentialScan(self, queryset):
+        self.assertEqual(sequential_scans(queryset), set(), queryset.explain())
+
+    def test_available_slots_bookings(self):
+        courts = Court.objects.filter(club=self.club, is_active=True, court_type='hard')
+        self.assertNoSequentialScan(courts)
+        self.assertNoSequentialScan(Booking.objects.filter(
+            court__in=courts,
+            booking_date=self.start,
+            status__in=Booking.ACTIVE_STATUSES,
+        ))
+
+    def test_booking_conflict_check(self):
+        self.assertNoSequentialScan(Booking.objects.filter(
+            court=self.court,
+            booking_date=self.start,
+            status__in=Booking.ACTIVE_STATUSES,
+        ).order_by())
+
+    def test_club_calendar_date_range(self):
+        self.assertNoSequentialScan(Booking.objects.filter(
+            court__club_id=self.club.id,
+            booking_date__gte=self.start,
+            booking_date__lte=self.start + timedelta(days=7),
+        ))
+
+    def test_user_bookings_by_date(self):
+        self.assertNoSequentialScan(Booking.objects.filter(
+            user=self.user,
+            booking_date__gte=self.start,
+            booking_date__lte=self.start + timedelta(days=7),
+        ))
+
+    def test_special_hours_lookup(self):
+        self.assertNoSequentialScan(ClubSpecialHours.objects.filter(club=self.club, date=self.start))
+
+    def test_court_restrictions_lookup(self):
+        self.assertNoSequentialScan(CourtAvailabilityRestriction.objects.filter(court=self.court, weekday=1))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Booking partitioning is PostgreSQL only')
+class PartitionPruningTest(TestCase):
+    """The calendar and available_slots queries only touch one monthly partition"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = date(2025, 6, 1)
+        partitioning.ensure_partitions(date(2025, 5, 1), date(2025, 8, 1))
+        user = User.objects.create_user(username='pruner', password='securepassword123')
+        cls.club = Club.objects.create(name='Club', address='1 Main St', city='Testville', state='TS', zip_code='12345')
+        court = Court.objects.create(club=cls.club, court_type='hard', court_number=1)
+        Booking.objects.bulk_create([
+            Booking(court=court, user=user, booking_date=date(2025, 5, 1) + timedelta(days=day),
+                    start_time=time(10), end_time=time(11), status='confirmed')
+            for day in range(120)
+        ])
+
+    def scanned_partitions(self, queryset):
+        plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+        relations = set()
+        nodes = [plan]
+        while nodes:
+            node = nodes.pop()
+            if node.get('Relation Name', '').startswith(partitioning.TABLE):
+                relations.add(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return relations
+
+    def test_available_slots_prunes_to_one_partition(self):
+        courts = Court.objects.filter(club=self.club, is_active=True)
+        queryset = Booking.objects.filter(court__in=courts, booking_date=self.start, status__in=Booking.ACTIVE_STATUSES)
+        self.assertEqual(self.scanned_partitions(queryset), {partitioning.partition_name(self.start)})
+
+    def test_weekly_calendar_prunes_to_one_partition(self):
+        queryset = Booking.objects.filter(
+            court__club_id=self.club.id,
+            booking_date__gte=self.start,
+            booking_date__lte=self.start + timedelta(days=6),
+        )
+        self.assertEqual(self.scanned_partitions(queryset), {partitioning.partition_name(self.start)})
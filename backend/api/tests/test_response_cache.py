@@ -0,0 +1,140 @@
+import threading
+import time
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api import response_cache
+from api.metrics import registry
+from api.models import Club, Court
+from api.tokens import ClaimsRefreshToken
+from api.views.club_views import ClubViewSet
+
+
+# Settings leave it off on the tests' local memory cache
+# The test process is the only worker, so its local memory cache counts as shared
+@override_settings(RESPONSE_CACHE_SECONDS=60, SHARED_CACHE=True)
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.player = User.objects.create_user(username='player', password='securepassword123')
+        self.club = Club.objects.create(name='Home Club', address='1 Main St', city='Springfield', state='IL',
+                                        zip_code='62701', is_approved=True)
+        self.court = Court.objects.create(club=self.club, court_type='hard', court_number=1)
+        self.login(self.player)
+
+    def login(self, user):
+        self.token = ClaimsRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_hits_run_no_queries(self):
+        first = self.get('/api/clubs/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('/api/clubs/'), first)
+            self.get('/api/clubs/')
+        self.assertEqual(registry.snapshot()[response_cache.REQUESTS.name][('club-list', 'hit')], [2.0])
+
+    def test_viewset_shares_entries_with_the_async_club_list(self):
+        self.get('/api/clubs/')
+        request = APIRequestFactory().get('/api/clubs/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with self.assertNumQueries(0):
+            response = ClubViewSet.as_view({'get': 'list'}, basename='club')(request)
+        self.assertEqual(response.data['results'][0]['name'], 'Home Club')
+
+    def test_writes_invalidate_by_tag(self):
+        self.get('/api/clubs/')
+        self.get('/api/courts/')
+        Court.objects.create(club=self.club, court_type='clay', court_number=2)
+        self.assertEqual(len(self.get('/api/clubs/')['results'][0]['court_details']), 2)
+
+        self.club.name = 'Renamed Club'
+        self.club.save()
+        self.assertEqual({court['club_name'] for court in self.get('/api/courts/')['results']}, {'Renamed Club'})
+
+        Club.objects.create(name='New Club', address='2 Main St', city='Springfield', state='IL',
+                            zip_code='62701', is_approved=True)
+        self.assertEqual(self.get('/api/clubs/')['count'], 2)
+
+    def test_profile(self):
+        self.assertEqual(self.get('/api/users/me/')['first_name'], '')
+        with self.assertNumQueries(0):
+            self.get('/api/users/me/')
+        self.player.first_name = 'Pat'
+        self.player.save()
+        self.assertEqual(self.get('/api/users/me/')['first_name'], 'Pat')
+
+    def test_audiences_do_not_share_entries(self):
+        manager = User.objects.create_user(username='manager', password='securepassword123')
+        manager.groups.add(Group.objects.get_or_create(name='Manager')[0])
+        Club.objects.create(name='Pending Club', address='2 Main St', city='Springfield', state='IL',
+                            zip_code='62701', manager=manager)
+        self.assertEqual(self.get('/api/clubs/')['count'], 1)
+        self.login(manager)
+        self.assertEqual(self.get('/api/clubs/')['count'], 2)
+        self.login(self.player)
+        self.assertEqual(self.get('/api/clubs/')['count'], 1)
+
+
+@override_settings(RESPONSE_CACHE_SECONDS=60)
+class FetchTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def build(self, delay=0):
+        self.builds += 1
+        time.sleep(delay)
+        return {'builds': self.builds}, 200, ['club:1']
+
+    def test_cold_key_is_built_once(self):
+        entries = []
+
+        def fetch():
+            entries.append(response_cache.fetch('test', 'cold', lambda: self.build(delay=0.2)))
+
+        threads = [threading.Thread(target=fetch) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.builds, 1)
+        self.assertEqual([entry['data'] for entry in entries], [{'builds': 1}] * 8)
+
+    @override_settings(RESPONSE_CACHE_SECONDS=0.05, RESPONSE_CACHE_STALE_SECONDS=60)
+    def test_stale_while_revalidate(self):
+        response_cache.fetch('test', 'key', self.build)
+        time.sleep(0.06)
+        # Another request holds the lock and is rebuilding: the stale entry is served meanwhile
+        token = response_cache.acquire('key')
+        self.assertEqual(response_cache.fetch('test', 'key', self.build)['data'], {'builds': 1})
+        response_cache.release('key', token)
+        # Without one, the request rebuilds it
+        self.assertEqual(response_cache.fetch('test', 'key', self.build)['data'], {'builds': 2})
+
+    @override_settings(RESPONSE_CACHE_WAIT_SECONDS=0.05)
+    def test_invalidated_entries_are_not_served(self):
+        response_cache.fetch('test', 'key', self.build)
+        response_cache.invalidate_tags(['club:1'])
+        # Even while someone else holds the lock: after the wait it is built here
+        response_cache.acquire('key')
+        self.assertEqual(response_cache.fetch('test', 'key', self.build)['data'], {'builds': 2})
+
+    def test_tags_are_stamped_from_a_logical_clock(self):
+        response_cache.invalidate_tags(['club:1'])
+        first = cache.get('response_cache:tag:club:1')
+        response_cache.invalidate_tags(['club:1'])
+        self.assertEqual(cache.get('response_cache:tag:club:1'), first + 1)
+
+        # A lost clock restarts above every stamp it handed out
+        cache.delete(response_cache.CLOCK_KEY)
+        time.sleep(0.001)
+        self.assertGreater(response_cache.clock(), first + 1)
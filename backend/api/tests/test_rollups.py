@@ -0,0 +1,141 @@
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User, Group
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.models import Club, Court, Booking, DailyCourtStats
+from api import rollups
+from api.rollups import date_chunks
+from api.tokens import ClaimsRefreshToken
+
+
+class DailyCourtStatsTest(APITestCase):
+    def setUp(self):
+        self.player = User.objects.create_user(username='player', password='securepassword123')
+        self.friend = User.objects.create_user(username='friend', password='securepassword123')
+        self.manager = User.objects.create_user(username='manager', password='securepassword123')
+        self.manager.groups.add(Group.objects.get_or_create(name='Manager')[0])
+
+        self.club = Club.objects.create(
+            name='Rollup Club', address='1 Main St', city='Springfield', state='IL',
+            zip_code='62701', email='club@example.com', manager=self.manager, is_approved=True,
+        )
+        self.court = Court.objects.create(club=self.club, court_type='hard', court_number=1)
+        self.other_court = Court.objects.create(club=self.club, court_type='clay', court_number=2)
+        self.day = timezone.localdate() - timedelta(days=1)
+
+    def book(self, start, end, user=None, court=None, day=None, status='confirmed'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Booking.objects.create(
+                court=court or self.court, user=user or self.player, booking_date=day or self.day,
+                start_time=start, end_time=end, status=status,
+            )
+
+    def stats(self, court=None, day=None):
+        return DailyCourtStats.objects.get(court=court or self.court, date=day or self.day)
+
+    def test_booking_changes_update_the_bucket(self):
+        self.book(time(9, 0), time(10, 30))
+        self.book(time(11, 0), time(12, 0))
+        self.book(time(14, 0), time(15, 0), user=self.friend)
+        stats = self.stats()
+        self.assertEqual((stats.booked_minutes, stats.booking_count, stats.unique_users), (210, 3, 2))
+
+        booking = Booking.objects.get(start_time=time(14, 0))
+        booking.status = 'canceled'
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+        stats = self.stats()
+        self.assertEqual((stats.booked_minutes, stats.booking_count, stats.cancellations, stats.unique_users),
+                         (150, 2, 1, 1))
+
+    def test_moved_and_deleted_bookings_leave_their_old_bucket(self):
+        booking = self.book(time(9, 0), time(10, 0))
+        booking.court = self.other_court
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+        self.assertFalse(DailyCourtStats.objects.filter(court=self.court).exists())
+        self.assertEqual(self.stats(court=self.other_court).booking_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        self.assertFalse(DailyCourtStats.objects.exists())
+
+    def test_rebuild_command_backfills_and_repairs(self):
+        # bulk_create skips the signals, like an import would
+        start = date(2025, 1, 1)
+        Booking.objects.bulk_create([
+            Booking(court=court, user=self.player, booking_date=start + timedelta(days=day),
+                    start_time=time(10, 0), end_time=time(11, 0), status='confirmed')
+            for day in range(40)
+            for court in (self.court, self.other_court)
+        ])
+        DailyCourtStats.objects.create(court=self.court, date=start - timedelta(days=1), booking_count=5)
+
+        out = StringIO()
+        call_command('rebuild_court_stats', '--start-date=2024-12-31', '--end-date=2025-02-09',
+                     '--chunk-days=7', '--workers=1', stdout=out)
+        self.assertIn('Rebuilt 80 court-days', out.getvalue())
+        self.assertEqual(DailyCourtStats.objects.count(), 80)
+        # The stale row without bookings is gone
+        self.assertFalse(DailyCourtStats.objects.filter(date=start - timedelta(days=1)).exists())
+        self.assertEqual(self.stats(day=start).booked_minutes, 60)
+
+    def test_rebuild_keeps_bookings_committed_while_it_counts(self):
+        self.book(time(9, 0), time(10, 0))
+        counted = rollups.compute_stats
+
+        def count_then_book(bookings):
+            stats = counted(bookings)
+            if not Booking.objects.filter(court=self.other_court).exists():
+                # Committed (without signals) after the rebuild counted the range
+                    Booking.objects.bulk_create([Booking(
+                    court=self.other_court, user=self.player, booking_date=self.day,
+                    start_time=time(9, 0), end_time=time(10, 0), status='confirmed',
+                )])
+            return stats
+
+        with mock.patch('api.rollups.compute_stats', side_effect=count_then_book):
+            rollups.rebuild_range(self.day, self.day)
+        self.assertEqual(self.stats().booking_count, 1)
+        self.assertEqual(self.stats(court=self.other_court).booking_count, 1)
+
+        # Refreshes running alongside a rebuild upsert into the same rows
+        rollups.refresh_buckets([(self.court.id, self.day)])
+        rollups.rebuild_range(self.day, self.day)
+        self.assertEqual(DailyCourtStats.objects.count(), 2)
+
+    def test_date_chunks_cover_the_range(self):
+        chunks = list(date_chunks(date(2025, 1, 1), date(2025, 1, 10), 4))
+        self.assertEqual(chunks, [
+            (date(2025, 1, 1), date(2025, 1, 4)),
+            (date(2025, 1, 5), date(2025, 1, 8)),
+            (date(2025, 1, 9), date(2025, 1, 10)),
+        ])
+
+    def test_stats_endpoint_and_profile_read_the_rollups(self):
+        self.book(time(9, 0), time(10, 0))
+        self.book(time(9, 0), time(11, 0), court=self.other_court, status='canceled')
+        token = ClaimsRefreshToken.for_user(self.manager).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        response = self.client.get(f'/api/clubs/{self.club.id}/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['totals'], {'booked_minutes': 60, 'booking_count': 1, 'cancellations': 1})
+        self.assertEqual(response.data['days'], [
+            {'date': str(self.day), 'booked_minutes': 60, 'booking_count': 1, 'cancellations': 1},
+        ])
+        self.assertEqual([court['court_number'] for court in response.data['courts']], [1, 2])
+
+        response = self.client.get('/api/users/profile/')
+        self.assertEqual(response.data['club_stats'], {'booked_minutes': 60, 'booking_count': 1, 'cancellations': 1})
+
+        token = ClaimsRefreshToken.for_user(self.player).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get(f'/api/clubs/{self.club.id}/stats/').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertNotIn('club_stats', self.client.get('/api/users/profile/').data)
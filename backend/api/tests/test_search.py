@@ -0,0 +1,99 @@
+import json
+from unittest import skipUnless
+
+from django.contrib.auth.models import User, Group
+from django.db import connection
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.models import Club
+from api.search import search_clubs
+from api.tokens import ClaimsRefreshToken
+
+
+class ClubSearchTest(APITestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='securepassword123')
+        self.manager.groups.add(Group.objects.get_or_create(name='Manager')[0])
+        self.player = User.objects.create_user(username='player', password='securepassword123')
+        for name, city, state, approved in [
+            ('Riverside Tennis Club', 'Springfield', 'IL', True),
+            ('Lakeside Racquet Club', 'Riverton', 'WY', True),
+            ('Oakwood Tennis Center', 'Portland', 'OR', True),
+            ('Riverside Private Courts', 'Springfield', 'IL', False),
+        ]:
+            Club.objects.create(name=name, address='1 Main St', city=city, state=state, zip_code='62701',
+                                is_approved=approved, manager=self.manager if not approved else None)
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+
+    def names(self, response):
+        return [club['name'] for club in response.data['results']]
+
+    def test_search_respects_visibility(self):
+        for async_views in (True, False):
+            with self.subTest(async_views=async_views), override_settings(ASYNC_READ_VIEWS=async_views):
+                self.login(self.player)
+                response = self.client.get('/api/clubs/', {'search': 'riverside springfield'})
+                self.assertEqual(self.names(response), ['Riverside Tennis Club'])
+
+                self.login(self.manager)
+                response = self.client.get('/api/clubs/', {'search': 'riverside'})
+                self.assertEqual(set(self.names(response)), {'Riverside Tennis Club', 'Riverside Private Courts'})
+
+                # The club search composes with the other filters
+                response = self.client.get('/api/clubs/', {'search': 'riverside', 'is_approved': 'false'})
+                self.assertEqual(self.names(response), ['Riverside Private Courts'])
+
+    def test_autocomplete(self):
+        self.login(self.player)
+        response = self.client.get('/api/clubs/autocomplete/', {'q': 'Oakw'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([club['name'] for club in response.data], ['Oakwood Tennis Center'])
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'city', 'state'})
+
+        response = self.client.get('/api/clubs/autocomplete/', {'q': 'riv'})
+        self.assertNotIn('Riverside Private Courts', [club['name'] for club in response.data])
+        self.assertEqual(self.client.get('/api/clubs/autocomplete/', {'q': ' '}).data, [])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Ranked club search is PostgreSQL only')
+class RankedClubSearchTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Club.objects.bulk_create([
+            Club(name=name, address='1 Main St', city=city, state='IL', zip_code='62701', is_approved=True)
+            for name, city in [
+                ('Riverside Tennis Club', 'Springfield'),
+                ('Lakeside Racquet Club', 'Riverton'),
+                ('Oakwood Tennis Center', 'Portland'),
+            ]
+        ] + [
+            Club(name=f'Filler Club {number}', address='1 Main St', city='Chicago', state='IL', zip_code='60601')
+            for number in range(200)
+        ])
+
+    def names(self, text):
+        return list(search_clubs(Club.objects.all(), text).values_list('name', flat=True))
+
+    def test_prefix_typo_and_ranking(self):
+        self.assertEqual(set(self.names('tenn')), {'Oakwood Tennis Center', 'Riverside Tennis Club'})
+        self.assertEqual(self.names('rivrside'), ['Riverside Tennis Club'])
+        # A name match ranks above a city match
+        self.assertEqual(self.names('river')[0], 'Riverside Tennis Club')
+        self.assertIn('Lakeside Racquet Club', self.names('river'))
+
+    def test_search_uses_the_gin_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE api_club')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        queryset = search_clubs(Club.objects.filter(is_approved=True), 'rivrside tennis')
+        indexes, nodes = set(), [json.loads(queryset.explain(format='json'))[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if 'Index Name' in node:
+                indexes.add(node['Index Name'])
+            nodes.extend(node.get('Plans', []))
+        self.assertLessEqual({'club_search_vector_idx', 'club_name_trgm_idx'}, indexes)
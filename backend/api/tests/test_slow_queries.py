@@ -0,0 +1,108 @@
+import json
+from datetime import date, time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.models import Booking, Club, Court
+from api import slow_queries
+from api.slow_queries import fingerprint, query_log
+from api.tokens import ClaimsRefreshToken
+
+
+class FingerprintTest(SimpleTestCase):
+    def test_values_do_not_split_a_statement(self):
+        first = fingerprint(
+            "SELECT * FROM \"api_booking\" WHERE \"court_id\" IN (%s, %s, %s) AND \"note\" = 'it''s' LIMIT 21")
+        second = fingerprint("SELECT *  FROM \"api_booking\"\nWHERE \"court_id\" IN (%s) AND \"note\" = 'x' LIMIT 5")
+        self.assertEqual(first, second)
+        self.assertEqual(first[1], 'SELECT * FROM "api_booking" WHERE "court_id" IN (...) AND "note" = ? LIMIT ?')
+
+    def test_identifiers_and_rows(self):
+        key, normalised = fingerprint('INSERT INTO "api_booking_2025_03" ("a", "b") VALUES (%s, %s), (%s, %s)')
+        self.assertEqual(normalised, 'INSERT INTO "api_booking_2025_03" ("a", "b") VALUES (?, ?), ...')
+        self.assertNotEqual(key, fingerprint('SELECT 1')[0])
+
+
+@override_settings(SLOW_QUERY_MS=0)
+class SlowQueryLogTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        query_log.reset()
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com',
+                                                   password='securepassword123')
+        self.player = User.objects.create_user(username='player', password='securepassword123')
+        club = Club.objects.create(name='Home Club', address='1 Main St', city='Springfield', state='IL',
+                                   zip_code='62701', is_approved=True)
+        court = Court.objects.create(club=club, court_type='hard', court_number=1)
+        Booking.objects.create(court=court, user=self.player, booking_date=date(2025, 3, 5), start_time=time(10),
+                               end_time=time(11), status='confirmed')
+
+    def login(self, user):
+        token = ClaimsRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def calendar(self):
+        self.login(self.player)
+        response = self.client.get('/api/bookings/calendar/', {'start_date': '2025-03-01', 'end_date': '2025-03-31'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_top_offenders_with_plans(self):
+        self.calendar()
+        self.calendar()
+        self.login(self.admin)
+        response = self.client.get('/api/slow-queries/', {'order': 'count', 'limit': 50})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        calendar = next(entry for entry in response.data
+                        if entry['fingerprint'].startswith('SELECT') and 'api_booking' in entry['fingerprint']
+                        and '"booking_date" >= ?' in entry['fingerprint'])
+        self.assertEqual(calendar['count'], 2)
+        self.assertEqual(calendar['slow'], 2)
+        self.assertIn('api_booking', calendar['explain'])
+        counts = [entry['count'] for entry in response.data]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        # The EXPLAIN itself is not logged
+        self.assertFalse(any('EXPLAIN' in entry['fingerprint'] for entry in response.data))
+
+    def test_plans_are_captured_after_the_request(self):
+        list(Booking.objects.filter(booking_date__gte=date(2025, 3, 1)))
+        # Queued by the statement, not explained while it ran
+        self.assertTrue(query_log.pending)
+        self.assertFalse(any(entry['explain'] for entry in query_log.snapshot().values()))
+
+        with mock.patch('api.slow_queries.explain', wraps=slow_queries.explain) as explain:
+            query_log.capture_plans()
+        self.assertEqual(query_log.pending, [])
+        # Plain EXPLAIN unless ANALYZE is asked for
+        self.assertTrue(all(call.kwargs == {'analyze': False} for call in explain.call_args_list))
+        booking = next(entry for entry in query_log.snapshot().values()
+                       if '"booking_date" >= ?' in entry['fingerprint'])
+        self.assertIn('api_booking', booking['explain'])
+
+    def test_staff_only(self):
+        self.login(self.player)
+        self.assertEqual(self.client.get('/api/slow-queries/').status_code, status.HTTP_403_FORBIDDEN)
+        self.login(self.admin)
+        self.assertEqual(self.client.get('/api/slow-queries/', {'order': 'name'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_command(self):
+        self.calendar()
+        output = StringIO()
+        call_command('slow_queries', json=True, stdout=output)
+        entries = json.loads(output.getvalue())
+        self.assertTrue(entries)
+        self.assertTrue(all(entry['count'] > 0 for entry in entries))
+
+        output = StringIO()
+        call_command('slow_queries', stdout=output)
+        self.assertIn('1. [', output.getvalue())
+
+        call_command('slow_queries', reset=True, stdout=StringIO())
+        self.assertEqual(query_log.snapshot(), {})
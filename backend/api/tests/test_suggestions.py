@@ -0,0 +1,146 @@
+from datetime import date, time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.club_config import club_configs, get_club_config
+from api.models import Booking, Club, ClubSpecialHours, Court, CourtAvailabilityRestriction
+from api.suggestions import IntervalIndex, slot_duration, suggest_slots
+from api.tokens import ClaimsRefreshToken
+
+
+class SuggestionsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        club_configs.clear()
+        self.player = User.objects.create_user(username='player', password='securepassword123')
+        self.club = Club.objects.create(name='Home Club', address='1 Main St', city='Springfield', state='IL',
+                                        zip_code='62701', is_approved=True)
+        self.court = Court.objects.create(club=self.club, court_type='hard', court_number=1)
+        self.other = Court.objects.create(club=self.club, court_type='hard', court_number=2)
+        Court.objects.create(club=self.club, court_type='clay', court_number=3)
+        self.day = date.today() + timedelta(days=5)
+        self.book(self.court, time(10), time(11))
+        token = ClaimsRefreshToken.for_user(self.player).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def book(self, court, start_time, end_time, day=None):
+        return Booking.objects.create(user=self.player, court=court, booking_date=day or self.day,
+                                      start_time=start_time, end_time=end_time, status='confirmed')
+
+    def slots(self, suggestions):
+        return [(slot['court'], slot['booking_date'], slot['start_time'], slot['end_time']) for slot in suggestions]
+
+    def test_conflict_response_lists_alternatives(self):
+        data = {'court': self.court.id, 'booking_date': self.day.isoformat(), 'start_time': '10:30',
+                'end_time': '11:30'}
+        response = self.client.post('/api/bookings/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('already booked', response.data['non_field_errors'][0])
+        suggestion = response.data['suggestions'][0]
+        self.assertEqual(self.slots([suggestion]), [(self.other.id, self.day.isoformat(), '10:30:00', '11:30:00')])
+
+        # Each suggestion can be booked as it is
+        response = self.client.post('/api/bookings/', suggestion, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_ranked_by_closeness(self):
+        day = self.day.isoformat()
+        self.assertEqual(self.slots(suggest_slots(self.court, self.day, time(10), 60)), [
+            # Same time on the other court, then half an hour either side
+            (self.other.id, day, '10:00:00', '11:00:00'),
+            (self.other.id, day, '09:30:00', '10:30:00'),
+            (self.other.id, day, '10:30:00', '11:30:00'),
+            # An hour away, on the requested court first
+            (self.court.id, day, '09:00:00', '10:00:00'),
+            (self.court.id, day, '11:00:00', '12:00:00'),
+        ])
+
+    def test_nearby_days_when_the_day_is_full(self):
+        self.book(self.court, time(8), time(10))
+        self.book(self.court, time(11), time(20))
+        self.book(self.other, time(8), time(20))
+        before, after = (str(self.day + timedelta(days=offset)) for offset in (-1, 1))
+        self.assertEqual(self.slots(suggest_slots(self.court, self.day, time(10), 60, limit=4)), [
+            (self.court.id, before, '10:00:00', '11:00:00'),
+            (self.court.id, after, '10:00:00', '11:00:00'),
+            (self.other.id, before, '10:00:00', '11:00:00'),
+            (self.other.id, after, '10:00:00', '11:00:00'),
+        ])
+
+    def test_days_outside_the_booking_window(self):
+        far = date.today() + timedelta(days=self.club.max_advance_booking_days + 4)
+        self.assertEqual(suggest_slots(self.court, far, time(10), 60), [])
+        past = date.today() - timedelta(days=4)
+        self.assertEqual(suggest_slots(self.court, past, time(10), 60), [])
+
+    def test_durations_follow_the_club_rules(self):
+        club = get_club_config(self.club.id)
+        self.assertEqual(slot_duration(club), 60)
+        self.assertEqual(slot_duration(club, 40), 60)
+        self.assertEqual(slot_duration(club, 75), 90)
+        self.assertEqual(slot_duration(club, 180), 120)
+        Club.objects.filter(pk=self.club.id).update(booking_increment=45)
+        club_configs.clear()
+        self.assertEqual(slot_duration(get_club_config(self.club.id), 100), 100)
+
+    def test_special_hours_and_restrictions(self):
+        # The other court is under maintenance at 10 on this weekday, and the club is closed the day after
+        CourtAvailabilityRestriction.objects.create(court=self.other, weekday=self.day.weekday(),
+                                                    start_time=time(9, 30), end_time=time(11))
+        ClubSpecialHours.objects.create(club=self.club, date=self.day + timedelta(days=1), is_closed=True)
+        # Two days before it opens late
+        ClubSpecialHours.objects.create(club=self.club, date=self.day - timedelta(days=2),
+                                        opening_time=time(12, 0))
+        day = self.day.isoformat()
+        self.assertEqual(self.slots(suggest_slots(self.court, self.day, time(10), 60, limit=3)), [
+            (self.court.id, day, '09:00:00', '10:00:00'),
+            (self.court.id, day, '11:00:00', '12:00:00'),
+            (self.other.id, day, '11:00:00', '12:00:00'),
+        ])
+
+        self.book(self.court, time(8), time(10))
+        self.book(self.court, time(11), time(20))
+        self.book(self.other, time(8), time(20))
+        suggestions = suggest_slots(self.court, self.day, time(10), 60, limit=500)
+        dates = {slot['booking_date'] for slot in suggestions}
+        self.assertNotIn(str(self.day + timedelta(days=1)), dates)
+        early = str(self.day - timedelta(days=2))
+        self.assertEqual(min(slot['start_time'] for slot in suggestions if slot['booking_date'] == early), '12:00:00')
+
+    # The test process is the only worker, so its local memory cache counts as shared
+    @override_settings(SHARED_CACHE=True)
+    def test_one_query_per_source(self):
+        get_club_config(self.club.id)
+        # Bookings, restrictions and special hours
+        with self.assertNumQueries(3):
+            suggest_slots(self.court, self.day, time(10), 60)
+
+    def test_interval_index(self):
+        index = IntervalIndex([
+            (1, self.day, time(9), time(10)),
+            (1, self.day, time(9, 30), time(11)),
+            (1, self.day, time(12), time(13)),
+        ])
+        self.assertEqual(index.starts[(1, self.day)], [540, 720])
+        self.assertTrue(index.is_free(1, self.day, 660, 720))
+        self.assertFalse(index.is_free(1, self.day, 630, 690))
+        self.assertFalse(index.is_free(1, self.day, 480, 800))
+        self.assertTrue(index.is_free(2, self.day, 540, 600))
+
+    def test_suggest_action(self):
+        response = self.client.get('/api/bookings/suggest/', {
+            'court': self.court.id, 'date': self.day.isoformat(), 'start_time': '10:00', 'end_time': '12:00'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.slots(response.data['suggestions'][:1]),
+                         [(self.other.id, self.day.isoformat(), '10:00:00', '12:00:00')])
+
+        response = self.client.get('/api/bookings/suggest/', {'court': self.court.id, 'date': 'tomorrow',
+                                                               'start_time': '10:00'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/bookings/suggest/', {'court': self.court.id + 100,
+                                                               'date': self.day.isoformat(), 'start_time': '10:00'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
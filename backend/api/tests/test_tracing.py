@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APIClient, APITestCase
+
+from api import tracing
+from api.models import Club, Court
+from api.tokens import ClaimsRefreshToken
+
+
+class TracingTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='player', password='securepassword123')
+        club = Club.objects.create(name='Home Club', address='1 Main St', city='Springfield', state='IL',
+                                   zip_code='62701', is_approved=True)
+        Court.objects.create(club=club, court_type='hard', court_number=1)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'traces.jsonl')
+
+    def traced_get(self, path, sample_rate=1.0):
+        with override_settings(TRACING_SAMPLE_RATE=sample_rate, TRACING_FILE=self.path, TRACING_BATCH_SIZE=10_000):
+            # A new client, since clients keep the middleware they were built with
+            client = APIClient()
+            token = ClaimsRefreshToken.for_user(self.user).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            response = client.get(path)
+            tracing.exporter.flush()
+        self.assertEqual(response.status_code, 200)
+
+    def spans(self):
+        with open(self.path) as lines:
+            return [span for line in lines
+                    for resource in json.loads(line)['resourceSpans']
+                    for scope in resource['scopeSpans']
+                    for span in scope['spans']]
+
+    def test_viewset_request_spans_are_nested(self):
+        self.traced_get('/api/courts/')
+        spans = self.spans()
+        by_id = {span['spanId']: span for span in spans}
+        root = next(span for span in spans if not span['parentSpanId'])
+        self.assertEqual(root['name'], 'GET court-list')
+        self.assertEqual(root['kind'], tracing.SERVER)
+        self.assertEqual({span['traceId'] for span in spans}, {root['traceId']})
+
+        names = {span['name'] for span in spans}
+        for name in ('drf.authenticate', 'auth.jwt', 'drf.check_permissions', 'view.get_queryset', 'db.query',
+                     'serializer.to_representation', 'render.json'):
+            self.assertIn(name, names)
+        jwt = next(span for span in spans if span['name'] == 'auth.jwt')
+        self.assertEqual(by_id[jwt['parentSpanId']]['name'], 'drf.authenticate')
+        query = next(span for span in spans if span['name'] == 'db.query')
+        statement = next(item for item in query['attributes'] if item['key'] == 'db.statement')
+        self.assertIn('SELECT', statement['value']['stringValue'])
+        # Every span hangs off the root and ends after it starts
+        for span in spans:
+            parent = span
+            while parent['parentSpanId']:
+                parent = by_id[parent['parentSpanId']]
+            self.assertIs(parent, root)
+            self.assertGreaterEqual(int(span['endTimeUnixNano']), int(span['startTimeUnixNano']))
+
+    def test_async_view_queries_are_traced(self):
+        self.traced_get('/api/clubs/')
+        names = [span['name'] for span in self.spans()]
+        self.assertIn('GET club-list-async', names)
+        self.assertIn('db.query', names)
+
+    def test_unsampled_requests_write_nothing(self):
+        self.traced_get('/api/courts/', sample_rate=1e-12)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_report(self):
+        self.traced_get('/api/courts/')
+        self.traced_get('/api/courts/')
+        output = StringIO()
+        call_command('trace_report', self.path, min_percent=0, stdout=output)
+        report = output.getvalue()
+        self.assertIn('GET court-list: 2 requests', report)
+        self.assertIn('    drf.check_permissions', report)
+        self.assertIn('db.query', report)
+
+        trace_id = self.spans()[0]['traceId']
+        output = StringIO()
+        call_command('trace_report', self.path, trace=trace_id, stdout=output)
+        self.assertIn('db.query: SELECT', output.getvalue())
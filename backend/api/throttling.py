@@ -0,0 +1,237 @@
+"""
+Token-bucket throttles keyed by user and by club.
+
+Views opt in with a ``throttle_scopes`` mapping of action name to scope,
+and the rates for each scope come from ``TOKEN_BUCKET_THROTTLES`` in
+settings::
+
+    TOKEN_BUCKET_THROTTLES = {
+        'availability': {'user': '60/min', 'club': '1200/min'},
+    }
+
+A rate of ``N/period`` is a bucket holding N tokens that refills at N per
+period, so clients can burst up to N requests and then continue at the
+sustained rate. DRF checks throttles right after authentication and
+permissions, so rejected requests never reach the database.
+
+Buckets live in the Django cache by default so every worker shares them
+(TOKEN_BUCKET_STORE = 'cache'); 'local' keeps them in process memory.
+Cached buckets are read and written under a short lock taken with
+cache.add, so concurrent requests cannot all spend the same token.
+Allowed/throttled counts per scope are kept in the cache for monitoring.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from .club_config import get_club_config
+from .models import Court
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# How long a bucket's lock may be held, and waited for
+LOCK_SECONDS = 1
+LOCK_WAIT_SECONDS = 0.5
+LOCK_POLL_SECONDS = 0.002
+
+COUNTER_KEY = 'throttle:count:{scope}:{kind}:{outcome}'
+
+
+def parse_rate(rate):
+    """Turn 'N/period' into (capacity, tokens per second)"""
+    if rate is None:
+        return None
+    count, period = rate.split('/')
+    seconds = PERIODS[period[0]]
+    return int(count), int(count) / seconds
+
+
+class LocalBucketStore:
+    """Buckets held in this process only"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def consume(self, key, capacity, refill_rate):
+        """Take one token; return (allowed, seconds until the next token)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+        return allowed, 0 if allowed else (1 - tokens) / refill_rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """Buckets shared between workers through the Django cache"""
+
+    def consume(self, key, capacity, refill_rate):
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while not cache.add(lock_key, 1, timeout=LOCK_SECONDS):
+            if time.monotonic() >= deadline:
+                # Too contended to count: refuse rather than let the request through unmetered
+                return False, LOCK_WAIT_SECONDS
+            time.sleep(LOCK_POLL_SECONDS)
+        try:
+            now = time.time()
+            tokens, updated = cache.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0, now - updated) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # Expire once the bucket would have refilled anyway
+            cache.set(key, (tokens, now), timeout=int(capacity / refill_rate) + 1)
+        finally:
+            cache.delete(lock_key)
+        return allowed, 0 if allowed else (1 - tokens) / refill_rate
+
+    def clear(self):
+        pass
+
+
+local_store = LocalBucketStore()
+cache_store = CacheBucketStore()
+
+
+def get_store():
+    if getattr(settings, 'TOKEN_BUCKET_STORE', 'cache') == 'local':
+        return local_store
+    return cache_store
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_throttle_counters():
+    """Allowed and throttled request counts for every configured scope"""
+    rates = getattr(settings, 'TOKEN_BUCKET_THROTTLES', {})
+    keys = {
+        (scope, kind, outcome): COUNTER_KEY.format(scope=scope, kind=kind, outcome=outcome)
+        for scope, kinds in rates.items()
+        for kind in kinds
+        for outcome in ('allowed', 'throttled')
+    }
+    values = cache.get_many(keys.values())
+    counters = {}
+    for (scope, kind, outcome), key in keys.items():
+        counters.setdefault(scope, {}).setdefault(kind, {})[outcome] = values.get(key, 0)
+    return counters
+
+
+def club_id_for_court(court_id):
+    """Club of a court, cached since courts never move between clubs"""
+    try:
+        court_id = int(court_id)
+    except (TypeError, ValueError):
+        return None
+    key = f'throttle:court-club:{court_id}'
+    club_id = cache.get(key)
+    if club_id is None:
+        club_id = Court.objects.filter(pk=court_id).values_list('club_id', flat=True).first()
+        if club_id is not None:
+            cache.set(key, club_id, timeout=None)
+    return club_id
+
+
+def known_club_id(club_id):
+    """
+    A club ID taken from the request, if it names a club: made-up IDs get no
+    bucket of their own, nor a cache key
+    """
+    club = get_club_config(club_id)
+    return club.id if club is not None else None
+
+
+def get_rate(scope, kind):
+    """(capacity, tokens per second) for the scope and key kind, or None"""
+    return parse_rate(getattr(settings, 'TOKEN_BUCKET_THROTTLES', {}).get(scope, {}).get(kind))
+
+
+def consume(scope, kind, ident):
+    """
+    Take a token from the scope's bucket for this user or club.
+    Returns (allowed, seconds to wait); scopes without a rate always pass.
+    """
+    rate = get_rate(scope, kind)
+    if rate is None or ident is None:
+        return True, None
+
+    capacity, refill_rate = rate
+    allowed, wait = get_store().consume(f'throttle:{scope}:{kind}:{ident}', capacity, refill_rate)
+    outcome = 'allowed' if allowed else 'throttled'
+    _increment(COUNTER_KEY.format(scope=scope, kind=kind, outcome=outcome))
+    return allowed, wait
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class; subclasses choose what the bucket is keyed by"""
+    kind = None
+
+    def get_bucket_ident(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self._wait = None
+        scope = getattr(view, 'throttle_scopes', {}).get(getattr(view, 'action', None))
+        if scope is None or get_rate(scope, self.kind) is None:
+            return True
+        ident = self.get_bucket_ident(request, view)
+        allowed, self._wait = consume(scope, self.kind, ident)
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class TokenBucketViewMixin:
+    """
+    For views with several token bucket throttles: stop at the first one
+    that refuses, as the async views' throttle() does. DRF asks every
+    throttle, so a user over their own limit would still drain the club's
+    bucket for everyone else.
+    """
+
+    def check_throttles(self, request):
+        for throttle in self.get_throttles():
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per authenticated user (per client IP for anonymous requests)"""
+    kind = 'user'
+
+    def get_bucket_ident(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return self.get_ident(request)
+
+
+class ClubTokenBucketThrottle(TokenBucketThrottle):
+    """One bucket per club, shared by everyone hitting that club"""
+    kind = 'club'
+
+    def get_bucket_ident(self, request, view):
+        if hasattr(view, 'get_throttle_club_id'):
+            club_id = view.get_throttle_club_id(request)
+            try:
+                return int(club_id)
+            except (TypeError, ValueError):
+                return None
+        return None
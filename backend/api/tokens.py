@@ -0,0 +1,110 @@
+"""
+JWT tokens that carry the user's roles and managed clubs as claims.
+
+Every issued token records the user's current token version. The version
+lives in the cache and is replaced whenever the user's groups, managed
+clubs or account flags change (see api.signals), so stale claims are
+detected with a cache lookup instead of a database query. Stale access
+tokens fall back to a database-backed user; stale refresh tokens get
+their claims rebuilt on the next refresh.
+
+That needs a cache every worker shares: with a per-process one, a role
+change seen by one worker would go unnoticed by the others. Unless
+settings.SHARED_CACHE is on, no version counts as current, so every token
+authenticates against the database and every refresh rebuilds its claims.
+"""
+import secrets
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .blacklist import blacklist_filter
+
+ROLES_CLAIM = 'roles'
+CLUBS_CLAIM = 'clubs'
+VERSION_CLAIM = 'ver'
+
+TOKEN_VERSION_KEY = 'auth:token-version:{}'
+
+
+def get_token_version(user_id):
+    """Current token version for the user, or None if unknown or the cache isn't shared"""
+    if not getattr(settings, 'SHARED_CACHE', False):
+        return None
+    return cache.get(TOKEN_VERSION_KEY.format(user_id))
+
+
+def bump_token_version(user_id):
+    """Invalidate the claims of every token issued to the user so far"""
+    # Random versions (rather than a counter) mean a flushed cache can never
+    # make an old token look current again.
+    cache.set(TOKEN_VERSION_KEY.format(user_id), secrets.token_hex(4), timeout=None)
+
+
+def _ensure_token_version(user_id):
+    key = TOKEN_VERSION_KEY.format(user_id)
+    cache.add(key, secrets.token_hex(4), timeout=None)
+    return cache.get(key)
+
+
+def build_claims(user):
+    """Claims describing the user's identity, roles and managed clubs"""
+    return {
+        'username': user.get_username(),
+        'is_superuser': user.is_superuser,
+        'is_staff': user.is_staff,
+        ROLES_CLAIM: sorted(user.groups.values_list('name', flat=True)),
+        CLUBS_CLAIM: sorted(user.managed_clubs.values_list('id', flat=True)),
+        VERSION_CLAIM: _ensure_token_version(user.pk),
+    }
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token whose claims are copied into every access token it issues"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.payload.update(build_claims(user))
+        return token
+
+    def refresh_claims(self):
+        """Rebuild the claims from the database if the user's version moved on"""
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+        version = self.payload.get(VERSION_CLAIM)
+        if version is not None and version == get_token_version(user_id):
+            return
+
+        user = User.objects.filter(pk=user_id, is_active=True).first()
+        if user is None:
+            raise TokenError(_('User not found or inactive'))
+        self.payload.update(build_claims(user))
+
+    @property
+    def access_token(self):
+        self.refresh_claims()
+        return super().access_token
+
+    def check_blacklist(self):
+        # Only confirm against the blacklist table when the filter can't rule it out
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_filter.note_blacklisted(self.payload[api_settings.JTI_CLAIM])
+        return result
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
@@ -0,0 +1,327 @@
+"""
+Request tracing: nested timing spans for a sample of requests.
+
+TracingMiddleware opens a root span for a TRACING_SAMPLE_RATE fraction of
+requests, and the hooks installed by instrument() add child spans for DRF
+authentication (with the JWT check inside it), permission checks, each
+view's get_queryset, every SQL query, serializer output and JSON rendering.
+Finished traces are buffered and appended to TRACING_FILE in batches, one
+OTLP/JSON document (the OpenTelemetry file exporter format) per line, and
+the file rotates at TRACING_MAX_BYTES. `manage.py trace_report` turns it
+into a flame-style text report.
+
+With the sample rate at 0 (the default) the middleware removes itself and
+nothing is hooked. Otherwise a request outside the sample pays for one
+context variable lookup per hook it passes through.
+"""
+import atexit
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import get_resolver
+
+SCOPE = 'api.tracing'
+SERVICE_NAME = 'tennis-booking'
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_ERROR = 2
+STATEMENT_WIDTH = 2000
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent_id', 'kind', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name, parent_id, kind, attributes):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.error = None
+        self.start = time.time_ns()
+        self.end = None
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+
+    def start(self, name, kind=INTERNAL, attributes=None):
+        parent = _active.get()
+        span = Span(name, parent.span_id if parent else None, kind, attributes)
+        self.spans.append(span)
+        return span
+
+
+_trace = ContextVar('trace', default=None)
+_active = ContextVar('trace_span', default=None)
+
+
+def traced(name, function, describe=None, kind=INTERNAL, collapse=False):
+    """
+    `function` recorded as a span while a trace is active. describe(*args)
+    gives the span's attributes; with `collapse`, calls made inside a span of
+    the same name (an override calling super()) don't open another.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        trace = _trace.get()
+        if trace is None:
+            return function(*args, **kwargs)
+        active = _active.get()
+        if collapse and active is not None and active.name == name:
+            return function(*args, **kwargs)
+        span = trace.start(name, kind, describe(*args) if describe else None)
+        token = _active.set(span)
+        try:
+            return function(*args, **kwargs)
+        except Exception as exc:
+            span.error = f'{type(exc).__name__}: {exc}'
+            raise
+        finally:
+            _active.reset(token)
+            span.end = time.time_ns()
+    wrapper.__traced__ = True
+    return wrapper
+
+
+def trace_query(execute, sql, params, many, context):
+    """Execute wrapper recording each query of a traced request as a span"""
+    trace = _trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    connection = context['connection']
+    span = trace.start('db.query', CLIENT, {
+        'db.system': connection.vendor,
+        'db.name': connection.alias,
+        'db.statement': sql[:STATEMENT_WIDTH],
+    })
+    try:
+        return execute(sql, params, many, context)
+    except Exception as exc:
+        span.error = f'{type(exc).__name__}: {exc}'
+        raise
+    finally:
+        span.end = time.time_ns()
+
+
+def install_query_tracer(sender, connection, **kwargs):
+    if trace_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(trace_query)
+
+
+def subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from subclasses(subclass)
+
+
+def wrap(cls, attribute, name, **options):
+    function = vars(cls)[attribute]
+    if not getattr(function, '__traced__', False):
+        setattr(cls, attribute, traced(name, function, **options))
+
+
+def serializer_name(serializer):
+    return {'serializer': type(getattr(serializer, 'child', serializer)).__name__}
+
+
+_instrumented = False
+
+
+def instrument():
+    """Hook the spans into DRF, the views and the database connections; idempotent"""
+    global _instrumented
+    if _instrumented:
+        return
+    _instrumented = True
+
+    from rest_framework.generics import GenericAPIView
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.serializers import BaseSerializer
+    from rest_framework.views import APIView
+    from .authentication import ClaimsJWTAuthentication
+
+    wrap(APIView, 'perform_authentication', 'drf.authenticate')
+    wrap(ClaimsJWTAuthentication, 'authenticate', 'auth.jwt')
+    wrap(APIView, 'check_permissions', 'drf.check_permissions')
+    wrap(APIView, 'check_object_permissions', 'drf.check_object_permissions')
+    # Views override get_queryset, so each definition is wrapped once the URLconf has imported them
+    get_resolver().url_patterns
+    for cls in [GenericAPIView, *subclasses(GenericAPIView)]:
+        if 'get_queryset' in vars(cls):
+            wrap(cls, 'get_queryset', 'view.get_queryset', collapse=True,
+                 describe=lambda view: {'view': type(view).__name__})
+    # Serializer.data and ListSerializer.data both end in BaseSerializer.data
+    BaseSerializer.data = property(traced('serializer.to_representation', BaseSerializer.data.fget,
+                                          describe=serializer_name, collapse=True))
+    wrap(JSONRenderer, 'render', 'render.json', collapse=True)
+
+    connection_created.connect(install_query_tracer)
+    for connection in connections.all(initialized_only=True):
+        install_query_tracer(None, connection)
+
+
+def attribute_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        # OTLP/JSON carries 64-bit integers as strings
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def encode(trace_id, span):
+    encoded = {
+        'traceId': trace_id,
+        'spanId': span.span_id,
+        'parentSpanId': span.parent_id or '',
+        'name': span.name,
+        'kind': span.kind,
+        'startTimeUnixNano': str(span.start),
+        'endTimeUnixNano': str(span.end or span.start),
+        'attributes': [{'key': key, 'value': attribute_value(value)} for key, value in span.attributes.items()],
+        'status': {},
+    }
+    if span.error:
+        encoded['status'] = {'code': STATUS_ERROR, 'message': span.error}
+    return encoded
+
+
+def document(spans):
+    """One OTLP/JSON export request holding `spans`"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [
+            {'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}},
+            {'key': 'service.instance.id', 'value': {'stringValue': f'{os.uname().nodename}:{os.getpid()}'}},
+        ]},
+        'scopeSpans': [{'scope': {'name': SCOPE}, 'spans': spans}],
+    }]}
+
+
+class BatchExporter:
+    """Buffers finished traces and appends them to the trace file in batches"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self.handler = None
+
+    def add(self, trace):
+        spans = [encode(trace.trace_id, span) for span in trace.spans]
+        with self.lock:
+            self.pending.extend(spans)
+            due = (len(self.pending) >= getattr(settings, 'TRACING_BATCH_SIZE', 512)
+                   or time.monotonic() - self.last_flush >= getattr(settings, 'TRACING_FLUSH_SECONDS', 5))
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            spans, self.pending = self.pending, []
+            self.last_flush = time.monotonic()
+        if spans:
+            record = logging.makeLogRecord({'msg': json.dumps(document(spans), separators=(',', ':'))})
+            self.file_handler().handle(record)
+
+    def file_handler(self):
+        path = str(settings.TRACING_FILE)
+        if self.handler is None or self.handler.baseFilename != os.path.abspath(path):
+            if self.handler is not None:
+                self.handler.close()
+            self.handler = RotatingFileHandler(
+                path, maxBytes=getattr(settings, 'TRACING_MAX_BYTES', 10 * 1024 * 1024),
+                backupCount=getattr(settings, 'TRACING_BACKUP_COUNT', 5), encoding='utf-8',
+            )
+        return self.handler
+
+
+exporter = BatchExporter()
+atexit.register(exporter.flush)
+
+
+class TracingMiddleware:
+    """Traces a sample of requests, with a root span covering the rest of the stack"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'TRACING_SAMPLE_RATE', 0)
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        instrument()
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        trace, root, tokens = self._begin(request)
+        try:
+            response = self.get_response(request)
+        except Exception as exc:
+            root.error = f'{type(exc).__name__}: {exc}'
+            raise
+        else:
+            self._label(request, response, root)
+        finally:
+            self._finish(trace, root, tokens)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+        trace, root, tokens = self._begin(request)
+        try:
+            response = await self.get_response(request)
+        except Exception as exc:
+            root.error = f'{type(exc).__name__}: {exc}'
+            raise
+        else:
+            self._label(request, response, root)
+        finally:
+            self._finish(trace, root, tokens)
+        return response
+
+    def _begin(self, request):
+        trace = Trace()
+        trace_token = _trace.set(trace)
+        root = trace.start(request.method, SERVER, {
+            'http.request.method': request.method,
+            'url.path': request.path,
+        })
+        return trace, root, (trace_token, _active.set(root))
+
+    def _label(self, request, response, root):
+        match = getattr(request, 'resolver_match', None)
+        if match:
+            root.name = f'{request.method} {match.view_name or match._func_path}'
+            root.attributes['http.route'] = match.route
+        root.attributes['http.response.status_code'] = response.status_code
+
+    def _finish(self, trace, root, tokens):
+        trace_token, active_token = tokens
+        _active.reset(active_token)
+        _trace.reset(trace_token)
+        root.end = time.time_ns()
+        exporter.add(trace)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
@@ -7,6 +8,10 @@ from rest_framework_simplejwt.views import (
 from .views import UserViewSet, LogoutView, RegisterView
 from .views.club_views import ClubViewSet, CourtViewSet
 from .views.booking_views import BookingViewSet
+from .views.monitoring_views import SlowQueriesView, ThrottleStatsView
+from .views.import_views import ClubImportView
+from .views import async_views
+from .metrics import metrics_view
 
 # Initialize the router
 router = DefaultRouter()
@@ -22,4 +27,16 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('api/logout/', LogoutView.as_view(), name='auth-logout'),
     path('api/register/', RegisterView.as_view(), name='register'),
-]
\ No newline at end of file
+    path('api/throttles/', ThrottleStatsView.as_view(), name='throttle-stats'),
+    path('api/slow-queries/', SlowQueriesView.as_view(), name='slow-queries'),
+    path('api/imports/clubs/', ClubImportView.as_view(), name='club-import'),
+    path('metrics/', metrics_view, name='metrics'),
+]
+# Async versions of the read-heavy endpoints take precedence over the router
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = [
+        path('api/clubs/', async_views.club_list, name='club-list-async'),
+        path('api/courts/<int:pk>/availability/', async_views.court_availability, name='court-availability-async'),
+        path('api/bookings/available_slots/', async_views.available_slots, name='booking-available-slots-async'),
+        path('api/bookings/calendar/', async_views.booking_calendar, name='booking-calendar-async'),
+    ] + urlpatterns
@@ -0,0 +1,302 @@
+"""
+Async versions of the read-heavy endpoints.
+
+Under ASGI these views await the ORM instead of holding a worker thread
+for the whole request. They answer on the same URLs as the viewset
+actions they replace (see api/urls.py and settings.ASYNC_READ_VIEWS) and
+apply the same authentication, visibility rules, throttles and response
+shapes: the scoping comes from api.roles, the available_slots payload
+from build_available_slots and the club list's pages and links from
+ClubViewSet's paginator, all shared with the sync viewsets. They only
+serve GET and HEAD; OPTIONS and every other method go to the viewset
+view the router would have used, so metadata and 405s are the same.
+
+Independent queries are awaited together with asyncio.gather.
+"""
+import asyncio
+import math
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Page
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from ..authentication import ClaimsJWTAuthentication
+from ..club_config import get_club_config
+from ..db_router import set_request_user
+from ..metrics import TimedJSONRenderer
+from ..models import Booking
+from ..response_cache import afetch, audience, cache_key, enabled
+from ..roles import aload_roles, visible_bookings, visible_clubs, visible_courts
+from ..search import search_clubs, search_terms
+from ..serializers import BookingSerializer, ClubSerializer
+from ..throttling import club_id_for_court, consume, known_club_id
+from .booking_views import BookingViewSet, build_available_slots
+from .club_views import ClubViewSet, CourtViewSet, club_list_tags
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    """A DRF Response rendered as JSON without going through an APIView"""
+    response = Response(data, status=status_code, headers=headers)
+    response.accepted_renderer = TimedJSONRenderer()
+    response.accepted_media_type = 'application/json'
+    response.renderer_context = {}
+    return response.render()
+
+
+def action_view(viewset, basename, name):
+    """The view the router serves a viewset's @action with"""
+    action = getattr(viewset, name)
+    return viewset.as_view(dict(action.mapping), basename=basename, detail=action.detail, **action.kwargs)
+
+
+# For the methods the async views leave to the viewsets
+club_list_view = ClubViewSet.as_view({'get': 'list', 'post': 'create'}, basename='club', detail=False,
+                                     suffix='List')
+available_slots_view = action_view(BookingViewSet, 'booking', 'available_slots')
+booking_calendar_view = action_view(BookingViewSet, 'booking', 'calendar')
+court_availability_view = action_view(CourtViewSet, 'court', 'availability')
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+async def authenticate(request):
+    """
+    JWT authentication plus IsAuthenticated for async views.
+    Returns (user, None) or (None, error response).
+    """
+    auth = ClaimsJWTAuthentication()
+    www_authenticate = {'WWW-Authenticate': auth.authenticate_header(request)}
+    try:
+        header = auth.get_header(request)
+        raw_token = auth.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None, json_response(
+                {"detail": "Authentication credentials were not provided."},
+                status.HTTP_401_UNAUTHORIZED,
+                headers=www_authenticate,
+            )
+        token = auth.get_validated_token(raw_token)
+        # Current claims need no database; stale ones fall back to the user row
+        user = auth.get_claims_user(token)
+        if user is None:
+            user = await sync_to_async(auth.get_user)(token)
+    except APIException as exc:
+        detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+        return None, json_response(detail, exc.status_code, headers=www_authenticate)
+
+    set_request_user(user.pk)
+    await aload_roles(user)
+    return user, None
+
+
+async def throttle(user, scope, club_id):
+    """Apply the user and club token buckets; returns a 429 response or None"""
+    for kind, ident in (('user', user.pk), ('club', club_id)):
+        allowed, wait = await sync_to_async(consume)(scope, kind, ident)
+        if not allowed:
+            seconds = math.ceil(wait)
+            return json_response(
+                {"detail": f"Request was throttled. Expected available in {seconds} seconds."},
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(seconds)},
+            )
+    return None
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@csrf_exempt
+async def available_slots(request):
+    """Async BookingViewSet.available_slots"""
+    if request.method not in READ_METHODS:
+        return await sync_to_async(available_slots_view)(request)
+    user, error = await authenticate(request)
+    if error:
+        return error
+
+    club_id = request.GET.get('club_id')
+    court_type = request.GET.get('court_type', 'all')
+    date_str = request.GET.get('date')
+
+    if not club_id:
+        return json_response({"error": "Club ID is required"}, status.HTTP_400_BAD_REQUEST)
+
+    throttled = await throttle(user, 'availability', await sync_to_async(known_club_id)(club_id))
+    if throttled:
+        return throttled
+
+    # Parse date
+    try:
+        if date_str:
+            selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        else:
+            selected_date = datetime.now().date()
+    except ValueError:
+        return json_response({"error": "Invalid date format"}, status.HTTP_400_BAD_REQUEST)
+
+    bookings_query = Booking.objects.filter(
+        court__club_id=club_id,
+        court__is_active=True,
+        booking_date=selected_date,
+        status__in=Booking.ACTIVE_STATUSES,
+    )
+    if court_type and court_type != 'all':
+        bookings_query = bookings_query.filter(court__court_type=court_type)
+    bookings_query = bookings_query.order_by('start_time').only('court_id', 'start_time', 'end_time')
+
+    # The club's settings (usually cached in process) and the day's bookings don't depend on each other
+    club, bookings = await asyncio.gather(
+        sync_to_async(get_club_config)(club_id),
+        _list(bookings_query),
+    )
+    if club is None:
+        return json_response({"error": "Club not found"}, status.HTTP_404_NOT_FOUND)
+
+    return json_response(build_available_slots(club, club.active_courts(court_type), bookings))
+
+
+@csrf_exempt
+async def booking_calendar(request):
+    """Async BookingViewSet.calendar"""
+    if request.method not in READ_METHODS:
+        return await sync_to_async(booking_calendar_view)(request)
+    user, error = await authenticate(request)
+    if error:
+        return error
+
+    start_date = request.GET.get('start_date', datetime.now().date())
+    end_date = request.GET.get('end_date', datetime.now().date() + timedelta(days=30))
+    club_id = request.GET.get('club')
+
+    queryset = visible_bookings(user).filter(
+        booking_date__gte=start_date,
+        booking_date__lte=end_date
+    )
+    if club_id:
+        queryset = queryset.filter(court__club_id=club_id)
+
+    bookings = await _list(queryset.select_related('court__club', 'user'))
+    serializer = BookingSerializer(bookings, many=True, context={'request': request})
+    return json_response(serializer.data)
+
+
+@csrf_exempt
+async def court_availability(request, pk):
+    """Async CourtViewSet.availability"""
+    if request.method not in READ_METHODS:
+        return await sync_to_async(court_availability_view)(request, pk=pk)
+    user, error = await authenticate(request)
+    if error:
+        return error
+
+    throttled = await throttle(user, 'availability', await sync_to_async(club_id_for_court)(pk))
+    if throttled:
+        return throttled
+
+    start_date = request.GET.get('start_date', datetime.now().date())
+    end_date = request.GET.get('end_date', datetime.now().date() + timedelta(days=7))
+
+    courts = visible_courts(user)
+    club_id = request.GET.get('club')
+    if club_id:
+        courts = courts.filter(club_id=club_id)
+
+    bookings_query = Booking.objects.filter(
+        court_id=pk,
+        booking_date__gte=start_date,
+        booking_date__lte=end_date,
+        status__in=Booking.ACTIVE_STATUSES
+    ).select_related('court__club', 'user')
+
+    # Check visibility and fetch the bookings at the same time
+    court, bookings = await asyncio.gather(courts.filter(pk=pk).afirst(), _list(bookings_query))
+    if court is None:
+        return json_response({"detail": "No Court matches the given query."}, status.HTTP_404_NOT_FOUND)
+
+    return json_response(BookingSerializer(bookings, many=True).data)
+
+
+@csrf_exempt
+async def club_list(request):
+    """Async ClubViewSet.list; other methods go to the viewset"""
+    if request.method not in READ_METHODS:
+        return await sync_to_async(club_list_view)(request)
+    user, error = await authenticate(request)
+    if error:
+        return error
+
+    url = request.build_absolute_uri()
+    if request.method == 'GET' and enabled():
+        # Shares entries with ClubViewSet.list
+        entry = await afetch('club-list', cache_key('club-list', audience(user), url),
+                             lambda: club_list_page(request, user))
+        return json_response(entry['data'], entry['status'])
+    data, status_code, _ = await club_list_page(request, user)
+    return json_response(data, status_code)
+
+
+async def club_list_page(request, user):
+    """(data, status, response cache tags) of a club list request"""
+    queryset = visible_clubs(user)
+
+    # Same matching and ranking as ClubViewSet's ClubSearchFilter
+    search = request.GET.get('search', '')
+    queryset = search_clubs(queryset, search)
+
+    is_approved = request.GET.get('is_approved')
+    if is_approved in ('true', 'True', '1'):
+        queryset = queryset.filter(is_approved=True)
+    elif is_approved in ('false', 'False', '0'):
+        queryset = queryset.filter(is_approved=False)
+
+    if not search_terms(search):
+        queryset = queryset.order_by('pk')
+
+    # ClubViewSet's paginator, fed the count and page from the async queries
+    paginator = ClubViewSet.pagination_class()
+    paginator.request = Request(request)
+    page_size = paginator.get_page_size(paginator.request)
+    pages = paginator.django_paginator_class(queryset, page_size)
+    # get_page_number would count synchronously to resolve 'last'
+    page_number = paginator.request.query_params.get(paginator.page_query_param) or 1
+
+    def page_query(number):
+        offset = (number - 1) * page_size
+        return _list(queryset.prefetch_related('court_details')[offset:offset + page_size])
+
+    number = _as_int(page_number)
+    if number is not None and number >= 1:
+        # The count and the likely page don't depend on each other
+        count, clubs = await asyncio.gather(queryset.acount(), page_query(number))
+    else:
+        count, clubs = await queryset.acount(), None
+    pages.count = count
+    if page_number in paginator.last_page_strings:
+        page_number = pages.num_pages
+    try:
+        number = pages.validate_number(page_number)
+    except InvalidPage as exc:
+        detail = paginator.invalid_page_message.format(page_number=page_number, message=str(exc))
+        return {"detail": detail}, status.HTTP_404_NOT_FOUND, ()
+    if clubs is None:
+        clubs = await page_query(number)
+    paginator.page = Page(clubs, number, pages)
+
+    data = paginator.get_paginated_response(
+        ClubSerializer(clubs, many=True, context={'request': request}).data
+    ).data
+    return data, status.HTTP_200_OK, club_list_tags(data)
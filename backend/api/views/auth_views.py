@@ -2,9 +2,9 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.db import IntegrityError
 from ..serializers import *
+from ..tokens import ClaimsRefreshToken
 
 class RegisterView(APIView):
     def post(self, request):
@@ -12,7 +12,7 @@ class RegisterView(APIView):
         if serializer.is_valid():
             try:
                 user = serializer.save()
-                refresh = RefreshToken.for_user(user)
+                refresh = ClaimsRefreshToken.for_user(user)
                 response_data = {
                     'refresh': str(refresh),
                     'access': str(refresh.access_token),
@@ -31,7 +31,7 @@ class LogoutView(APIView):
           try:
                refresh_token = request.data.get("refresh_token")
                if refresh_token:
-                   token = RefreshToken(refresh_token)
+                   token = ClaimsRefreshToken(refresh_token)
                    token.blacklist()
                # Even if no token is provided, we'll consider the logout successful
                # since the frontend will clear local storage anyway
@@ -5,36 +5,88 @@ from rest_framework.decorators import action
 from django.db.models import Q
 from datetime import datetime, timedelta, time
 from django_filters.rest_framework import DjangoFilterBackend
-from ..models import Club, Court, Booking
+from ..authentication import load_full_user
+from ..club_config import get_club_config
+from ..models import Booking, Court
+from ..suggestions import minutes, suggest_slots
 from ..serializers import ClubSerializer, CourtSerializer, BookingSerializer
+from ..roles import has_role, visible_bookings
+from ..throttling import (
+    ClubTokenBucketThrottle, TokenBucketViewMixin, UserTokenBucketThrottle, club_id_for_court, known_club_id,
+)
 
 
-class BookingViewSet(viewsets.ModelViewSet):
+def build_available_slots(club, courts, bookings):
+    """
+    Shape the available_slots response: one entry per court with the club's
+    hours and settings and the court's booked ranges, ordered by start time.
+    `bookings` must already be ordered by start_time.
+    """
+    booked_ranges = {court.id: [] for court in courts}
+    for booking in bookings:
+        if booking.court_id in booked_ranges:
+            booked_ranges[booking.court_id].append({
+                "start": booking.start_time.strftime('%H:%M:%S'),
+                "end": booking.end_time.strftime('%H:%M:%S')
+            })
+    
+    # Generate time slots based on club's operating hours
+    operating_hours = {
+        "open": club.opening_time.strftime('%H:%M:%S'),
+        "close": club.closing_time.strftime('%H:%M:%S')
+    }
+    increment_minutes = club.booking_increment or 60  # Default to 60 minutes if not set
+    
+    return [
+        {
+            "court_id": court.id,
+            "court_number": court.court_number,
+            "court_type": court.court_type,
+            "operating_hours": operating_hours,
+            "booked_ranges": booked_ranges[court.id],
+            "booking_increment": increment_minutes,
+            "min_duration": club.min_booking_duration,
+            "max_duration": club.max_booking_duration
+        }
+        for court in courts
+    ]
+
+
+class BookingViewSet(TokenBucketViewMixin, viewsets.ModelViewSet):
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['court', 'booking_date', 'status']
     search_fields = ['court__club__name', 'notes']
+    throttle_classes = [UserTokenBucketThrottle, ClubTokenBucketThrottle]
+    # Rates per scope are set in settings.TOKEN_BUCKET_THROTTLES
+    throttle_scopes = {
+        'available_slots': 'availability',
+        'suggest': 'availability',
+        'create': 'booking',
+    }
+    
+    def get_throttle_club_id(self, request):
+        """Club targeted by the request, for the per-club throttle"""
+        # Always from the court when there is one, so a query parameter cannot pick the bucket
+        if self.action == 'create':
+            return club_id_for_court(request.data.get('court'))
+        if self.action == 'suggest':
+            return club_id_for_court(request.query_params.get('court'))
+        if self.action == 'available_slots':
+            return known_club_id(request.query_params.get('club_id'))
+        return None
     
     def get_queryset(self):
-        user = self.request.user
-        
-        # For managers: show all bookings for their clubs
-        if user.groups.filter(name="Manager").exists():
-            return Booking.objects.filter(court__club__manager=user)
-        
-        # For admins: show all bookings
-        if user.is_superuser or user.groups.filter(name="Admin").exists():
-            return Booking.objects.all()
-        
-        # For regular users: show only their own bookings
-        return Booking.objects.filter(user=user)
+        # For court_details (with its club name) and user_details
+        return visible_bookings(self.request.user).select_related('court__club', 'user')
     
     def perform_create(self, serializer):
         # Set the user to the current user unless specified and has permission
         user = self.request.user
-        if 'user' not in self.request.data or not (user.is_superuser or user.groups.filter(name__in=["Admin", "Manager"]).exists()):
-            serializer.save(user=user)
+        if 'user' not in self.request.data or not (user.is_superuser or has_role(user, "Admin", "Manager")):
+            # The row rather than the claims-built user, which user_details would show without its profile
+            serializer.save(user=load_full_user(user))
         else:
             serializer.save()
     
@@ -87,58 +139,45 @@ class BookingViewSet(viewsets.ModelViewSet):
         except ValueError:
             return Response({"error": "Invalid date format"}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get the club to access its settings
-        try:
-            club = Club.objects.get(id=club_id)
-        except Club.DoesNotExist:
+        # The club's settings and active courts, from the process-local cache
+        club = get_club_config(club_id)
+        if club is None:
             return Response({"error": "Club not found"}, status=status.HTTP_404_NOT_FOUND)
+        courts = club.active_courts(court_type)
         
-        # Query courts based on filters
-        courts_query = Court.objects.filter(club_id=club_id, is_active=True)
-        if court_type and court_type != 'all':
-            courts_query = courts_query.filter(court_type=court_type)
-        
-        # Get all active courts
-        courts = courts_query.all()
-        
-        # Prepare response data structure
-        available_slots = []
-        
-        # Get existing bookings for these courts on the selected date
+        # Get existing bookings for these courts on the selected date, in one query
         existing_bookings = Booking.objects.filter(
-            court__in=courts,
+            court_id__in=[court.id for court in courts],
             booking_date=selected_date,
-            status__in=['pending', 'confirmed']
-        )
+            status__in=Booking.ACTIVE_STATUSES
+        ).order_by('start_time').only('court_id', 'start_time', 'end_time')
         
-        # Generate time slots based on club's operating hours
-        opening_time = club.opening_time
-        closing_time = club.closing_time
-        increment_minutes = club.booking_increment or 60  # Default to 60 minutes if not set
+        available_slots = build_available_slots(club, courts, existing_bookings)
         
-        for court in courts:
-            # Get existing bookings for this court
-            court_bookings = existing_bookings.filter(court=court).order_by('start_time')
-            booking_ranges = [
-                {
-                    "start": booking.start_time.strftime('%H:%M:%S'),
-                    "end": booking.end_time.strftime('%H:%M:%S')
-                } for booking in court_bookings
-            ]
-            
-            # Add to response
-            available_slots.append({
-                "court_id": court.id,
-                "court_number": court.court_number,
-                "court_type": court.court_type,
-                "operating_hours": {
-                    "open": opening_time.strftime('%H:%M:%S'),
-                    "close": closing_time.strftime('%H:%M:%S')
-                },
-                "booked_ranges": booking_ranges,
-                "booking_increment": increment_minutes,
-                "min_duration": club.min_booking_duration,
-                "max_duration": club.max_booking_duration
-            })
+        return Response(available_slots)
+
+    @action(detail=False, methods=['GET'])
+    def suggest(self, request):
+        """The nearest free slots for a court, date and start time (and optional end time)"""
+        court_id = request.query_params.get('court')
+        if not court_id:
+            return Response({"error": "Court ID is required"}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response(available_slots) 
\ No newline at end of file
+        try:
+            booking_date = datetime.strptime(request.query_params.get('date', ''), '%Y-%m-%d').date()
+            start_time = time.fromisoformat(request.query_params.get('start_time', ''))
+            end_time = request.query_params.get('end_time')
+            end_time = time.fromisoformat(end_time) if end_time else None
+        except ValueError:
+            return Response({"error": "Invalid date or time format"}, status=status.HTTP_400_BAD_REQUEST)
+        if end_time is not None and end_time <= start_time:
+            return Response({"error": "End time must be after start time"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        court = None
+        if court_id.isdigit():
+            court = Court.objects.filter(pk=court_id).only('id', 'club_id', 'court_type').first()
+        if court is None:
+            return Response({"error": "Court not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        duration = minutes(end_time) - minutes(start_time) if end_time else None
+        return Response({"suggestions": suggest_slots(court, booking_date, start_time, duration)})
@@ -1,12 +1,59 @@
-from rest_framework import viewsets, status, filters
+from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db.models import Q
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
 from datetime import datetime, timedelta
 from django_filters.rest_framework import DjangoFilterBackend
 from ..models import Club, Court, Booking, ClubSpecialHours, CourtAvailabilityRestriction
 from ..serializers import ClubSerializer, CourtSerializer, BookingSerializer, ClubSpecialHoursSerializer, CourtAvailabilityRestrictionSerializer
+from ..roles import get_managed_club_ids, has_role, is_admin, visible_clubs, visible_courts
+from ..analytics import court_utilization
+from ..dashboard import get_dashboard
+from ..geo import nearby_clubs, zip_location
+from ..onboarding import add_club_courts, create_club_courts, new_court_counts, validate_courts_data
+from ..response_cache import ResponseCacheMixin, results
+from ..rollups import club_daily_stats
+from ..search import ClubSearchFilter, autocomplete_clubs
+from ..throttling import (
+    ClubTokenBucketThrottle, TokenBucketViewMixin, UserTokenBucketThrottle, club_id_for_court,
+)
+
+NEARBY_RADIUS_MILES = 25
+MAX_NEARBY_RADIUS_MILES = 250
+NEARBY_LIMIT = 20
+MAX_NEARBY_LIMIT = 100
+
+
+def with_free_court(clubs, court_type, day, start_time, end_time):
+    """Clubs open on `day` over the window with an active court free for all of it"""
+    special_hours = ClubSpecialHours.objects.filter(club=OuterRef('pk'), date=day)
+    busy = Booking.objects.filter(
+        court=OuterRef('pk'), booking_date=day, status__in=Booking.ACTIVE_STATUSES,
+        start_time__lt=end_time, end_time__gt=start_time,
+    )
+    restricted = CourtAvailabilityRestriction.objects.filter(
+        court=OuterRef('pk'), weekday=day.weekday(), start_time__lt=end_time, end_time__gt=start_time,
+    )
+    free_courts = Court.objects.filter(club=OuterRef('pk'), is_active=True).exclude(Exists(busy)).exclude(
+        Exists(restricted)
+    )
+    if court_type:
+        free_courts = free_courts.filter(court_type=court_type)
+    # Special hours replace the regular hours for their date
+    open_specially = special_hours.filter(
+        is_closed=False, opening_time__lte=start_time, closing_time__gte=end_time,
+    )
+    open_regularly = ~Exists(special_hours) & Q(opening_time__lte=start_time, closing_time__gte=end_time)
+    return clubs.filter(Exists(open_specially) | open_regularly).filter(Exists(free_courts))
+
+
+def club_list_tags(data):
+    """Response cache tags of a club list page: the list, and each club with its nested courts"""
+    return ['clubs', *(f'club:{club["id"]}' for club in results(data))]
+
 
 class IsManagerOrAdmin:
     """
@@ -14,7 +61,7 @@ class IsManagerOrAdmin:
     """
     def has_permission(self, request, view):
         user = request.user
-        return user.groups.filter(name__in=["Manager", "Admin"]).exists() or user.is_superuser
+        return has_role(user, "Manager", "Admin") or user.is_superuser
 
 class IsClubManager:
     """
@@ -22,63 +69,56 @@ class IsClubManager:
     """
     def has_object_permission(self, request, view, obj):
         user = request.user
-        if user.is_superuser or user.groups.filter(name="Admin").exists():
+        if is_admin(user):
             return True
         # Check if user is the manager of this club
         return obj.manager == user
 
-class ClubViewSet(viewsets.ModelViewSet):
+class ClubViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     serializer_class = ClubSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend]
-    search_fields = ['name', 'city', 'state']
+    filter_backends = [ClubSearchFilter, DjangoFilterBackend]
     filterset_fields = ['is_approved']
     
     def get_queryset(self):
-        user = self.request.user
-        if user.is_superuser or user.groups.filter(name="Admin").exists():
-            # Admins and superusers can see all clubs including unapproved ones
-            return Club.objects.all()
-        # Managers can see their own clubs regardless of approval status
-        if user.groups.filter(name="Manager").exists():
-            return Club.objects.filter(Q(is_approved=True) | Q(manager=user))
-        # Regular users can only see approved clubs
-        return Club.objects.filter(is_approved=True)
+        queryset = visible_clubs(self.request.user)
+        if self.action == 'list':
+            # Nested court_details, in one query for the page
+            queryset = queryset.prefetch_related('court_details')
+        return queryset
+    
+    def get_cache_tags(self, data):
+        return club_list_tags(data)
     
     def perform_create(self, serializer):
-        # Save the club with the current user as manager
-        club = serializer.save(manager=self.request.user)
-        
-        # Extract courts data and create individual Court objects
-        courts_data = self.request.data.get('courts', [])
+        # Validate the courts before writing anything
+        courts_data = validate_courts_data(self.request.data.get('courts', []))
         
-        # First, find the highest existing court number for this club
-        highest_court_number = 0
-        if club.id:
-            highest_court = Court.objects.filter(club=club).order_by('-court_number').first()
-            if highest_court:
-                highest_court_number = highest_court.court_number
+        # The club and its courts are created together or not at all
+        with transaction.atomic():
+            # Counted as they are inserted: bulk_create skips the signals that count courts
+            club = serializer.save(manager=self.request.user, **new_court_counts(courts_data))
+            create_club_courts(club, courts_data)
+    
+    @action(detail=True, methods=['post'], url_path='add-courts')
+    def add_courts(self, request, pk=None):
+        """
+        Add courts to an existing club in one batch, numbered after its
+        highest court: {"courts": [{"type": "hard", "count": 2}, ...]}
+        """
+        club = self.get_object()
+        user = request.user
+        if not (is_admin(user) or club.id in get_managed_club_ids(user)):
+            return Response({"error": "Only the club's manager can add courts"}, status=status.HTTP_403_FORBIDDEN)
         
-        # Keep track of the current court number
-        next_court_number = highest_court_number + 1
+        courts_data = validate_courts_data(request.data.get('courts', []))
+        with transaction.atomic():
+            courts = add_club_courts(club, courts_data)
         
-        # Now create the courts with unique numbers
-        for court_type_data in courts_data:
-            court_type = court_type_data.get('type')
-            count = int(court_type_data.get('count', 0))
-            
-            # Create individual court objects with sequential numbers
-            for i in range(count):
-                Court.objects.create(
-                    club=club,
-                    court_type=court_type,
-                    court_number=next_court_number
-                )
-                next_court_number += 1
-                    
-        # Save court summary to the club for quick reference
-        club.courts_summary = courts_data
-        club.save()
+        return Response({
+            "courts": CourtSerializer(courts, many=True).data,
+            "courts_summary": club.courts_summary,
+        }, status=status.HTTP_201_CREATED)
         
     @action(detail=True, methods=['get'])
     def bookings(self, request, pk=None):
@@ -98,27 +138,180 @@ class ClubViewSet(viewsets.ModelViewSet):
         serializer = BookingSerializer(bookings, many=True)
         return Response(serializer.data)
 
-class CourtViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Best prefix matches for ?q=, as id, name, city and state only"""
+        text = request.query_params.get('q', '')
+        return Response(autocomplete_clubs(self.get_queryset(), text) if text.strip() else [])
+
+    @action(detail=False, methods=['get'])
+    def dashboard(self, request):
+        """
+        Everything the manager calendar needs in one normalized payload:
+        the user's managed clubs (or just ?club=<id>), their courts, the
+        Monday-Sunday week around ?date= (default today) with its bookings
+        and booking users, special hours and court restrictions.
+        """
+        user = request.user
+        if not (has_role(user, "Manager") or is_admin(user)):
+            return Response({"error": "Only managers can view the dashboard"}, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            day = datetime.strptime(request.query_params['date'], '%Y-%m-%d').date() \
+                if 'date' in request.query_params else datetime.now().date()
+        except ValueError:
+            return Response({"error": "Invalid date format"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        club_ids = get_managed_club_ids(user)
+        if 'club' in request.query_params:
+            try:
+                club_id = int(request.query_params['club'])
+            except ValueError:
+                return Response({"error": "Invalid club ID"}, status=status.HTTP_400_BAD_REQUEST)
+            if club_id not in club_ids:
+                # Admins can open any club's dashboard
+                if not is_admin(user):
+                    return Response({"error": "You do not manage this club"}, status=status.HTTP_403_FORBIDDEN)
+                if not Club.objects.filter(pk=club_id).exists():
+                    return Response({"error": "Club not found"}, status=status.HTTP_404_NOT_FOUND)
+            club_ids = {club_id}
+        
+        return Response(get_dashboard(club_ids, day))
+
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """
+        Approved clubs nearest to ?zip= (or ?latitude=&longitude=) within
+        ?radius= miles, optionally only those with an active ?court_type=
+        court that is free on ?date= from ?start_time= to ?end_time=.
+        """
+        params = request.query_params
+        try:
+            if 'zip' in params:
+                origin = zip_location(params['zip'])
+                if origin is None:
+                    return Response({"error": "Unknown ZIP code"}, status=status.HTTP_400_BAD_REQUEST)
+            else:
+                origin = (float(params['latitude']), float(params['longitude']))
+                if not (-90 <= origin[0] <= 90 and -180 <= origin[1] <= 180):
+                    raise ValueError
+            radius = float(params.get('radius', NEARBY_RADIUS_MILES))
+            limit = int(params.get('limit', NEARBY_LIMIT))
+        except (KeyError, ValueError):
+            return Response({"error": "Give a zip, or a valid latitude and longitude"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not (0 < radius <= MAX_NEARBY_RADIUS_MILES and 0 < limit <= MAX_NEARBY_LIMIT):
+            return Response({"error": f"radius must be up to {MAX_NEARBY_RADIUS_MILES} miles and limit up to "
+                                      f"{MAX_NEARBY_LIMIT}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.get_queryset().filter(is_approved=True)
+        court_type = params.get('court_type')
+        if court_type and court_type not in dict(Court.COURT_TYPES):
+            return Response({"error": "Invalid court type"}, status=status.HTTP_400_BAD_REQUEST)
+        window = [params.get(name) for name in ('date', 'start_time', 'end_time')]
+        if any(window):
+            try:
+                day = datetime.strptime(window[0], '%Y-%m-%d').date()
+                start_time, end_time = (datetime.strptime(value, '%H:%M').time() for value in window[1:])
+            except (TypeError, ValueError):
+                return Response({"error": "date, start_time and end_time go together as YYYY-MM-DD and HH:MM"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if start_time >= end_time:
+                return Response({"error": "End time must be after start time"}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = with_free_court(queryset, court_type, day, start_time, end_time)
+        elif court_type:
+            queryset = queryset.filter(Exists(Court.objects.filter(
+                club=OuterRef('pk'), is_active=True, court_type=court_type,
+            )))
+
+        found = nearby_clubs(queryset, origin[0], origin[1], radius, limit)
+        clubs = Club.objects.prefetch_related('court_details').in_bulk([club_id for club_id, _ in found])
+        results = []
+        for club_id, miles in found:
+            data = ClubSerializer(clubs[club_id], context={'request': request}).data
+            data['distance_miles'] = round(miles, 1)
+            results.append(data)
+        return Response({
+            "origin": {"latitude": origin[0], "longitude": origin[1]},
+            "radius_miles": radius,
+            "results": results,
+        })
+    
+    def analytics_range(self, request, default_days, max_days=None):
+        """
+        The club plus the start_date/end_date query params (default: the
+        last `default_days` days, at most `max_days`), or an error Response.
+        Analytics are only for the club's manager and admins.
+        """
+        club = self.get_object()
+        user = request.user
+        if not (is_admin(user) or club.id in get_managed_club_ids(user)):
+            return Response({"error": "Only the club's manager can view its analytics"},
+                            status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            end_date = datetime.strptime(request.query_params['end_date'], '%Y-%m-%d').date() \
+                if 'end_date' in request.query_params else datetime.now().date()
+            start_date = datetime.strptime(request.query_params['start_date'], '%Y-%m-%d').date() \
+                if 'start_date' in request.query_params else end_date - timedelta(days=default_days - 1)
+        except ValueError:
+            return Response({"error": "Invalid date format"}, status=status.HTTP_400_BAD_REQUEST)
+        if end_date < start_date:
+            return Response({"error": "end_date must not be before start_date"}, status=status.HTTP_400_BAD_REQUEST)
+        if max_days is not None and (end_date - start_date).days + 1 > max_days:
+            return Response({"error": f"The date range must not be longer than {max_days} days"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return club, start_date, end_date
+    
+    @action(detail=True, methods=['get'])
+    def utilization(self, request, pk=None):
+        """
+        Court utilization heatmaps (booked minutes / open minutes per court,
+        weekday and hour) between start_date and end_date, by default the
+        last four weeks and at most settings.UTILIZATION_MAX_DAYS.
+        """
+        result = self.analytics_range(request, default_days=28,
+                                      max_days=getattr(settings, 'UTILIZATION_MAX_DAYS', 366))
+        if isinstance(result, Response):
+            return result
+        return Response(court_utilization(*result))
+    
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """
+        Booking totals per day and per court between start_date and
+        end_date (default: the last 30 days), read from the daily rollups.
+        """
+        result = self.analytics_range(request, default_days=30)
+        if isinstance(result, Response):
+            return result
+        return Response(club_daily_stats(*result))
+
+class CourtViewSet(TokenBucketViewMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     serializer_class = CourtSerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserTokenBucketThrottle, ClubTokenBucketThrottle]
+    throttle_scopes = {
+        'availability': 'availability',
+    }
+    
+    def get_throttle_club_id(self, request):
+        """Club of the court being queried, for the per-club throttle"""
+        return club_id_for_court(self.kwargs.get('pk'))
     
     def get_queryset(self):
-        user = self.request.user
-        # Filter by club if provided
+        # Courts visible to this user, filtered by club if provided
+        # club_name reads the court's club
+        queryset = visible_courts(self.request.user).select_related('club')
         club_id = self.request.query_params.get('club')
-        queryset = Court.objects.all()
-        
         if club_id:
             queryset = queryset.filter(club_id=club_id)
-        
-        # Further filter based on user permissions
-        if user.is_superuser or user.groups.filter(name="Admin").exists():
-            return queryset
-        elif user.groups.filter(name="Manager").exists():
-            # Managers can see courts from their clubs
-            return queryset.filter(Q(club__is_approved=True) | Q(club__manager=user))
-        # Regular users can only see courts from approved clubs
-        return queryset.filter(club__is_approved=True)
+        return queryset
+    
+    def get_cache_tags(self, data):
+        # club_name comes from each court's club
+        courts = results(data)
+        return ['courts', *(f'court:{court["id"]}' for court in courts), *{f'club:{court["club"]}' for court in courts}]
     
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
@@ -0,0 +1,34 @@
+import io
+
+from rest_framework import status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..importer import CSVImportError, import_csv
+
+
+class ClubImportView(APIView):
+    """
+    Import clubs, courts, special hours and restrictions from an uploaded
+    CSV file (multipart field "file"; staff only). Returns the per-record
+    counts and the rejected rows.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload the CSV as the \"file\" field"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Large uploads are already spooled to disk; read them back a line at a time
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            report = import_csv(stream)
+        except CSVImportError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            stream.detach()
+        return Response(report.as_dict())
@@ -0,0 +1,30 @@
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from ..slow_queries import ORDERS, top_offenders
+from ..throttling import get_throttle_counters
+
+
+class ThrottleStatsView(APIView):
+    """Allowed and throttled request counts per throttle scope (staff only)"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_throttle_counters())
+
+
+class SlowQueriesView(APIView):
+    """SQL fingerprints that cost the most, over all workers (staff only)"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        order = request.query_params.get('order', 'total')
+        if order not in ORDERS:
+            return Response({"error": f"order must be one of: {', '.join(ORDERS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(top_offenders(order, max(limit, 1)))
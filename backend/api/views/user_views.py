@@ -1,10 +1,18 @@
 from rest_framework import viewsets, status, filters
 from django.contrib.auth.models import User, Group
+from django.utils import timezone
+from datetime import timedelta
 from ..serializers import UserSerializer
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
+from ..authentication import load_full_user
+from ..counters import booking_counts
+from ..response_cache import ResponseCacheMixin
+from ..roles import get_managed_club_ids, get_roles, has_role, is_admin
+from ..rollups import club_totals
+
 
 class IsManagerOrAdmin:
     """
@@ -12,14 +20,15 @@ class IsManagerOrAdmin:
     """
     def has_permission(self, request, view):
         if request.method == 'GET':  # Only allow GET requests
-            return request.user.groups.filter(name__in=["Manager", "Admin"]).exists() or request.user.is_superuser
+            return has_role(request.user, "Manager", "Admin") or request.user.is_superuser
         return False
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     search_fields = ['username', 'email', 'first_name', 'last_name']
+    cached_actions = ('me',)
     
     def get_queryset(self):
         """
@@ -27,7 +36,7 @@ class UserViewSet(viewsets.ModelViewSet):
         Regular users can only see themselves.
         """
         user = self.request.user
-        if user.is_superuser or user.groups.filter(name__in=["Manager", "Admin"]).exists():
+        if user.is_superuser or has_role(user, "Manager", "Admin"):
             return User.objects.all().order_by('username')
         return User.objects.filter(id=user.id)
     
@@ -39,14 +48,24 @@ class UserViewSet(viewsets.ModelViewSet):
             return [IsManagerOrAdmin()]
         return super().get_permissions()
     
+    def get_cache_vary(self, request):
+        # The user's own profile, with the roles from their token
+        return f"user:{request.user.pk}:{','.join(sorted(get_roles(request.user)))}"
+    
+    def get_cache_tags(self, data):
+        return [f"user:{data['id']}"]
+    
     @action(detail=False, methods=["GET"], permission_classes=[IsAuthenticated])
     def me(self, request):
         """Alias for current_user - modern API convention"""
-        serializer = self.get_serializer(request.user)
+        return self.cached_response(request, lambda: self.build_me(request))
+    
+    def build_me(self, request):
+        serializer = self.get_serializer(load_full_user(request.user))
         data = serializer.data
         
         # Add groups to the response
-        data['groups'] = list(request.user.groups.values_list('name', flat=True))
+        data['groups'] = sorted(get_roles(request.user))
         
         return Response(data)
     
@@ -64,8 +83,7 @@ class UserViewSet(viewsets.ModelViewSet):
         
         # Regular users can only update their own profiles
         if user.id != current_user.id and not (
-            current_user.is_superuser or 
-            current_user.groups.filter(name__in=["Admin"]).exists()
+            is_admin(current_user)
         ):
             return Response(
                 {"detail": "You do not have permission to update this user."},
@@ -76,7 +94,7 @@ class UserViewSet(viewsets.ModelViewSet):
     
     def destroy(self, request, *args, **kwargs):
         """Only allow admins to delete users"""
-        if not (request.user.is_superuser or request.user.groups.filter(name="Admin").exists()):
+        if not is_admin(request.user):
             return Response(
                 {"detail": "You do not have permission to delete users."},
                 status=status.HTTP_403_FORBIDDEN
@@ -87,17 +105,24 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["GET", "PUT"], permission_classes=[IsAuthenticated])
     def profile(self, request):
         """Get or update current user profile"""
-        user = request.user
+        user = load_full_user(request.user)
         
         if request.method == "GET":
             serializer = self.get_serializer(user)
             data = serializer.data
             
             # Add groups to the response
-            data['groups'] = list(user.groups.values_list('name', flat=True))
+            data['groups'] = sorted(get_roles(request.user))
+            
+            # Bookings by status from the user's counters, and their total
+            data['bookings_by_status'] = booking_counts(user.pk)
+            data['bookings_count'] = sum(data['bookings_by_status'].values())
             
-            # Add bookings count
-            data['bookings_count'] = user.bookings.count() if hasattr(user, 'bookings') else 0
+            # Managers get their clubs' last 30 days from the daily rollups
+            club_ids = get_managed_club_ids(request.user)
+            if club_ids:
+                today = timezone.localdate()
+                data['club_stats'] = club_totals(club_ids, today - timedelta(days=29), today)
             
             return Response(data)
         
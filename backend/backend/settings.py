@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -43,15 +44,21 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 MIDDLEWARE = [
+    # First, so its timings and query counts cover the rest of the stack
+    'api.metrics.MetricsMiddleware',
+    'api.tracing.TracingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.db_router.ReplicaRoutingMiddleware',
+    'api.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -96,6 +103,127 @@ DATABASES = {
     }
 }
 
+# Read replicas: DATABASE_REPLICA_HOSTS is a comma-separated list of hosts,
+# each added as a 'replicaN' alias with the primary's credentials. Safe
+# requests read from them (see api/db_router.py); tests mirror them onto
+# the default database.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+
+# Seconds a client keeps reading from the primary after a write
+REPLICA_PIN_SECONDS = 5
+
+# Serve the read-heavy booking and club endpoints from the async views in
+# api/views/async_views.py (run under ASGI, e.g. uvicorn backend.asgi:application)
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', '1') == '1'
+
+
+# Cache
+# Token versions, the blacklist filter, throttles and club cache
+# generations share state between workers through this cache, so
+# production should point it at a shared backend (e.g. memcached, Redis or
+# the database cache)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'tennis-booking'),
+    },
+    # For RESPONSE_CACHE_ALIAS=responses: cached API responses in their own
+    # backend, e.g. a FileBasedCache directory or a DatabaseCache table (created
+    # with `manage.py createcachetable`) to share them between workers
+    'responses': {
+        'BACKEND': os.environ.get('RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', 'tennis-booking-responses'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Whether every worker sees the same default cache. Token claims, the
+# blacklist filter and the club configuration cache rely on it to hear of
+# changes made by other workers; without it (a per-process locmem cache)
+# they check the database on every request instead
+SHARED_CACHE = os.environ.get(
+    'SHARED_CACHE',
+    '0' if CACHES['default']['BACKEND'].endswith(('.LocMemCache', '.DummyCache')) else '1',
+) == '1'
+
+# Seconds a club's manager dashboard stays cached (changes invalidate it sooner)
+DASHBOARD_CACHE_SECONDS = 300
+
+# Trigram word similarity (0-1) a club name or city needs to the whole
+# search for a typo match on PostgreSQL (see api/search.py); pg_trgm's own
+# default of 0.6 misses single-letter slips such as 'rivrside'
+CLUB_SEARCH_TYPO_THRESHOLD = 0.5
+
+# ZIP code centroids for club coordinates and the nearby search; build the
+# file from the Census ZCTA gazetteer with `manage.py build_zip_centroids`
+ZIP_CENTROIDS_PATH = os.environ.get('ZIP_CENTROIDS_PATH', BASE_DIR / 'api' / 'data' / 'zip_centroids.csv.gz')
+
+# Request metrics served at /metrics (see api/metrics.py): how often each
+# worker publishes its totals to the cache, and the bearer token a scrape
+# must present (unset leaves the endpoint open, e.g. behind a private network)
+METRICS_FLUSH_SECONDS = 10
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# ?profile=cprofile|sql for superusers (api/profiling.py)
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', '1') == '1'
+
+# Request tracing (see api/tracing.py): the fraction of requests traced (0
+# turns tracing off), where the OTLP/JSON batches go and when they rotate
+TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', '0'))
+TRACING_FILE = os.environ.get('TRACING_FILE', BASE_DIR / 'traces.jsonl')
+TRACING_MAX_BYTES = 10 * 1024 * 1024
+TRACING_BACKUP_COUNT = 5
+TRACING_BATCH_SIZE = 512
+TRACING_FLUSH_SECONDS = 5
+
+# Slow query log (see api/slow_queries.py): statements slower than
+# SLOW_QUERY_MS get their plan captured once per fingerprint, after the
+# request; SLOW_QUERY_EXPLAIN_ANALYZE re-runs them for actual timings
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', '1') == '1'
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', '100'))
+SLOW_QUERY_EXPLAIN_ANALYZE = os.environ.get('SLOW_QUERY_EXPLAIN_ANALYZE', '0') == '1'
+SLOW_QUERY_FLUSH_SECONDS = 10
+SLOW_QUERY_MAX_FINGERPRINTS = 2000
+
+# Per-process cache of club hours, booking rules and active courts (see
+# api/club_config.py); writes invalidate it on every worker at once, the TTL
+# only bounds how long an unused club stays in memory
+CLUB_CONFIG_CACHE_SIZE = 1000
+CLUB_CONFIG_TTL = 300
+
+# A booking refused as already booked (and /api/bookings/suggest/) lists up
+# to BOOKING_SUGGESTION_LIMIT free slots, from the requested day and the
+# BOOKING_SUGGESTION_DAYS days either side (see api/suggestions.py)
+BOOKING_SUGGESTION_LIMIT = 5
+BOOKING_SUGGESTION_DAYS = 3
+
+# Longest start_date..end_date range, in days, the utilization heatmaps
+# (api/analytics.py) answer; longer ones get a 400
+UTILIZATION_MAX_DAYS = 366
+
+# Club and court lists and /api/users/me/ are served from the
+# RESPONSE_CACHE_ALIAS cache for RESPONSE_CACHE_SECONDS (0 turns it off), then stale for up to
+# RESPONSE_CACHE_STALE_SECONDS more while one request rebuilds them; requests
+# wait up to RESPONSE_CACHE_WAIT_SECONDS for a build already under way
+# It is on by default only when that cache is shared between workers: with a
+# per-process locmem cache, a write in one worker would leave the others
+# serving their entries for up to RESPONSE_CACHE_SECONDS + STALE_SECONDS
+RESPONSE_CACHE_ALIAS = os.environ.get('RESPONSE_CACHE_ALIAS', 'default')
+RESPONSE_CACHE_SECONDS = int(os.environ.get(
+    'RESPONSE_CACHE_SECONDS',
+    '0' if CACHES[RESPONSE_CACHE_ALIAS]['BACKEND'].endswith('.LocMemCache') else '60',
+))
+RESPONSE_CACHE_STALE_SECONDS = 30
+RESPONSE_CACHE_WAIT_SECONDS = 2
+RESPONSE_CACHE_LOCK_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -140,11 +268,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
      'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
      ],
      'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
      ],
+     'DEFAULT_RENDERER_CLASSES': [
+        'api.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+     ],
      'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
      'PAGE_SIZE': 20,
 }
@@ -153,5 +285,16 @@ SIMPLE_JWT = {
      'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
      'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
      'ROTATE_REFRESH_TOKENS': True,
-     'BLACKLIST_AFTER_ROTATION': True
+     'BLACKLIST_AFTER_ROTATION': True,
+     # Embed roles and managed clubs in the tokens (see api/tokens.py)
+     'TOKEN_OBTAIN_SERIALIZER': 'api.tokens.ClaimsTokenObtainPairSerializer',
+     'TOKEN_REFRESH_SERIALIZER': 'api.tokens.ClaimsTokenRefreshSerializer',
+}
+
+# Token-bucket throttles (see api/throttling.py): 'N/period' allows bursts
+# of N requests, refilled at N per period
+TOKEN_BUCKET_STORE = 'cache'
+TOKEN_BUCKET_THROTTLES = {
+    'availability': {'user': '60/min', 'club': '1200/min'},
+    'booking': {'user': '30/min', 'club': '300/min'},
 }
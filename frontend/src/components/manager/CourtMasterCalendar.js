@@ -50,6 +50,32 @@ const CourtMasterCalendar = () => {
     fetchClubs();
   }, []);
 
+  // Courts, bookings and users for the selected club and the week of the current date, in one request
+  const fetchDashboard = async () => {
+    const formattedDate = format(currentDate, 'yyyy-MM-dd');
+    const response = await api.get('/api/clubs/dashboard/', {
+      params: {
+        club: selectedClub,
+        date: formattedDate
+      }
+    });
+    const courtsById = Object.fromEntries(response.data.courts.map(court => [court.id, court]));
+    const usersById = Object.fromEntries(response.data.users.map(user => [user.id, user]));
+    
+    // Filter out inactive courts and sort courts by number
+    const activeCourts = response.data.courts.filter(court => court.is_active !== false);
+    setCourts(activeCourts.sort((a, b) => a.court_number - b.court_number));
+    
+    // The payload is normalized; attach the court and user to each of the day's bookings
+    setBookings(response.data.bookings
+      .filter(booking => booking.booking_date === formattedDate)
+      .map(booking => ({
+        ...booking,
+        court_details: courtsById[booking.court],
+        user_details: usersById[booking.user]
+      })));
+  };
+
   // Load courts and bookings when a club is selected or the date changes
   useEffect(() => {
     if (!selectedClub) return;
@@ -59,27 +85,7 @@ const CourtMasterCalendar = () => {
       setError(null);
       
       try {
-        // Fetch courts
-        const courtsResponse = await api.get('/api/courts/', {
-          params: { club: selectedClub }
-        });
-        const courtsData = courtsResponse.data.results || courtsResponse.data;
-        setCourts(courtsData);
-        
-        // Filter out empty court types and sort courts by number
-        const filteredCourts = courtsData.filter(court => court.is_active !== false);
-        setCourts(filteredCourts.sort((a, b) => a.court_number - b.court_number));
-        
-        // Fetch bookings for the selected date
-        const formattedDate = format(currentDate, 'yyyy-MM-dd');
-        const bookingsResponse = await api.get('/api/bookings/', {
-          params: {
-            club: selectedClub,
-            booking_date: formattedDate
-          }
-        });
-        
-        setBookings(bookingsResponse.data.results || bookingsResponse.data);
+        await fetchDashboard();
       } catch (err) {
         setError('Failed to load calendar data. Please try again.');
         console.error(err);
@@ -165,15 +171,7 @@ const CourtMasterCalendar = () => {
       }
       
       // Refresh bookings
-      const formattedDate = format(currentDate, 'yyyy-MM-dd');
-      const response = await api.get('/api/bookings/', {
-        params: {
-          club: selectedClub,
-          booking_date: formattedDate
-        }
-      });
-      
-      setBookings(response.data.results || response.data);
+      await fetchDashboard();
       setShowModal(false);
     } catch (err) {
       console.error('Booking error:', err);
@@ -187,15 +185,7 @@ const CourtMasterCalendar = () => {
       await api.delete(`/api/bookings/${id}/`);
       
       // Refresh bookings
-      const formattedDate = format(currentDate, 'yyyy-MM-dd');
-      const response = await api.get('/api/bookings/', {
-        params: {
-          club: selectedClub,
-          booking_date: formattedDate
-        }
-      });
-      
-      setBookings(response.data.results || response.data);
+      await fetchDashboard();
       setShowModal(false);
     } catch (err) {
       console.error('Deletion error:', err);